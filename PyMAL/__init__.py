@@ -1 +1,13 @@
-from .client import Client
+from .client import Client, AsyncClient
+from .rest_adapter import APIError
+from .ratelimit import RateLimiter
+from .cache import ResponseCache, MemoryCache, SQLiteCache
+from .models import AnimeNode, UserAnimeListEntry
+from .sync import SyncEngine, MemorySnapshotStore, SQLiteSnapshotStore
+from .catalog import Catalog
+from .writequeue import WriteQueue
+from .pool import ClientPool
+from .instrument import Hooks, Metrics
+from .columnar import AnimeColumns
+from .analytics import ListAnalytics
+from .recommend import Recommender
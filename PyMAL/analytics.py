@@ -0,0 +1,220 @@
+from .batch import Batch
+from .columnar import AnimeColumns, _numpy
+
+# Fields of the list entries the statistics are computed from
+ANALYTICS_FIELDS = ("list_status", "genres", "studios", "num_episodes", "average_episode_duration")
+# Scores a user can give, 0 meaning not scored
+SCORES = 11
+
+
+# Score, watch time and genre/studio statistics of many user lists, computed on flat arrays
+class ListAnalytics(object):
+    def __init__(self, columns: AnimeColumns, usernames: list, sizes: list):
+        """
+        > Use from_columns or fetch rather than building it directly.
+
+        Args:
+          columns (AnimeColumns): The entries of every list, one list after the other.
+          usernames (list): The users, in the order of their lists.
+          sizes (list): The number of entries of each list.
+        """
+        np = _numpy()
+        self.usernames = list(usernames)
+        self.errors = {}
+        self.arrays = arrays = columns.to_numpy() if len(columns) else _empty_arrays()
+        for column in ("list_status_score", "list_status_status"):
+            if column not in arrays:
+                raise ValueError(f"{column} is missing, fetch the lists with fields={list(ANALYTICS_FIELDS)}")
+        self.user = np.repeat(np.arange(len(self.usernames), dtype=np.int32), sizes)
+        self.score = np.nan_to_num(arrays["list_status_score"]).astype(np.int64)
+        self.statuses = columns.categories("list_status_status") if len(columns) else []
+        self.status = arrays["list_status_status"]
+        self.genres = columns.categories("genres") if len(columns) and "genres" in arrays else []
+        self.studios = columns.categories("studios") if len(columns) and "studios" in arrays else []
+
+    @classmethod
+    def from_columns(cls, lists: dict):
+        """
+        > Builds the analytics from {username: AnimeColumns}, e.g. export_user_anime_list results.
+        """
+        columns = AnimeColumns()
+        for entries in lists.values():
+            columns.extend(entries)
+        return cls(columns, list(lists), [len(entries) for entries in lists.values()])
+
+    @classmethod
+    def fetch(cls, client, usernames, max_workers: int = 8, fields=ANALYTICS_FIELDS):
+        """
+        > Exports the lists of many users concurrently and builds the analytics.
+
+        Users whose list can't be fetched (e.g. private lists) are left out and their exceptions
+        are collected in the errors dict instead.
+
+        Args:
+          client (Client): The client used to fetch the lists.
+          usernames: Iterable of usernames.
+          max_workers (int): Maximum number of lists fetched at once.
+          fields: Fields requested for each entry, list_status is required.
+
+        Returns:
+          ListAnalytics: The analytics of every fetched list, in the order of usernames.
+        """
+        batch = Batch(
+            lambda username: client.export_user_anime_list(username, fields=list(fields)),
+            usernames,
+            max_workers=max_workers,
+            ordered=True,
+        )
+        analytics = cls.from_columns(dict(batch))
+        analytics.errors = batch.errors
+        return analytics
+
+    def __len__(self):
+        return len(self.usernames)
+
+    def _user_counts(self, key, width: int, weights=None):
+        np = _numpy()
+        counts = np.bincount(key, weights=weights, minlength=len(self.usernames) * width)
+        return counts.reshape(len(self.usernames), width)
+
+    def score_histograms(self):
+        """
+        > Returns how many entries of each user have each score.
+
+        Returns:
+          ndarray: (users, 11) counts, column 0 counting the entries that aren't scored.
+        """
+        np = _numpy()
+        return self._user_counts(self.user.astype(np.int64) * SCORES + self.score, SCORES)
+
+    def mean_scores(self):
+        """
+        > Returns the mean score of each user over the entries they scored, NaN without any.
+        """
+        histograms = self.score_histograms()[:, 1:]
+        np = _numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return histograms @ np.arange(1, SCORES) / histograms.sum(axis=1)
+
+    def watch_time(self):
+        """
+        > Returns the seconds each user spent watching, episodes watched times the episode duration.
+        """
+        np = _numpy()
+        for column in ("list_status_num_episodes_watched", "average_episode_duration"):
+            if column not in self.arrays:
+                raise ValueError(f"{column} is missing, fetch the lists with fields={list(ANALYTICS_FIELDS)}")
+        seconds = np.nan_to_num(self.arrays["list_status_num_episodes_watched"]) * np.nan_to_num(
+            self.arrays["average_episode_duration"]
+        )
+        return np.bincount(self.user, weights=seconds, minlength=len(self.usernames))
+
+    def status_counts(self):
+        """
+        > Returns how many entries of each user have each status.
+
+        Returns:
+          ndarray: (users, statuses) counts, the columns follow the statuses attribute.
+        """
+        np = _numpy()
+        width = len(self.statuses)
+        known = self.status >= 0
+        key = self.user[known].astype(np.int64) * width + self.status[known]
+        return self._user_counts(key, width)
+
+    def completion_rates(self):
+        """
+        > Returns the share of each user's started anime they completed, leaving plan_to_watch
+        out, NaN when they started none.
+        """
+        np = _numpy()
+        counts = self.status_counts()
+        started = counts.sum(axis=1)
+        if "plan_to_watch" in self.statuses:
+            started = started - counts[:, self.statuses.index("plan_to_watch")]
+        completed = counts[:, self.statuses.index("completed")] if "completed" in self.statuses else 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return completed / started
+
+    def group_scores(self, column: str = "genres") -> tuple:
+        """
+        > Returns the mean and standard deviation of each user's scores per genre or studio,
+        over the entries they scored.
+
+        Args:
+          column (str): genres or studios.
+
+        Returns:
+          tuple: (mean, deviation, count) arrays of shape (users, genres or studios), the mean
+            and deviation being NaN where the count is 0. The columns follow the genres or
+            studios attribute.
+        """
+        np = _numpy()
+        if column not in self.arrays:
+            raise ValueError(f"{column} is missing, fetch the lists with fields={list(ANALYTICS_FIELDS)}")
+        groups = self.arrays[column]
+        offsets = self.arrays[column + "_offsets"]
+        width = len(getattr(self, column))
+        # one row per (entry, group) pair
+        entry = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        score = self.score[entry]
+        scored = score > 0
+        key = self.user[entry][scored].astype(np.int64) * width + groups[scored]
+        score = score[scored].astype(np.float64)
+        count = self._user_counts(key, width)
+        total = self._user_counts(key, width, weights=score)
+        squares = self._user_counts(key, width, weights=score * score)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            deviation = np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+        return mean, deviation, count
+
+    def affinity(self, column: str = "genres"):
+        """
+        > Returns how much higher than their own mean each user scores each genre or studio.
+
+        Returns:
+          ndarray: (users, genres or studios) score differences, NaN where the user scored none.
+        """
+        mean, _, _ = self.group_scores(column)
+        return mean - self.mean_scores()[:, None]
+
+    def summary(self, username: str) -> dict:
+        """
+        > Returns the statistics of one user as plain values.
+        """
+        user = self.usernames.index(username)
+        mean, deviation, count = self.group_scores("genres") if self.genres else (None, None, None)
+        summary = {
+            "entries": int((self.user == user).sum()),
+            "mean_score": float(self.mean_scores()[user]),
+            "score_histogram": self.score_histograms()[user].tolist(),
+            "statuses": dict(zip(self.statuses, self.status_counts()[user].tolist())),
+            "completion_rate": float(self.completion_rates()[user]),
+        }
+        if "average_episode_duration" in self.arrays:
+            summary["watch_time"] = float(self.watch_time()[user])
+        if mean is not None:
+            summary["genres"] = {
+                genre: {"mean": float(mean[user, n]), "deviation": float(deviation[user, n]), "count": int(count[user, n])}
+                for n, genre in enumerate(self.genres)
+                if count[user, n]
+            }
+        return summary
+
+
+def _empty_arrays() -> dict:
+    """
+    > Returns the analytics columns without any row, when every list is empty or couldn't be fetched.
+    """
+    np = _numpy()
+    arrays = {
+        "list_status_score": np.zeros(0, dtype=np.int64),
+        "list_status_status": np.zeros(0, dtype=np.int32),
+        "list_status_num_episodes_watched": np.zeros(0, dtype=np.int64),
+        "average_episode_duration": np.zeros(0, dtype=np.int64),
+    }
+    for column in ("genres", "studios"):
+        arrays[column] = np.zeros(0, dtype=np.int32)
+        arrays[column + "_offsets"] = np.zeros(1, dtype=np.int64)
+    return arrays
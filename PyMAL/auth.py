@@ -1,13 +1,16 @@
-import datetime
 import json
 import logging
 import secrets
 import threading
-from urllib.parse import urlencode
+import time
+from concurrent.futures import Future, TimeoutError
+from urllib.parse import urlencode, urlparse
 
 import requests
-from flask import Flask, request
-from werkzeug.serving import make_server
+
+from .rest_adapter import APIError
+
+TOKEN_URL = "https://myanimelist.net/v1/oauth2/token"
 
 
 # This class is a thread that will listen for incoming connections and create a new thread for each
@@ -16,6 +19,8 @@ class ServerThread(threading.Thread):
     # https://stackoverflow.com/a/45017691
     def __init__(self, app, host, port):
         threading.Thread.__init__(self)
+        from werkzeug.serving import make_server
+
         self.server = make_server(host, port, app)
         self.ctx = app.app_context()
         self.ctx.push()
@@ -27,6 +32,98 @@ class ServerThread(threading.Thread):
         self.server.shutdown()
 
 
+# Receives OAuth callbacks for any number of login flows and hands each code to its flow by state
+class CallbackListener(object):
+    def __init__(self, host: str, port: int, callback_url: str):
+        """
+        > One server thread serves every pending login, so concurrent flows don't need a
+        thread (or a port) each. Start it once and pass it to every Auth as listener.
+
+        Args:
+          host (str): The host the server binds to.
+          port (int): The port the server listens on.
+          callback_url (str): The callback url set in the MAL apiconfig, its path is served.
+        """
+        self.host = host
+        self.port = port
+        self.path = urlparse(callback_url).path or "/"
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        """
+        > Starts the server thread, does nothing if it is running already.
+        """
+        with self._lock:
+            if self._server is not None:
+                return self
+            app = _flask().Flask(__name__)
+            logging.getLogger('werkzeug').disabled = True
+            app.add_url_rule(self.path, "callback", self._callback)
+            self._server = ServerThread(app, self.host, self.port)
+            self._server.daemon = True
+            self._server.start()
+        return self
+
+    def close(self):
+        """
+        > Stops the server and fails the logins still waiting.
+        """
+        with self._lock:
+            server, self._server = self._server, None
+            pending, self._pending = self._pending, {}
+        if server is not None:
+            server.shutdown()
+        for future in pending.values():
+            future.cancel()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def register(self, state: str) -> Future:
+        """
+        > Waits for the callback of a login.
+
+        Args:
+          state (str): The state sent in the auth url of the login.
+
+        Returns:
+          Future: Resolves to the authorization code.
+        """
+        future = Future()
+        with self._lock:
+            self._pending[state] = future
+        return future
+
+    def unregister(self, state: str):
+        """
+        > Stops waiting for a login, e.g. after it timed out.
+        """
+        with self._lock:
+            self._pending.pop(state, None)
+
+    def _callback(self):
+        request = _flask().request
+        state = request.args.get("state")
+        with self._lock:
+            if state is None and len(self._pending) == 1:
+                # the provider dropped the state, there is only one login it can belong to
+                state = next(iter(self._pending))
+            future = self._pending.pop(state, None)
+        if future is None:
+            return "Unknown or expired login, please try again.", 400
+        error = request.args.get("error")
+        if error is not None:
+            future.set_exception(APIError(f"{error} - {request.args.get('error_description', '')}"))
+            return "Authorization was denied, you can close this window now."
+        future.set_result(request.args.get("code"))
+        return "You can close this window now."
+
+
 # > This class is a subclass of ServerThread, and it's used to authenticate users
 class Auth(ServerThread):
     def __init__(
@@ -38,6 +135,8 @@ class Auth(ServerThread):
         callback_url: str = None,
         store_token=True,
         token_path="token.pickle",
+        listener: CallbackListener = None,
+        timeout: float = 60,
     )-> dict:
         """
         This function initializes the class with the client_id, client_secret, host, port, callback_url,
@@ -52,6 +151,9 @@ class Auth(ServerThread):
         application.
           store_token: If True, the token will be stored in a file called token.pickle. Defaults to True
           token_path: The path to the file where the token will be stored. Defaults to token.pickle
+          listener (CallbackListener): A running listener shared with other logins. By default
+        get_token_web starts a server of its own on host and port for the duration of the login.
+          timeout (float): Seconds get_token_web waits for the user to authorize the app.
         """
         self.client_id = client_id
         self.client_secret = client_secret
@@ -61,7 +163,10 @@ class Auth(ServerThread):
         self.store_token = store_token
         self.token_path = token_path
         self.code_verifier = self._get_new_code_verifier()
+        self.state = secrets.token_urlsafe(16)
         self.callback_url = callback_url
+        self.listener = listener
+        self.timeout = timeout
 
     def auth(self):
         """
@@ -71,7 +176,7 @@ class Auth(ServerThread):
         Returns:
           The token is being returned.
         """
-        if [self.host, self.port, self.callback_url].count(None) != 0:
+        if self.listener is None and [self.host, self.port, self.callback_url].count(None) != 0:
             return self.get_token_user_input()
         else:
             return self.get_token_web()
@@ -98,6 +203,7 @@ class Auth(ServerThread):
             "response_type": "code",
             "client_id": self.client_id,
             "code_challenge": self.code_verifier,
+            "state": self.state,
         }
         if self.client_secret is not None:
             params["client_secret"] = self.client_secret
@@ -116,7 +222,6 @@ class Auth(ServerThread):
         Returns:
           A dictionary containing the access token, refresh token, and expiration time.
         """
-        url = "https://myanimelist.net/v1/oauth2/token"
         data = {
             "client_id": self.client_id,
             "client_secret": self.client_secret,
@@ -126,8 +231,8 @@ class Auth(ServerThread):
             "grant_type": "authorization_code",
         }
 
-        response = requests.post(url, data)
-        token = response.json()
+        response = requests.post(TOKEN_URL, data)
+        token = _stamp_expiry(response.json())
         response.close()
 
         if self.store_token:
@@ -136,6 +241,40 @@ class Auth(ServerThread):
                 
         return token
 
+    def refresh_token(self, refresh_token: str, session=None) -> dict:
+        """
+        It exchanges a refresh token for a new access token with the refresh_token grant, without
+        asking the user again
+        
+        Args:
+          refresh_token (str): The refresh_token of the token to renew.
+          session: A requests.Session or httpx.Client to send the request with, e.g. the pooled one
+            of an API.
+        
+        Returns:
+          The new token. Its refresh_token replaces the old one, which should not be used again.
+        """
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        }
+
+        response = (session or requests).post(TOKEN_URL, data=data)
+        try:
+            if response.status_code != 200:
+                raise APIError(f"{response.status_code} - {response.text}", response.status_code)
+            token = _stamp_expiry(response.json())
+        finally:
+            response.close()
+
+        if self.store_token:
+            with open(self.token_path, "w") as f:
+                json.dump(token, f)
+
+        return token
+
     def get_token_user_input(self) -> str:
         """
         It prints out the auth url, asks the user to visit it, and then asks the user to enter the code
@@ -150,40 +289,81 @@ class Auth(ServerThread):
         print("Token generated successfully!")
         return token
 
-    def get_token_web(self) -> str:
+    def get_token_web(self, timeout: float = None) -> str:
         """
-        It starts a Flask server on a new thread, then opens a browser window to the auth url, and waits
-        for the user to authenticate. Once the user authenticates, the server receives the auth code,
-        and the function returns the token
+        It waits on the callback server for the authorization code of this login, then exchanges it
+        for a token. The server is the shared listener if one was given, else one started for this
+        login only
+        
+        Args:
+          timeout (float): Seconds to wait for the user, defaults to the timeout of the instance.
         
         Returns:
-          The token is being returned.
+          The token is being returned, or None if the user didn't authorize the app in time.
         """
-        global server
-        global code
-        code = None
-        app = Flask(__name__)
-        log = logging.getLogger('werkzeug')
-        log.disabled = True
-        path = self.callback_url.split("/")[-1]
-        print(path)
-
-        @app.route(f"/{path}")
-        def auth_code():
-            global server
-            global code
-            code = request.args.get("code")
-            return "You can close this window now."
-
-        server = ServerThread(app, self.host, self.port)
-        server.start()
-        print(f"Please visit {self.get_auth_url()}")
-        time = datetime.datetime.now()
-        while code is None:
-            if (datetime.datetime.now() - time).seconds > 60:
-                print("Timeout")
-                server.shutdown()
-                return
-            pass
-        server.shutdown()
-        return self.generate_token(code, self.code_verifier)
\ No newline at end of file
+        listener, owned = self._listener()
+        future = listener.register(self.state)
+        try:
+            print(f"Please visit {self.get_auth_url()}")
+            code = future.result(self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            print("Timeout")
+            return None
+        finally:
+            listener.unregister(self.state)
+            if owned:
+                listener.close()
+        return self.generate_token(code, self.code_verifier)
+
+    async def get_token_web_async(self, timeout: float = None) -> str:
+        """
+        Awaitable version of get_token_web, the wait doesn't hold a thread and the token request runs
+        in the default executor
+        """
+        import asyncio
+
+        listener, owned = self._listener()
+        future = listener.register(self.state)
+        try:
+            print(f"Please visit {self.get_auth_url()}")
+            code = await asyncio.wait_for(
+                asyncio.wrap_future(future), self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            print("Timeout")
+            return None
+        finally:
+            listener.unregister(self.state)
+            if owned:
+                listener.close()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate_token, code, self.code_verifier)
+
+    def _listener(self):
+        """
+        Returns the listener to wait on and whether it was started for this login only
+        """
+        if self.listener is not None:
+            return self.listener.start(), False
+        return CallbackListener(self.host, self.port, self.callback_url).start(), True
+
+def _flask():
+    """
+    > Imports Flask, which is only needed by the web callback flow.
+    """
+    try:
+        import flask
+    except ImportError:
+        raise ImportError(
+            "The web login flow requires Flask, install it with `pip install PyMAL[web]`"
+        )
+    return flask
+
+
+def _stamp_expiry(token: dict) -> dict:
+    """
+    > Stores when the access token expires next to the relative expires_in MAL sends.
+    """
+    if "expires_in" in token:
+        token["expires_at"] = time.time() + token["expires_in"]
+    return token
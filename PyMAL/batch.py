@@ -0,0 +1,143 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Shared bookkeeping of a batch: how many calls succeeded and which ones failed
+class BatchReport(object):
+    def __init__(self, keys):
+        """
+        > Removes duplicate keys while keeping their first-seen order
+
+        Args:
+          keys: Iterable of keys (e.g. anime IDs) to fetch.
+        """
+        # private, a keys attribute would make dict(batch) treat the batch as a mapping
+        self._keys = list(dict.fromkeys(keys))
+        self.succeeded = 0
+        self.errors = {}
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+
+# Iterating fetches every key on a thread pool and yields (key, result) pairs
+class Batch(BatchReport):
+    def __init__(self, fetch, keys, max_workers: int = 8, ordered: bool = False):
+        """
+        > Prepares a batch of calls, nothing is sent until it is iterated
+
+        Args:
+          fetch: Callable taking a single key and returning its result.
+          keys: Iterable of keys to fetch, duplicates are only fetched once.
+          max_workers (int): Maximum number of calls in flight.
+          ordered (bool): Yield in input order instead of completion order.
+        """
+        BatchReport.__init__(self, keys)
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.ordered = ordered
+
+    def __iter__(self):
+        keys = iter(self._keys)
+        # keep the queue short so huge batches don't allocate a future per key up front
+        window = max(self.max_workers * 2, 1)
+        pending = deque() if self.ordered else {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        def fill():
+            while len(pending) < window:
+                key = next(keys, _DONE)
+                if key is _DONE:
+                    return
+                future = executor.submit(self.fetch, key)
+                if self.ordered:
+                    pending.append((key, future))
+                else:
+                    pending[future] = key
+
+        try:
+            fill()
+            while pending:
+                if self.ordered:
+                    key, future = pending.popleft()
+                    done = [(key, future)]
+                else:
+                    finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    done = [(pending.pop(future), future) for future in finished]
+                fill()
+                for key, future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.errors[key] = e
+                        continue
+                    self.succeeded += 1
+                    yield key, result
+        finally:
+            futures = pending if not self.ordered else [future for _, future in pending]
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+# Async counterpart of Batch, iterate it with `async for`
+class AsyncBatch(BatchReport):
+    def __init__(self, fetch, keys, max_workers: int = 8, ordered: bool = False):
+        """
+        > Prepares a batch of awaitable calls, nothing is sent until it is iterated
+
+        Args:
+          fetch: Coroutine function taking a single key and returning its result.
+          keys: Iterable of keys to fetch, duplicates are only fetched once.
+          max_workers (int): Maximum number of calls in flight.
+          ordered (bool): Yield in input order instead of completion order.
+        """
+        BatchReport.__init__(self, keys)
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.ordered = ordered
+
+    async def __aiter__(self):
+        import asyncio
+
+        keys = iter(self._keys)
+        pending = deque() if self.ordered else {}
+
+        def fill():
+            while len(pending) < self.max_workers:
+                key = next(keys, _DONE)
+                if key is _DONE:
+                    return
+                task = asyncio.ensure_future(self.fetch(key))
+                if self.ordered:
+                    pending.append((key, task))
+                else:
+                    pending[task] = key
+
+        try:
+            fill()
+            while pending:
+                if self.ordered:
+                    key, task = pending.popleft()
+                    await asyncio.wait([task])
+                    done = [(key, task)]
+                else:
+                    finished, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                    done = [(pending.pop(task), task) for task in finished]
+                fill()
+                for key, task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self.errors[key] = e
+                        continue
+                    self.succeeded += 1
+                    yield key, result
+        finally:
+            tasks = pending if not self.ordered else [task for _, task in pending]
+            for task in tasks:
+                task.cancel()
+
+
+_DONE = object()
@@ -0,0 +1,368 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+from .util import endpoint_template
+
+# Catalog endpoints change a few times a day at most, user endpoints are only cached when asked to
+DEFAULT_TTLS = {
+    "anime/{id}": 6 * 3600,
+    "anime/ranking": 3600,
+    "anime/season/{year}/{season}": 3600,
+    "anime": 600,
+}
+
+# Data in these responses belongs to the token that asked for it
+_USER_ENDPOINT_PREFIXES = ("users/", "anime/suggestions")
+_USER_FIELDS = ("my_list_status", "list_status")
+
+
+# A cached response with its HTTP validators; expired entries are kept a while for revalidation
+CacheEntry = namedtuple("CacheEntry", ["value", "expires_at", "etag", "last_modified"])
+
+
+def _is_fresh(entry: CacheEntry) -> bool:
+    return entry.expires_at > time.time()
+
+
+def request_key(method: str, endpoint: str, params: dict = None, headers: dict = None) -> str:
+    """
+    > Builds the key identifying a request's response, used by the cache and single-flight.
+
+    Args:
+      method (str): The HTTP method.
+      endpoint (str): The endpoint.
+      params (dict): The query parameters.
+      headers (dict): The request headers, used to scope user specific responses.
+
+    Returns:
+      str: The key, prefixed with the token scope for user specific requests.
+    """
+    items = []
+    user_fields = False
+    for name, value in (params or {}).items():
+        if value is None:
+            continue
+        if name == "fields":
+            fields = sorted(set(str(value).split(",")))
+            user_fields = any(field in _USER_FIELDS for field in fields)
+            value = ",".join(fields)
+        items.append((name, str(value)))
+    items.sort()
+    return f"{_scope(endpoint, headers, user_fields)}{method} {endpoint}?{urlencode(items)}"
+
+
+def _scope(endpoint: str, headers: dict = None, user_fields: bool = True) -> str:
+    """
+    > Returns the key prefix of a request: empty for shared data, a token hash for user data.
+    """
+    user_endpoint = endpoint.startswith(_USER_ENDPOINT_PREFIXES) or "my_list_status" in endpoint
+    auth = (headers or {}).get("Authorization")
+    if auth is None or not (user_endpoint or user_fields):
+        return ""
+    return hashlib.sha256(auth.encode()).hexdigest()[:16] + ":"
+
+
+# Interface of a cache backend, values are the decoded JSON responses
+class CacheBackend(object):
+    evictions = 0
+
+    def get(self, key: str) -> CacheEntry:
+        """
+        > Returns the cached entry, fresh or stale, or None if the key is missing or past its stale window.
+        """
+        raise NotImplementedError
+
+    def set(
+        self,
+        key: str,
+        value,
+        ttl: float,
+        etag: str = None,
+        last_modified: str = None,
+        stale_ttl: float = 0,
+    ):
+        """
+        > Stores a value that is fresh for ttl seconds and kept stale for stale_ttl more.
+        """
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        """
+        > Removes every key starting with prefix.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        > Removes every key.
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+# A thread-safe in-process LRU cache with per-entry expiry
+class MemoryCache(CacheBackend):
+    def __init__(self, maxsize: int = 1024):
+        """
+        > Values are kept as-is, so results served from this cache are shared between callers
+        and should be treated as read-only.
+
+        Args:
+          maxsize (int): Maximum number of entries before the least recently used are evicted.
+        """
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CacheEntry:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stale_until, entry = item
+            if stale_until <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl, etag=None, last_modified=None, stale_ttl=0):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._data[key] = (expires_at + stale_ttl, CacheEntry(value, expires_at, etag, last_modified))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# An on-disk LRU cache in SQLite, several processes can share the same file
+class SQLiteCache(CacheBackend):
+    def __init__(self, path: str = "pymal_cache.sqlite", maxsize: int = 100000):
+        """
+        > Opens (and creates if needed) the cache database. WAL mode lets several worker
+        processes read and write the same file.
+
+        Args:
+          path (str): Path of the SQLite database file.
+          maxsize (int): Maximum number of entries before the least recently used are evicted.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(cache)")]
+            for column in ("etag TEXT", "last_modified TEXT", "stale_until REAL"):
+                if column.split()[0] not in columns:
+                    conn.execute(f"ALTER TABLE cache ADD COLUMN {column}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> CacheEntry:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, etag, last_modified, stale_until FROM cache WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        if (row[4] if row[4] is not None else row[1]) <= now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+
+    def set(self, key, value, ttl, etag=None, last_modified=None, stale_ttl=0):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache "
+            "(key, value, expires_at, accessed_at, etag, last_modified, stale_until) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now, etag, last_modified, now + ttl + stale_ttl),
+        )
+        overflow = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.maxsize
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def delete_prefix(self, prefix: str):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._connect().execute(
+            "DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",)
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+# Decides what API.request may cache, under which key and for how long
+class ResponseCache(object):
+    def __init__(
+        self,
+        backend: CacheBackend = None,
+        ttl: dict = None,
+        default_ttl: float = 0,
+        stale_ttl: float = 24 * 3600,
+        stale_while_revalidate: bool = False,
+    ):
+        """
+        > This function initializes the cache with a backend and per-endpoint TTLs
+
+        Keys are built from the method, endpoint and normalized params. Responses of user
+        specific endpoints (users/..., my_list_status, suggestions) are additionally keyed by
+        the token that requested them, so they are never served to another token.
+
+        Expired entries that came with an ETag or Last-Modified header are kept for stale_ttl
+        seconds so they can be refreshed with a conditional request; a 304 answer then reuses
+        the stored value without downloading or decoding a body.
+
+        Args:
+          backend (CacheBackend): Where responses are stored. Defaults to a MemoryCache.
+          ttl (dict): Seconds to cache each endpoint template for, e.g. {"anime/{id}": 3600}.
+            Merged over DEFAULT_TTLS; a TTL of 0 disables caching for that endpoint.
+          default_ttl (float): TTL of endpoints missing from ttl.
+          stale_ttl (float): How long expired entries are kept around for revalidation.
+          stale_while_revalidate (bool): Return expired entries right away and refresh them in the background.
+        """
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = dict(DEFAULT_TTLS)
+        if ttl is not None:
+            self.ttl.update(ttl)
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttl.get(endpoint_template(endpoint), self.default_ttl)
+
+    def key(self, method: str, endpoint: str, params: dict = None, headers: dict = None) -> str:
+        """
+        > Builds the cache key of a request, see request_key.
+        """
+        return request_key(method, endpoint, params, headers)
+
+    def scope(self, endpoint: str, headers: dict = None, user_fields: bool = True) -> str:
+        return _scope(endpoint, headers, user_fields)
+
+    def get(self, key: str) -> CacheEntry:
+        """
+        > Returns the entry stored under key, check `fresh()` before serving it without revalidation.
+        """
+        entry = self.backend.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            elif _is_fresh(entry):
+                self.hits += 1
+            else:
+                self.stale += 1
+        return entry
+
+    def fresh(self, entry: CacheEntry) -> bool:
+        return entry is not None and _is_fresh(entry)
+
+    def set(self, key: str, value, ttl: float, etag: str = None, last_modified: str = None):
+        keep_stale = etag is not None or last_modified is not None or self.stale_while_revalidate
+        self.backend.set(
+            key, value, ttl, etag, last_modified, self.stale_ttl if keep_stale else 0
+        )
+
+    def conditional_headers(self, entry: CacheEntry) -> dict:
+        """
+        > Returns the If-None-Match / If-Modified-Since headers to revalidate an entry with.
+        """
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def not_modified(self, key: str, entry: CacheEntry, ttl: float):
+        """
+        > Marks a stale entry fresh again after the API answered 304 Not Modified.
+        """
+        with self._lock:
+            self.revalidated += 1
+        self.set(key, entry.value, ttl, entry.etag, entry.last_modified)
+
+    def invalidate(self, endpoint: str, headers: dict = None):
+        """
+        > Drops the cached responses of the token that a write to endpoint makes stale.
+
+        Args:
+          endpoint (str): The endpoint that was written to, e.g. anime/5114/my_list_status.
+          headers (dict): The request headers of the write.
+        """
+        scope = self.scope(endpoint, headers)
+        if not scope:
+            return
+        anime_endpoint = endpoint.rsplit("/my_list_status", 1)[0]
+        self.backend.delete_prefix(f"{scope}GET {anime_endpoint}?")
+        self.backend.delete_prefix(f"{scope}GET users/")
+
+    def stats(self) -> dict:
+        """
+        > Returns the hit, miss, stale, revalidation and eviction counters plus the number of stored entries.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "revalidated": self.revalidated,
+                "evictions": self.backend.evictions,
+                "size": len(self.backend),
+            }
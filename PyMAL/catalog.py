@@ -0,0 +1,334 @@
+import json
+import os
+import sqlite3
+import threading
+from itertools import islice
+
+from .fields import FIELD_PRESETS
+from .jsonstream import loads
+
+# Fields crawled into the catalog, everything search and the filters need
+CATALOG_FIELDS = FIELD_PRESETS["list"]
+
+_ORDERS = {
+    "popularity": "a.popularity IS NULL, a.popularity",
+    "mean": "a.mean IS NULL, a.mean DESC",
+    "rank": "a.rank IS NULL, a.rank",
+    "title": "a.title COLLATE NOCASE",
+    "start_date": "a.start_date IS NULL, a.start_date DESC",
+}
+
+# Nodes are written in transactions of this many, so a crawl never holds the write lock for long
+_WRITE_BATCH = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS anime ("
+    "id INTEGER PRIMARY KEY, title TEXT, media_type TEXT, status TEXT, mean REAL, "
+    "rank INTEGER, popularity INTEGER, start_date TEXT, season_year INTEGER, season TEXT, "
+    "updated_at TEXT, data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS anime_media_type ON anime (media_type)",
+    "CREATE INDEX IF NOT EXISTS anime_status ON anime (status)",
+    "CREATE INDEX IF NOT EXISTS anime_mean ON anime (mean)",
+    "CREATE INDEX IF NOT EXISTS anime_season ON anime (season_year, season)",
+    "CREATE TABLE IF NOT EXISTS anime_titles ("
+    "anime_id INTEGER NOT NULL, key TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS anime_titles_key ON anime_titles (key)",
+    "CREATE INDEX IF NOT EXISTS anime_titles_anime_id ON anime_titles (anime_id)",
+    "CREATE TABLE IF NOT EXISTS anime_genres ("
+    "anime_id INTEGER NOT NULL, id INTEGER, name TEXT COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS anime_genres_name ON anime_genres (name)",
+    "CREATE INDEX IF NOT EXISTS anime_genres_id ON anime_genres (id)",
+    "CREATE INDEX IF NOT EXISTS anime_genres_anime_id ON anime_genres (anime_id)",
+    "CREATE TABLE IF NOT EXISTS anime_studios ("
+    "anime_id INTEGER NOT NULL, id INTEGER, name TEXT COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS anime_studios_name ON anime_studios (name)",
+    "CREATE INDEX IF NOT EXISTS anime_studios_id ON anime_studios (id)",
+    "CREATE INDEX IF NOT EXISTS anime_studios_anime_id ON anime_studios (anime_id)",
+) + tuple(
+    # one index per ordering, so a LIMIT query walks it and stops instead of sorting every match
+    f"CREATE INDEX IF NOT EXISTS anime_order_{name} ON anime ({order.replace('a.', '')})"
+    for name, order in _ORDERS.items()
+)
+
+
+def _titles(node: dict) -> list:
+    titles = [node.get("title")]
+    alternative = node.get("alternative_titles") or {}
+    titles += [alternative.get("en"), alternative.get("ja")]
+    titles += alternative.get("synonyms") or []
+    return list(dict.fromkeys(title for title in titles if title))
+
+
+# A local, indexed copy of the anime catalog for searching and filtering without the network
+class Catalog(object):
+    def __init__(self, path: str = "pymal_catalog.sqlite"):
+        """
+        > Opens (and creates if needed) the catalog database.
+
+        Titles are indexed with an FTS5 trigram index for substring search where SQLite
+        supports it, and by lowercase prefix otherwise. Genres, studios, season, media_type,
+        status and mean each have their own index.
+
+        Args:
+          path (str): Path of the SQLite database file. Several threads and processes can share it.
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS anime_fts USING fts5(titles, tokenize='trigram')"
+            )
+            self.trigram = True
+        except sqlite3.OperationalError:
+            # SQLite before 3.34 has no trigram tokenizer
+            self.trigram = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM anime").fetchone()[0]
+
+    def get(self, anime_id: int) -> dict:
+        """
+        > Returns the stored anime, or None if it isn't in the catalog.
+        """
+        row = self._connect().execute("SELECT data FROM anime WHERE id = ?", (anime_id,)).fetchone()
+        return loads(row[0]) if row is not None else None
+
+    def upsert(self, nodes) -> int:
+        """
+        > Adds or updates anime, merging the given fields over what is already stored.
+
+        Args:
+          nodes: Iterable of anime dicts, e.g. a listing iterator.
+
+        Returns:
+          int: Number of anime written, unchanged ones are skipped.
+        """
+        nodes = iter(nodes)
+        written = 0
+        while True:
+            batch = list(islice(nodes, _WRITE_BATCH))
+            if not batch:
+                return written
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for node in batch:
+                    row = conn.execute("SELECT data FROM anime WHERE id = ?", (node["id"],)).fetchone()
+                    if row is not None:
+                        stored = loads(row[0])
+                        merged = dict(stored, **node)
+                        if merged == stored:
+                            continue
+                        node = merged
+                    self._write(conn, node)
+                    written += 1
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _write(self, conn: sqlite3.Connection, node: dict):
+        anime_id = node["id"]
+        season = node.get("start_season") or {}
+        conn.execute(
+            "INSERT OR REPLACE INTO anime (id, title, media_type, status, mean, rank, popularity, "
+            "start_date, season_year, season, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                anime_id,
+                node.get("title"),
+                node.get("media_type"),
+                node.get("status"),
+                node.get("mean"),
+                node.get("rank"),
+                node.get("popularity"),
+                node.get("start_date"),
+                season.get("year"),
+                season.get("season"),
+                node.get("updated_at"),
+                json.dumps(node, ensure_ascii=False),
+            ),
+        )
+        titles = _titles(node)
+        for table in ("anime_titles", "anime_genres", "anime_studios"):
+            conn.execute(f"DELETE FROM {table} WHERE anime_id = ?", (anime_id,))
+        conn.executemany(
+            "INSERT INTO anime_titles (anime_id, key) VALUES (?, ?)",
+            [(anime_id, title.lower()) for title in titles],
+        )
+        for table, key in (("anime_genres", "genres"), ("anime_studios", "studios")):
+            conn.executemany(
+                f"INSERT INTO {table} (anime_id, id, name) VALUES (?, ?, ?)",
+                [(anime_id, item.get("id"), item.get("name")) for item in node.get(key) or ()],
+            )
+        if self.trigram:
+            conn.execute("DELETE FROM anime_fts WHERE rowid = ?", (anime_id,))
+            conn.execute(
+                "INSERT INTO anime_fts (rowid, titles) VALUES (?, ?)", (anime_id, "\n".join(titles))
+            )
+
+    def stale(self, nodes) -> list:
+        """
+        > Returns the IDs of the given anime that are missing or have a newer updated_at than stored.
+
+        Args:
+          nodes: Iterable of anime dicts with at least id and updated_at.
+
+        Returns:
+          list: Anime IDs that need to be fetched again.
+        """
+        conn = self._connect()
+        ids = []
+        for node in nodes:
+            row = conn.execute("SELECT updated_at FROM anime WHERE id = ?", (node["id"],)).fetchone()
+            updated_at = node.get("updated_at")
+            if row is None or (updated_at is not None and (row[0] is None or updated_at > row[0])):
+                ids.append(node["id"])
+        return ids
+
+    def refresh(self, client, nodes, max_workers: int = 8) -> int:
+        """
+        > Fetches the details of every anime that changed since it was stored and updates it.
+
+        Cheap listings make good input, e.g.
+        `client.iter_anime_ranking(fields="id,updated_at")`.
+
+        Args:
+          client (Client): The client used to fetch the details.
+          nodes: Iterable of anime dicts with at least id and updated_at.
+          max_workers (int): Maximum number of detail requests in flight.
+
+        Returns:
+          int: Number of anime written.
+        """
+        ids = self.stale(nodes)
+        batch = client.get_anime_details_many(
+            ids, max_workers=max_workers, fields=CATALOG_FIELDS, models=False
+        )
+        return self.upsert(details for _, details in batch)
+
+    def crawl_ranking(
+        self, client, ranking_type: str = "all", max_items: int = None, max_in_flight: int = 4
+    ) -> int:
+        """
+        > Fills the catalog from an anime ranking.
+
+        Returns:
+          int: Number of anime written.
+        """
+        return self.upsert(
+            client.iter_anime_ranking(
+                ranking_type,
+                limit=500,
+                max_items=max_items,
+                max_in_flight=max_in_flight,
+                fields=CATALOG_FIELDS,
+                models=False,
+            )
+        )
+
+    def crawl_season(self, client, year: int, season: str) -> int:
+        """
+        > Fills the catalog from a seasonal listing.
+
+        Returns:
+          int: Number of anime written.
+        """
+        return self.upsert(
+            client.iter_seasonal_anime(
+                season, year, limit=500, fields=CATALOG_FIELDS, models=False
+            )
+        )
+
+    def search(
+        self,
+        query: str = None,
+        limit: int = 10,
+        offset: int = 0,
+        genre=None,
+        studio=None,
+        year: int = None,
+        season: str = None,
+        media_type: str = None,
+        status: str = None,
+        min_mean: float = None,
+        order_by: str = "popularity",
+    ) -> list:
+        """
+        > Searches the catalog without touching the network.
+
+        Args:
+          query (str): Matched anywhere in any title (main, English, Japanese or synonym).
+            Queries shorter than 3 characters match title prefixes.
+          limit (int): Maximum number of results to return.
+          offset (int): Offset of results to return.
+          genre: Genre name or ID.
+          studio: Studio name or ID.
+          year (int): Start season year.
+          season (str): Start season (winter, spring, summer, fall).
+          media_type (str): Media type, e.g. tv or movie.
+          status (str): Airing status, e.g. currently_airing.
+          min_mean (float): Lowest mean score.
+          order_by (str): One of popularity, mean, rank, title or start_date.
+
+        Returns:
+          list: The stored anime dicts.
+        """
+        if order_by not in _ORDERS:
+            raise ValueError(f"order_by must be one of {list(_ORDERS)}")
+        clauses = []
+        args = []
+        if query:
+            key = query.lower()
+            if self.trigram and len(query) >= 3:
+                clauses.append("a.id IN (SELECT rowid FROM anime_fts WHERE anime_fts MATCH ?)")
+                args.append('"' + query.replace('"', '""') + '"')
+            elif len(query) >= 3:
+                escaped = key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                clauses.append(
+                    "a.id IN (SELECT anime_id FROM anime_titles WHERE key LIKE ? ESCAPE '\\')"
+                )
+                args.append(f"%{escaped}%")
+            else:
+                clauses.append("a.id IN (SELECT anime_id FROM anime_titles WHERE key >= ? AND key < ?)")
+                args += [key, key + "\U0010ffff"]
+        for table, value in (("anime_genres", genre), ("anime_studios", studio)):
+            if value is not None:
+                column = "id" if isinstance(value, int) else "name"
+                clauses.append(
+                    f"EXISTS (SELECT 1 FROM {table} t WHERE t.anime_id = a.id AND t.{column} = ?)"
+                )
+                args.append(value)
+        for column, value in (
+            ("season_year", year),
+            ("season", season),
+            ("media_type", media_type),
+            ("status", status),
+        ):
+            if value is not None:
+                clauses.append(f"a.{column} = ?")
+                args.append(value)
+        if min_mean is not None:
+            clauses.append("a.mean >= ?")
+            args.append(min_mean)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT a.data FROM anime a {where}ORDER BY {_ORDERS[order_by]}, a.id LIMIT ? OFFSET ?",
+            args + [limit, offset],
+        )
+        return [loads(data) for data, in rows]
@@ -1,11 +1,15 @@
 import json
 import os
-from .rest_adapter import API
-from .auth import Auth
-from .modules.user import User
-from .modules.anime import Anime
+from .rest_adapter import API, AsyncAPI
+from .transport import DEFAULT_COMPRESSION
+from .ratelimit import RateLimiter
+from .cache import CacheBackend, MemoryCache, ResponseCache
+from .fields import ANIME_FIELDS, FIELD_PRESETS, resolve_fields
+from .modules.user import User, AsyncUser
+from .modules.anime import Anime, AsyncAnime
 
-class Client(API, User, Anime):
+
+class BaseClient:
     def __init__(
         self,
         client_id: str,
@@ -16,27 +20,25 @@ class Client(API, User, Anime):
         callback_url: str = None,
         store_token=True,
         token_path="token.json",
-        
+        fields="full",
+        models: bool = False,
+        catalog=None,
     ):
         """
-        > This function initializes the class with the client ID, client secret, and token path
-        
-        if user_login is set to False, the client will not attempt to login the user instead it will use client_id in the  X-MAL-CLIENT-ID request header to authenticate the request with a limited scope.
-        
-        client_secret can be set to None if you did not set "web" as the "App Type" in the MAL API config.
-        
-        if host and or port are not specified, the client will use console input to retrieve authoirzation code
-        
-        else, the client will use the the host and port to retrieve authoirzation code via callback url
+        > Sets up the credentials, auth headers and anime fields shared by Client and AsyncClient
 
         Args:
           client_id (str): The client ID of the API.
           client_secret (str): The client secret of the API.
+          user_login (bool): Log the user in instead of sending the client ID header.
           host (str): The host to use for the callback url.
           port (int): The port to use for the callback url.
           callback_url (str): The callback url set in the MAL apiconfig.
           token_path (str): The path to the token file.
           store_token (bool): Whether or not to store the token in the token file.
+          fields: Default anime fields, a preset name (minimal, list, full) or a list of field names.
+          models (bool): Return typed models from PyMAL.models instead of dicts by default.
+          catalog (Catalog): Local catalog searched by search_anime(source="local").
         """
         self.client_id = client_id
         self.client_secret = client_secret
@@ -45,59 +47,305 @@ class Client(API, User, Anime):
         self.callback_url = callback_url
         self.token_path = token_path
         self.store_token = store_token
-        
+
         if user_login:
             self.headers = {"Authorization": f"Bearer {self.get_token()['access_token']}"}
         else:
             self.headers = {"X-MAL-CLIENT-ID": self.client_id}
-        
-        self.api_call = API(base_url="https://api.myanimelist.net", version="v2", headers=self.headers)
-        self.anime_fields = [
-            "id",
-            "title",
-            "main_picture",
-            "alternative_titles",
-            "start_date",
-            "end_date",
-            "synopsis",
-            "mean",
-            "rank",
-            "popularity",
-            "num_list_users",
-            "num_scoring_users",
-            "nsfw",
-            "created_at",
-            "updated_at",
-            "media_type",
-            "status",
-            "genres",
-            "my_list_status",
-            "num_episodes",
-            "start_season",
-            "broadcast",
-            "source",
-            "average_episode_duration",
-            "rating",
-            "pictures",
-            "background",
-            "related_anime",
-            "related_manga",
-            "recommendations",
-            "studios",
-            "statistic",
-        ]
-    
+
+        self.anime_fields = list(ANIME_FIELDS)
+        self.default_fields = resolve_fields(fields, FIELD_PRESETS["full"])
+        self.models = models
+        self.catalog = catalog
+
+    def rate_limit_stats(self) -> dict:
+        """
+        > Returns the paced, throttled, retried and failed request counters of the rate limiter.
+
+        Returns:
+          dict: The rate limiter counters.
+        """
+        return self.api_call.rate_limiter.stats()
+
+    def cache_stats(self) -> dict:
+        """
+        > Returns the hit, miss and eviction counters of the response cache.
+
+        Returns:
+          dict: The cache counters, empty if caching is disabled.
+        """
+        if self.api_call.cache is None:
+            return {}
+        return self.api_call.cache.stats()
+
+    def single_flight_stats(self) -> dict:
+        """
+        > Returns how many GETs were actually sent and how many shared an identical one in flight.
+
+        Returns:
+          dict: The single-flight counters, empty if it is disabled.
+        """
+        if self.api_call.single_flight is None:
+            return {}
+        return self.api_call.single_flight.stats()
+
     def get_token(self):
         """
         If the token path exists, open the file and return the token. If it doesn't exist, return the
         auth function
-        
+
         Returns:
           The token is being returned.
         """
+        from .auth import Auth
+
         if self.token_path is not None:
           if os.path.exists(self.token_path):
               with open(self.token_path, "r") as file:
                   token = json.load(file)
                   return token
         return Auth(self.client_id, self.client_secret, self.host, self.port, self.callback_url, self.store_token, self.token_path).auth()
+
+
+def _response_cache(cache) -> ResponseCache:
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return ResponseCache(MemoryCache())
+    if isinstance(cache, CacheBackend):
+        return ResponseCache(cache)
+    return cache
+
+
+class Client(BaseClient, API, User, Anime):
+    def __init__(
+        self,
+        client_id: str,
+        client_secret=None,
+        user_login:bool = True,
+        host: str = None,
+        port: int = None,
+        callback_url: str = None,
+        store_token=True,
+        token_path="token.json",
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        timeout=None,
+        rate_limit: float = None,
+        burst: int = 1,
+        max_retries: int = 3,
+        rate_limiter: RateLimiter = None,
+        cache=None,
+        single_flight: bool = True,
+        fields="full",
+        models: bool = False,
+        catalog=None,
+        base_url: str = "https://api.myanimelist.net",
+        hooks=None,
+        transport=None,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        """
+        > This function initializes the class with the client ID, client secret, and token path
+
+        if user_login is set to False, the client will not attempt to login the user instead it will use client_id in the  X-MAL-CLIENT-ID request header to authenticate the request with a limited scope.
+
+        client_secret can be set to None if you did not set "web" as the "App Type" in the MAL API config.
+
+        if host and or port are not specified, the client will use console input to retrieve authoirzation code
+
+        else, the client will use the the host and port to retrieve authoirzation code via callback url
+
+        Args:
+          client_id (str): The client ID of the API.
+          client_secret (str): The client secret of the API.
+          host (str): The host to use for the callback url.
+          port (int): The port to use for the callback url.
+          callback_url (str): The callback url set in the MAL apiconfig.
+          token_path (str): The path to the token file.
+          store_token (bool): Whether or not to store the token in the token file.
+          pool_connections (int): Number of per-host connection pools to keep.
+          pool_maxsize (int): Maximum number of connections kept open per host.
+          keep_alive (bool): Keep connections open between requests.
+          timeout: Request timeout in seconds, or a (connect, read) tuple.
+          rate_limit (float): Maximum requests per second. None only backs off when throttled.
+          burst (int): Number of requests that can be sent back to back.
+          max_retries (int): How many times a request answered with 429/5xx is retried.
+          rate_limiter (RateLimiter): Limiter to share with other clients, overrides the three above.
+          cache: Cache GET responses. True uses an in-memory cache with the default TTLs, a
+            CacheBackend (e.g. SQLiteCache) or a ResponseCache can be passed for more control.
+          single_flight (bool): Identical GETs made at the same time (e.g. by several threads)
+            share one request and its result, see single_flight_stats().
+          fields: Default anime fields requested when a method isn't given any, a preset name
+            (minimal, list, full) or a list of field names.
+          models (bool): Return typed, memory compact models (see PyMAL.models) instead of dicts
+            from the listing and details methods. Can be overridden per call.
+          catalog (Catalog): Local catalog searched by search_anime(source="local").
+          base_url (str): Root URL of the API, e.g. a local stand-in server for tests and benchmarks.
+          hooks: Instrumentation hooks (see PyMAL.instrument), e.g. a Metrics, or a list of them.
+          transport: How requests are sent, None for pooled HTTP/1.1, "http2" to multiplex the
+            calls over a few HTTP/2 connections or a Transport (see PyMAL.transport).
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
+        """
+        BaseClient.__init__(
+            self,
+            client_id,
+            client_secret,
+            user_login,
+            host,
+            port,
+            callback_url,
+            store_token,
+            token_path,
+            fields,
+            models,
+            catalog,
+        )
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(rate=rate_limit, burst=burst, max_retries=max_retries)
+        self.api_call = API(
+            base_url=base_url,
+            version="v2",
+            headers=self.headers,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            keep_alive=keep_alive,
+            timeout=timeout,
+            rate_limiter=rate_limiter,
+            cache=_response_cache(cache),
+            single_flight=single_flight,
+            hooks=hooks,
+            transport=transport,
+            compression=compression,
+        )
+
+    def pool_stats(self) -> dict:
+        """
+        > Returns connection pool statistics of the shared session.
+
+        Returns:
+          dict: requests sent, connections opened, reused requests and idle connections.
+        """
+        return self.api_call.pool_stats()
+
+    def close(self):
+        """
+        > Closes every pooled connection.
+        """
+        self.api_call.close()
+
+
+class AsyncClient(BaseClient, AsyncUser, AsyncAnime):
+    def __init__(
+        self,
+        client_id: str,
+        client_secret=None,
+        user_login:bool = True,
+        host: str = None,
+        port: int = None,
+        callback_url: str = None,
+        store_token=True,
+        token_path="token.json",
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        max_concurrency: int = None,
+        timeout=None,
+        rate_limit: float = None,
+        burst: int = 1,
+        max_retries: int = 3,
+        rate_limiter: RateLimiter = None,
+        cache=None,
+        single_flight: bool = True,
+        fields="full",
+        models: bool = False,
+        catalog=None,
+        base_url: str = "https://api.myanimelist.net",
+        hooks=None,
+        http2: bool = False,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        """
+        > Asyncio counterpart of Client, every User and Anime method is awaitable
+
+        Authentication works the same way as in Client. The login itself is blocking, so
+        create the client before starting the event loop or keep a stored token around.
+
+        Args:
+          client_id (str): The client ID of the API.
+          client_secret (str): The client secret of the API.
+          host (str): The host to use for the callback url.
+          port (int): The port to use for the callback url.
+          callback_url (str): The callback url set in the MAL apiconfig.
+          token_path (str): The path to the token file.
+          store_token (bool): Whether or not to store the token in the token file.
+          max_connections (int): Maximum number of open connections.
+          max_keepalive_connections (int): Maximum number of idle connections kept alive.
+          keepalive_expiry (float): Seconds an idle connection is kept alive.
+          max_concurrency (int): Maximum number of requests in flight at once. None is unlimited.
+          timeout: Request timeout in seconds.
+          rate_limit (float): Maximum requests per second. None only backs off when throttled.
+          burst (int): Number of requests that can be sent back to back.
+          max_retries (int): How many times a request answered with 429/5xx is retried.
+          rate_limiter (RateLimiter): Limiter to share with other clients, overrides the three above.
+          cache: Cache GET responses. True uses an in-memory cache with the default TTLs, a
+            CacheBackend (e.g. SQLiteCache) or a ResponseCache can be passed for more control.
+          single_flight (bool): Identical GETs made at the same time (e.g. by several threads)
+            share one request and its result, see single_flight_stats().
+          fields: Default anime fields requested when a method isn't given any, a preset name
+            (minimal, list, full) or a list of field names.
+          models (bool): Return typed, memory compact models (see PyMAL.models) instead of dicts
+            from the listing and details methods. Can be overridden per call.
+          catalog (Catalog): Local catalog searched by search_anime(source="local").
+          base_url (str): Root URL of the API, e.g. a local stand-in server for tests and benchmarks.
+          hooks: Instrumentation hooks (see PyMAL.instrument), e.g. a Metrics, or a list of them.
+          http2 (bool): Multiplex the requests over a few HTTP/2 connections.
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
+        """
+        BaseClient.__init__(
+            self,
+            client_id,
+            client_secret,
+            user_login,
+            host,
+            port,
+            callback_url,
+            store_token,
+            token_path,
+            fields,
+            models,
+            catalog,
+        )
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(rate=rate_limit, burst=burst, max_retries=max_retries)
+        self.api_call = AsyncAPI(
+            base_url=base_url,
+            version="v2",
+            headers=self.headers,
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            rate_limiter=rate_limiter,
+            cache=_response_cache(cache),
+            single_flight=single_flight,
+            hooks=hooks,
+            http2=http2,
+            compression=compression,
+        )
+
+    async def close(self):
+        """
+        > Closes every pooled connection.
+        """
+        await self.api_call.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
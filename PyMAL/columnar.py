@@ -0,0 +1,303 @@
+# Column-oriented export of listings for analytics. The rows are the decoded API items
+# themselves, each column is built in one pass over them, nested parts are flattened into
+# prefixed columns and enum-like values are dictionary encoded.
+from itertools import accumulate, chain, repeat
+from operator import itemgetter
+
+_EMPTY = {}
+
+# (column, path in the node, kind) of the anime fields, a column is only exported when the
+# listing was requested with its field
+ANIME_COLUMNS = (
+    ("id", ("id",), "int"),
+    ("title", ("title",), "str"),
+    ("main_picture_medium", ("main_picture", "medium"), "str"),
+    ("main_picture_large", ("main_picture", "large"), "str"),
+    ("alternative_titles_en", ("alternative_titles", "en"), "str"),
+    ("alternative_titles_ja", ("alternative_titles", "ja"), "str"),
+    ("start_date", ("start_date",), "str"),
+    ("end_date", ("end_date",), "str"),
+    ("synopsis", ("synopsis",), "str"),
+    ("mean", ("mean",), "float"),
+    ("rank", ("rank",), "int"),
+    ("popularity", ("popularity",), "int"),
+    ("num_list_users", ("num_list_users",), "int"),
+    ("num_scoring_users", ("num_scoring_users",), "int"),
+    ("nsfw", ("nsfw",), "category"),
+    ("created_at", ("created_at",), "str"),
+    ("updated_at", ("updated_at",), "str"),
+    ("media_type", ("media_type",), "category"),
+    ("status", ("status",), "category"),
+    ("genres", ("genres",), "categories"),
+    ("num_episodes", ("num_episodes",), "int"),
+    ("start_season_year", ("start_season", "year"), "int"),
+    ("start_season_season", ("start_season", "season"), "category"),
+    ("broadcast_day_of_the_week", ("broadcast", "day_of_the_week"), "category"),
+    ("broadcast_start_time", ("broadcast", "start_time"), "str"),
+    ("source", ("source",), "category"),
+    ("average_episode_duration", ("average_episode_duration",), "int"),
+    ("rating", ("rating",), "category"),
+    ("studios", ("studios",), "categories"),
+)
+# Columns of the list_status sent with user anime list entries
+LIST_STATUS_COLUMNS = (
+    ("list_status_status", ("status",), "category"),
+    ("list_status_score", ("score",), "int"),
+    ("list_status_num_episodes_watched", ("num_episodes_watched",), "int"),
+    ("list_status_is_rewatching", ("is_rewatching",), "bool"),
+    ("list_status_start_date", ("start_date",), "str"),
+    ("list_status_finish_date", ("finish_date",), "str"),
+    ("list_status_priority", ("priority",), "int"),
+    ("list_status_num_times_rewatched", ("num_times_rewatched",), "int"),
+    ("list_status_rewatch_value", ("rewatch_value",), "int"),
+    ("list_status_tags", ("tags",), "categories"),
+    ("list_status_comments", ("comments",), "str"),
+    ("list_status_updated_at", ("updated_at",), "str"),
+)
+# Column of the ranking sent with anime/ranking entries
+RANKING_COLUMNS = (("ranking", ("rank",), "int"),)
+
+
+# Passed as the model of the page iterators to get the listing items as the API sent them
+class RawItem(object):
+    @staticmethod
+    def from_item(item: dict) -> dict:
+        return item
+
+
+# A listing held as columns, exported to NumPy arrays, an Arrow table or a Parquet file
+class AnimeColumns(object):
+    def __init__(self):
+        """
+        > Starts an empty set of columns, fill it with add_items, add_page or use from_items /
+        from_results.
+        """
+        self._nodes = []
+        self._list_statuses = []
+        self._rankings = []
+        self._columns = None
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        > Builds the columns from listing items as the API sends them ({"node": ..., ...}), e.g.
+        the pages of iter_pages with model=RawItem.
+        """
+        columns = cls()
+        columns.add_items(items)
+        return columns
+
+    @classmethod
+    def from_results(cls, results: list):
+        """
+        > Builds the columns from the dicts returned by get_user_anime_list, get_anime_ranking,
+        get_seasonal_anime or their iter_ versions.
+        """
+        columns = cls()
+        for node in results:
+            if not isinstance(node, dict):
+                raise TypeError("AnimeColumns needs dict results, call the client with models=False")
+            columns._nodes.append(node)
+            columns._list_statuses.append(node.get("list_status") or _EMPTY)
+            columns._rankings.append(_EMPTY)
+        return columns
+
+    def add_items(self, items):
+        """
+        > Appends listing items as the API sends them.
+        """
+        for item in items:
+            self._nodes.append(item["node"])
+            self._list_statuses.append(item.get("list_status") or _EMPTY)
+            self._rankings.append(item.get("ranking") or _EMPTY)
+        self._columns = None
+
+    def extend(self, other):
+        """
+        > Appends the rows of another AnimeColumns, e.g. to put several user lists together.
+        """
+        self._nodes.extend(other._nodes)
+        self._list_statuses.extend(other._list_statuses)
+        self._rankings.extend(other._rankings)
+        self._columns = None
+
+    def add_page(self, page: dict):
+        """
+        > Appends the items of a decoded listing page.
+        """
+        self.add_items(page.get("data", ()))
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _build(self) -> dict:
+        """
+        > Returns {column: (kind, values)}, values being plain lists, (codes, categories) for a
+        category and (offsets, codes, missing, categories) for a list of categories.
+        """
+        if self._columns is not None:
+            return self._columns
+        columns = {}
+        for specs, rows in (
+            (ANIME_COLUMNS, self._nodes),
+            (LIST_STATUS_COLUMNS, self._list_statuses),
+            (RANKING_COLUMNS, self._rankings),
+        ):
+            # fields that weren't requested are missing from every row
+            present = set(chain.from_iterable(rows))
+            for name, path, kind in specs:
+                if path[0] not in present:
+                    continue
+                values = _values(rows, path)
+                if kind == "category":
+                    values = _encode(values)
+                elif kind == "categories":
+                    values = _encode_lists(values)
+                columns[name] = (kind, values)
+        self._columns = columns
+        return columns
+
+    @property
+    def column_names(self) -> list:
+        return list(self._build())
+
+    def categories(self, column: str) -> list:
+        """
+        > Returns the values the codes of a dictionary encoded column point to.
+        """
+        kind, values = self._build()[column]
+        if kind not in ("category", "categories"):
+            raise ValueError(f"{column} is not a dictionary encoded column")
+        return values[-1]
+
+    def to_numpy(self) -> dict:
+        """
+        > Exports the columns as NumPy arrays.
+
+        Integer columns with missing values become float64 with NaN. Category columns are int32
+        codes into categories(column), -1 when missing. A list of categories (genres, studios,
+        tags) is exported as its flat int32 codes plus a "{column}_offsets" array: the codes
+        of row i are codes[offsets[i]:offsets[i + 1]].
+
+        Returns:
+          dict: Array of each column.
+        """
+        np = _numpy()
+        arrays = {}
+        for name, (kind, values) in self._build().items():
+            if kind == "category":
+                codes, _ = values
+                if None in codes:
+                    codes = [-1 if code is None else code for code in codes]
+                arrays[name] = np.array(codes, dtype=np.int32)
+            elif kind == "categories":
+                offsets, codes, _, _ = values
+                arrays[name] = np.array(codes, dtype=np.int32)
+                arrays[name + "_offsets"] = np.array(offsets, dtype=np.int64)
+            elif kind == "str":
+                arrays[name] = np.array(values, dtype=object)
+            elif None in values:
+                arrays[name] = np.array([float("nan") if value is None else value for value in values], dtype=np.float64)
+            else:
+                arrays[name] = np.array(values, dtype=_NUMPY_TYPES[kind])
+        return arrays
+
+    def to_arrow(self):
+        """
+        > Exports the columns as a pyarrow Table, category columns as dictionary arrays and
+        lists of categories as lists of dictionary values.
+        """
+        pa = _pyarrow()
+        types = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "str": pa.string()}
+        arrays = {}
+        for name, (kind, values) in self._build().items():
+            if kind == "category":
+                codes, categories = values
+                arrays[name] = pa.DictionaryArray.from_arrays(
+                    pa.array(codes, type=pa.int32()), pa.array(categories, type=pa.string())
+                )
+            elif kind == "categories":
+                offsets, codes, missing, categories = values
+                flat = pa.DictionaryArray.from_arrays(
+                    pa.array(codes, type=pa.int32()), pa.array(categories, type=pa.string())
+                )
+                arrays[name] = pa.ListArray.from_arrays(
+                    pa.array(offsets, type=pa.int32()),
+                    flat,
+                    mask=pa.array(missing, type=pa.bool_()) if any(missing) else None,
+                )
+            else:
+                arrays[name] = pa.array(values, type=types[kind])
+        return pa.table(arrays)
+
+    def to_parquet(self, path: str, **kwargs):
+        """
+        > Writes the columns to a Parquet file, kwargs are passed to pyarrow.parquet.write_table
+        (e.g. compression="zstd").
+        """
+        _pyarrow()
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+
+def _values(rows: list, path: tuple) -> list:
+    if len(path) == 1:
+        return list(map(dict.get, rows, repeat(path[0])))
+    outer, inner = path
+    return [
+        None if value is None else value.get(inner)
+        for value in map(dict.get, rows, repeat(outer))
+    ]
+
+
+def _encode(values: list) -> tuple:
+    """
+    > Dictionary encodes values, returns the codes (None when missing) and the categories.
+    """
+    categories = [value for value in dict.fromkeys(values) if value is not None]
+    index = {value: code for code, value in enumerate(categories)}
+    index[None] = None
+    return list(map(index.__getitem__, values)), categories
+
+
+def _encode_lists(values: list) -> tuple:
+    """
+    > Dictionary encodes lists of names (or of {"name": ...} dicts such as genres), returns the
+    offsets of each row, the flat codes, which rows are missing and the categories.
+    """
+    lists = [value or () for value in values]
+    offsets = [0]
+    offsets.extend(accumulate(map(len, lists)))
+    names = list(chain.from_iterable(lists))
+    if names and isinstance(names[0], dict):
+        names = list(map(itemgetter("name"), names))
+    categories = list(dict.fromkeys(names))
+    index = {name: code for code, name in enumerate(categories)}
+    codes = list(map(index.__getitem__, names))
+    return offsets, codes, [value is None for value in values], categories
+
+
+_NUMPY_TYPES = {"int": "int64", "float": "float64", "bool": "bool"}
+
+
+def _numpy():
+    """
+    > Imports NumPy, which is only needed by the NumPy export.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("to_numpy requires NumPy, install it with `pip install PyMAL[numpy]`")
+    return numpy
+
+
+def _pyarrow():
+    """
+    > Imports pyarrow, which is only needed by the Arrow and Parquet exports.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("to_arrow and to_parquet require pyarrow, install it with `pip install PyMAL[arrow]`")
+    return pyarrow
@@ -0,0 +1,351 @@
+"""
+Resumable, sharded crawler for the anime catalog.
+
+    python -m PyMAL.crawl ranking --client-id ID --out ranking.jsonl --rate 2
+    python -m PyMAL.crawl details --client-id ID --ids-from ranking.jsonl --out details.jsonl
+
+The ranking mode walks anime/ranking page by page; the details mode fetches anime/{id} for
+an ID range or for the IDs found in an earlier output. The work is split into shards (one
+ranking page, or a chunk of IDs) that run on a process pool. Results are appended to one
+JSON lines file, and a checkpoint next to it records the finished shards and the size of the
+output they were committed at, so an interrupted crawl resumes where it stopped without
+writing anything twice. Run the same command again to resume, or pass --restart.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .client import Client
+from .fields import resolve_fields
+from .ratelimit import RateLimiter
+from .rest_adapter import APIError
+
+STATE_VERSION = 1
+# Largest ranking page the API returns
+RANKING_PAGE_SIZE = 500
+
+_client = None
+
+
+class CrawlError(Exception):
+    """
+    > Raised when a checkpoint can't be used for the requested crawl.
+    """
+
+
+# One crawl: its shards, its output file and its checkpoint
+class Crawler(object):
+    def __init__(
+        self,
+        mode: str,
+        out: str,
+        client_id: str,
+        state: str = None,
+        token_path: str = None,
+        base_url: str = "https://api.myanimelist.net",
+        fields="list",
+        processes: int = 4,
+        threads: int = 4,
+        rate: float = 1.0,
+        ranking_type: str = "all",
+        max_items: int = 30000,
+        id_start: int = 1,
+        id_end: int = 60000,
+        ids_from: str = None,
+        chunk: int = 50,
+    ):
+        """
+        Args:
+          mode (str): ranking or details.
+          out (str): JSON lines file the anime are appended to.
+          client_id (str): Client ID sent as X-MAL-CLIENT-ID.
+          state (str): Checkpoint file, defaults to out + ".state.json".
+          token_path (str): Send the stored user token instead of the client ID.
+          base_url (str): Root URL of the API.
+          fields: Anime fields to crawl, a preset name or a list of field names.
+          processes (int): Number of worker processes.
+          threads (int): Concurrent detail requests per process.
+          rate (float): Requests per second of the whole crawl, split evenly between processes.
+          ranking_type (str): Ranking to walk in ranking mode.
+          max_items (int): Upper bound of the ranking walk, it stops early at the end of the ranking.
+          id_start (int): First anime ID in details mode.
+          id_end (int): Last anime ID in details mode.
+          ids_from (str): JSON lines file (e.g. a ranking crawl) whose IDs replace the ID range.
+          chunk (int): IDs per details shard.
+        """
+        if mode not in ("ranking", "details"):
+            raise ValueError(f"{mode} is not a valid crawl mode")
+        self.mode = mode
+        self.out = out
+        self.state_path = state or out + ".state.json"
+        self.processes = processes
+        self.rate = rate
+        self.client_config = {
+            "client_id": client_id,
+            "token_path": token_path,
+            "base_url": base_url,
+            "rate": rate / processes if rate else None,
+            "threads": threads,
+        }
+        self.config = {
+            "mode": mode,
+            "fields": resolve_fields(fields),
+            "ranking_type": ranking_type,
+            "max_items": max_items,
+            "id_start": id_start,
+            "id_end": id_end,
+            "ids_from": ids_from,
+            "chunk": chunk,
+        }
+        self.shards = self._plan()
+
+    def _plan(self) -> list:
+        config = self.config
+        if self.mode == "ranking":
+            pages = math.ceil(config["max_items"] / RANKING_PAGE_SIZE)
+            return [
+                ("ranking", config["ranking_type"], page * RANKING_PAGE_SIZE, RANKING_PAGE_SIZE, config["fields"])
+                for page in range(pages)
+            ]
+        if config["ids_from"] is not None:
+            ids = sorted(set(_read_ids(config["ids_from"])))
+        else:
+            ids = list(range(config["id_start"], config["id_end"] + 1))
+        size = config["chunk"]
+        return [("details", ids[n:n + size], config["fields"]) for n in range(0, len(ids), size)]
+
+    def load_state(self, restart: bool = False) -> dict:
+        """
+        > Returns the checkpoint to resume from, after cutting the output back to its last commit.
+        """
+        if restart or not os.path.exists(self.state_path):
+            state = {"version": STATE_VERSION, "config": self.config, "completed": [], "output_size": 0, "end": None}
+            if restart and os.path.exists(self.out):
+                os.remove(self.out)
+            return state
+        with open(self.state_path) as file:
+            state = json.load(file)
+        if state.get("version") != STATE_VERSION or state.get("config") != self.config:
+            raise CrawlError(
+                f"{self.state_path} belongs to a different crawl, use --restart to start over"
+            )
+        # anything after the last commit was written by a run that died before checkpointing it
+        if os.path.exists(self.out) and os.path.getsize(self.out) > state["output_size"]:
+            with open(self.out, "r+b") as file:
+                file.truncate(state["output_size"])
+        return state
+
+    def save_state(self, state: dict):
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.state_path)
+
+    def run(self, restart: bool = False, progress=None, progress_interval: float = 5.0) -> dict:
+        """
+        > Crawls every shard that isn't checkpointed yet.
+
+        Args:
+          restart (bool): Drop the checkpoint and the output and start from scratch.
+          progress: Called with a progress line every progress_interval seconds, e.g. print.
+          progress_interval (float): Seconds between progress lines.
+
+        Returns:
+          dict: Shard, item, missing ID and failure counts of this run.
+        """
+        state = self.load_state(restart)
+        completed = set(state["completed"])
+        todo = deque(
+            index for index in range(len(self.shards))
+            if index not in completed and (state["end"] is None or index <= state["end"])
+        )
+        stats = {"shards": 0, "items": 0, "missing": 0, "requests": 0, "failed": {}}
+        started = last_report = time.monotonic()
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.processes, initializer=_init_worker, initargs=(self.client_config,)
+        )
+        pending = {}
+        try:
+            with open(self.out, "ab") as out:
+                while todo or pending:
+                    while todo and len(pending) < self.processes * 2:
+                        index = todo.popleft()
+                        pending[executor.submit(_crawl_shard, self.shards[index])] = index
+                    done, _ = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        try:
+                            records, requests, missing, end = future.result()
+                        except Exception as e:
+                            stats["failed"][index] = repr(e)
+                            continue
+                        _append(out, records)
+                        completed.add(index)
+                        state["completed"] = sorted(completed)
+                        state["output_size"] = out.tell()
+                        if end and (state["end"] is None or index < state["end"]):
+                            # the ranking ended in this page, later pages are empty
+                            state["end"] = index
+                            todo = deque(i for i in todo if i <= index)
+                        self.save_state(state)
+                        stats["shards"] += 1
+                        stats["items"] += len(records)
+                        stats["missing"] += missing
+                        stats["requests"] += requests
+                    now = time.monotonic()
+                    if progress is not None and (now - last_report >= progress_interval or not (todo or pending)):
+                        last_report = now
+                        left = len(todo) + len(pending)
+                        progress(_progress_line(stats, left, now - started))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return stats
+
+
+def _progress_line(stats: dict, left: int, elapsed: float) -> str:
+    done = stats["shards"]
+    shard_rate = done / elapsed if elapsed > 0 else 0
+    eta = _duration(left / shard_rate) if shard_rate > 0 else "?"
+    return (
+        f"{done}/{done + left} shards, {stats['items']} anime ({stats['items'] / elapsed:.1f}/s), "
+        f"{stats['missing']} missing, {stats['requests'] / elapsed:.2f} req/s, "
+        f"{len(stats['failed'])} failed, ETA {eta}"
+    )
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def _append(out, records: list):
+    out.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode())
+    out.flush()
+    os.fsync(out.fileno())
+
+
+def _read_ids(path: str):
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)["id"]
+
+
+def _init_worker(config: dict):
+    global _client
+    rate_limiter = RateLimiter(rate=config["rate"], max_retries=5)
+    _client = Client(
+        config["client_id"],
+        user_login=config["token_path"] is not None,
+        token_path=config["token_path"],
+        store_token=False,
+        pool_maxsize=max(config["threads"], 1),
+        rate_limiter=rate_limiter,
+        base_url=config["base_url"],
+    )
+    _client.crawl_threads = config["threads"]
+
+
+def _crawl_shard(shard: tuple) -> tuple:
+    """
+    > Fetches one shard in a worker process.
+
+    Returns:
+      tuple: The records, the number of requests, the number of missing IDs and whether the
+        ranking ended in this shard.
+    """
+    if shard[0] == "ranking":
+        _, ranking_type, offset, limit, fields = shard
+        page = _client.api_call.request(
+            "GET",
+            "anime/ranking",
+            params={"ranking_type": ranking_type, "limit": limit, "offset": offset, "fields": fields},
+        )
+        records = [dict(item["node"], ranking=item.get("ranking")) for item in page["data"]]
+        return records, 1, 0, "next" not in page.get("paging", {})
+
+    _, ids, fields = shard
+    batch = _client.get_anime_details_many(ids, fields=fields, max_workers=_client.crawl_threads)
+    records = [details for _, details in sorted(batch, key=lambda pair: pair[0])]
+    missing = 0
+    for anime_id, error in batch.errors.items():
+        if isinstance(error, APIError) and error.status_code == 404:
+            missing += 1
+        else:
+            raise error
+    return records, len(ids), missing, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m PyMAL.crawl", description=__doc__.splitlines()[1])
+    parser.add_argument("mode", choices=["ranking", "details"])
+    parser.add_argument("--out", required=True, help="JSON lines file the anime are appended to")
+    parser.add_argument("--state", help="checkpoint file, defaults to OUT.state.json")
+    parser.add_argument("--client-id", default=os.environ.get("MAL_CLIENT_ID"))
+    parser.add_argument("--token-path", help="send this stored user token instead of the client ID")
+    parser.add_argument("--base-url", default="https://api.myanimelist.net")
+    parser.add_argument("--fields", default="list", help="field preset or comma separated fields")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="detail requests in flight per process")
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second of the whole crawl")
+    parser.add_argument("--ranking-type", default="all")
+    parser.add_argument("--max-items", type=int, default=30000)
+    parser.add_argument("--id-start", type=int, default=1)
+    parser.add_argument("--id-end", type=int, default=60000)
+    parser.add_argument("--ids-from", help="crawl the IDs found in this JSON lines file")
+    parser.add_argument("--chunk", type=int, default=50, help="IDs per details shard")
+    parser.add_argument("--progress-interval", type=float, default=5.0)
+    parser.add_argument("--restart", action="store_true", help="drop the checkpoint and the output")
+    args = parser.parse_args(argv)
+
+    if args.client_id is None:
+        parser.error("--client-id (or MAL_CLIENT_ID) is required")
+    if args.token_path is not None and not os.path.exists(args.token_path):
+        parser.error(f"{args.token_path} doesn't exist, log in with Client first")
+    fields = args.fields if "," not in args.fields else args.fields.split(",")
+    crawler = Crawler(
+        args.mode,
+        args.out,
+        args.client_id,
+        state=args.state,
+        token_path=args.token_path,
+        base_url=args.base_url,
+        fields=fields,
+        processes=args.processes,
+        threads=args.threads,
+        rate=args.rate,
+        ranking_type=args.ranking_type,
+        max_items=args.max_items,
+        id_start=args.id_start,
+        id_end=args.id_end,
+        ids_from=args.ids_from,
+        chunk=args.chunk,
+    )
+    try:
+        stats = crawler.run(
+            args.restart,
+            progress=lambda line: print(line, file=sys.stderr, flush=True),
+            progress_interval=args.progress_interval,
+        )
+    except CrawlError as e:
+        parser.exit(2, f"error: {e}\n")
+    except KeyboardInterrupt:
+        parser.exit(130, "interrupted, run the same command again to resume\n")
+    for index, error in sorted(stats["failed"].items()):
+        print(f"shard {index} failed: {error}", file=sys.stderr)
+    if stats["failed"]:
+        parser.exit(1, "some shards failed, run the same command again to retry them\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from functools import lru_cache
+
+# Every field the anime endpoints can return
+ANIME_FIELDS = (
+    "id",
+    "title",
+    "main_picture",
+    "alternative_titles",
+    "start_date",
+    "end_date",
+    "synopsis",
+    "mean",
+    "rank",
+    "popularity",
+    "num_list_users",
+    "num_scoring_users",
+    "nsfw",
+    "created_at",
+    "updated_at",
+    "media_type",
+    "status",
+    "genres",
+    "my_list_status",
+    "num_episodes",
+    "start_season",
+    "broadcast",
+    "source",
+    "average_episode_duration",
+    "rating",
+    "pictures",
+    "background",
+    "related_anime",
+    "related_manga",
+    "recommendations",
+    "studios",
+    "statistic",
+)
+
+# Named field sets, joined once here instead of on every call
+FIELD_PRESETS = {
+    "minimal": "id,title,mean",
+    "list": ",".join(
+        (
+            "id",
+            "title",
+            "main_picture",
+            "alternative_titles",
+            "start_date",
+            "mean",
+            "rank",
+            "popularity",
+            "num_list_users",
+            "media_type",
+            "status",
+            "genres",
+            "num_episodes",
+            "start_season",
+            "average_episode_duration",
+            "rating",
+            "studios",
+            "updated_at",
+        )
+    ),
+    "full": ",".join(ANIME_FIELDS),
+}
+
+
+def resolve_fields(fields, default: str = None) -> str:
+    """
+    > Turns a fields argument into the comma separated string the API expects.
+
+    Args:
+        fields: A preset name (minimal, list, full), a comma separated string, a list/tuple of
+            field names, or None for the default.
+        default (str): Returned when fields is None.
+
+    Returns:
+        str: The fields parameter.
+    """
+    if fields is None:
+        return default
+    if isinstance(fields, str):
+        return FIELD_PRESETS.get(fields, fields)
+    return _join_fields(tuple(fields))
+
+
+@lru_cache(maxsize=128)
+def _join_fields(fields: tuple) -> str:
+    return ",".join(fields)
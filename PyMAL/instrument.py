@@ -0,0 +1,425 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from . import util
+
+# Phases an API call is timed in, in the order they happen
+PHASES = ("connect", "ttfb", "download", "decompress", "decode", "postprocess")
+# Upper bounds in seconds of the latency histograms
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The event of the API call running in this thread or task, its exchanges are recorded into it
+current_event = contextvars.ContextVar("pymal_current_event", default=None)
+# Seconds the current thread spent opening connections (DNS, TCP and TLS) during its last request
+connection_timer = threading.local()
+
+
+# One API call as seen by the hooks, its timings are filled in while it runs
+class RequestEvent(object):
+    __slots__ = (
+        "method",
+        "endpoint",
+        "template",
+        "params",
+        "status_code",
+        "attempts",
+        "response_bytes",
+        "wire_bytes",
+        "timings",
+        "started",
+        "duration",
+        "hooks",
+    )
+
+    def __init__(self, method: str, endpoint: str, params: dict, hooks):
+        self.method = method
+        self.endpoint = endpoint
+        self.template = util.endpoint_template(endpoint)
+        self.params = params
+        self.status_code = None
+        self.attempts = 0
+        self.response_bytes = 0
+        self.wire_bytes = 0
+        self.timings = {}
+        self.started = time.perf_counter()
+        self.duration = None
+        self.hooks = hooks
+
+    @property
+    def sent(self) -> bool:
+        """
+        > Whether the call went to the network, False when it was served by the cache or shared.
+        """
+        return self.attempts > 0
+
+    def add(self, phase: str, seconds: float):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def __repr__(self):
+        timings = ", ".join(f"{phase}={seconds * 1000:.2f}ms" for phase, seconds in self.timings.items())
+        return f"RequestEvent({self.method} {self.template}, status={self.status_code}, {timings})"
+
+
+# Interface of the instrumentation hooks, every method is optional
+class Hooks(object):
+    def before_request(self, event: RequestEvent):
+        """
+        > Called before the call is looked up in the cache or sent.
+        """
+
+    def after_response(self, event: RequestEvent):
+        """
+        > Called once the response is decoded, with the network and decode timings filled in.
+        """
+
+    def on_error(self, event: RequestEvent, error: Exception):
+        """
+        > Called instead of after_response when the call raised.
+        """
+
+    def after_postprocess(self, event: RequestEvent):
+        """
+        > Called after a listing response was turned into dicts or models, with the postprocess timing.
+        """
+
+
+# Calls several hooks in order
+class HookChain(Hooks):
+    def __init__(self, hooks):
+        self.hooks = list(hooks)
+
+    def before_request(self, event):
+        for hooks in self.hooks:
+            hooks.before_request(event)
+
+    def after_response(self, event):
+        for hooks in self.hooks:
+            hooks.after_response(event)
+
+    def on_error(self, event, error):
+        for hooks in self.hooks:
+            hooks.on_error(event, error)
+
+    def after_postprocess(self, event):
+        for hooks in self.hooks:
+            hooks.after_postprocess(event)
+
+
+def as_hooks(hooks) -> Hooks:
+    """
+    > Returns the hooks argument of API/Client as one Hooks object, or None to disable instrumentation.
+    """
+    if hooks is None or isinstance(hooks, Hooks):
+        return hooks
+    return HookChain(hooks)
+
+
+def observe(hooks: Hooks, method: str, endpoint: str, params: dict, call, transform=None):
+    """
+    > Runs call() as an instrumented API call and returns its result, post-processed by
+    transform(result) when one is given.
+    """
+    event = RequestEvent(method, endpoint, params, hooks)
+    token = current_event.set(event)
+    hooks.before_request(event)
+    try:
+        result = call()
+    except Exception as e:
+        _finish(event, getattr(e, "status_code", None))
+        hooks.on_error(event, e)
+        raise
+    finally:
+        current_event.reset(token)
+    _finish(event, event.status_code)
+    hooks.after_response(event)
+    if transform is not None:
+        return postprocess(event, transform, result)
+    return result
+
+
+async def aobserve(hooks: Hooks, method: str, endpoint: str, params: dict, call, transform=None):
+    """
+    > Awaitable version of observe, call() returns the awaitable to instrument.
+    """
+    event = RequestEvent(method, endpoint, params, hooks)
+    token = current_event.set(event)
+    hooks.before_request(event)
+    try:
+        result = await call()
+    except Exception as e:
+        _finish(event, getattr(e, "status_code", None))
+        hooks.on_error(event, e)
+        raise
+    finally:
+        current_event.reset(token)
+    _finish(event, event.status_code)
+    hooks.after_response(event)
+    if transform is not None:
+        return postprocess(event, transform, result)
+    return result
+
+
+def postprocess(event: RequestEvent, fn, *args):
+    """
+    > Runs the post-processing of an instrumented call's result and reports its timing.
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+    event.add("postprocess", time.perf_counter() - start)
+    event.hooks.after_postprocess(event)
+    return result
+
+
+def record_exchange(
+    event: RequestEvent,
+    status_code: int,
+    headers_at: float,
+    elapsed: float,
+    connect: float,
+    body_bytes: int = None,
+    wire_bytes: int = None,
+    decompress: float = 0.0,
+):
+    """
+    > Adds one request/response exchange (a call has several when it is retried) to an event.
+
+    Args:
+      event (RequestEvent): The instrumented call.
+      status_code (int): Status of the response.
+      headers_at (float): Seconds from sending until the response headers arrived.
+      elapsed (float): Seconds from sending until the body was read.
+      connect (float): Seconds of headers_at spent opening a connection.
+      body_bytes (int): Size of the body, None for a streamed body that isn't read yet.
+      wire_bytes (int): Size of the body as received, before decompression. None when it is
+        the same as body_bytes.
+      decompress (float): Seconds of elapsed spent decompressing the body.
+    """
+    event.attempts += 1
+    event.status_code = status_code
+    if connect:
+        event.add("connect", connect)
+    event.add("ttfb", max(headers_at - connect, 0.0))
+    if body_bytes is not None:
+        event.add("download", max(elapsed - headers_at - decompress, 0.0))
+        event.response_bytes += body_bytes
+        event.wire_bytes += body_bytes if wire_bytes is None else wire_bytes
+        if decompress:
+            event.add("decompress", decompress)
+
+
+def time_connections(adapter):
+    """
+    > Makes the connection pools of a requests HTTPAdapter time every connection they open
+    into connection_timer, so the connect phase can be told apart from the wait for the response.
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def timed(connection_class):
+        class TimedConnection(connection_class):
+            def connect(self):
+                start = time.perf_counter()
+                try:
+                    super().connect()
+                finally:
+                    spent = time.perf_counter() - start
+                    connection_timer.seconds = getattr(connection_timer, "seconds", 0.0) + spent
+
+        return TimedConnection
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection)
+
+    adapter.poolmanager.pool_classes_by_scheme = {
+        "http": TimedHTTPConnectionPool,
+        "https": TimedHTTPSConnectionPool,
+    }
+
+
+# httpx trace extension timing the connection setup of one request
+class HttpxConnectTimer(object):
+    def __init__(self):
+        self.seconds = 0.0
+        self._started = None
+
+    async def __call__(self, name: str, info: dict):
+        if name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            self._started = time.perf_counter()
+        elif name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._started is not None:
+                self.seconds += time.perf_counter() - self._started
+                self._started = None
+
+
+def trace_connections(name: str, info: dict):
+    """
+    > httpx trace extension of the blocking client, times the connection setup of a request
+    into connection_timer like time_connections does for requests.
+    """
+    if name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+        connection_timer.started = time.perf_counter()
+    elif name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+        started = getattr(connection_timer, "started", None)
+        if started is not None:
+            connection_timer.seconds = getattr(connection_timer, "seconds", 0.0) + time.perf_counter() - started
+            connection_timer.started = None
+
+
+def _finish(event: RequestEvent, status_code: int):
+    event.status_code = status_code
+    event.duration = time.perf_counter() - event.started
+
+
+# Aggregates API calls into counters and histograms, exported in the Prometheus text format
+class Metrics(Hooks):
+    def __init__(self, namespace: str = "pymal", buckets=BUCKETS):
+        """
+        > Pass it as hooks to a client, then expose to_prometheus() on a /metrics endpoint or
+        start serve() to let Prometheus (or an OpenTelemetry collector with a Prometheus
+        receiver) scrape it.
+
+        Args:
+          namespace (str): Prefix of the metric names.
+          buckets: Upper bounds in seconds of the latency histograms.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._bytes = {}
+        self._wire_bytes = {}
+        self._histograms = {}
+        self._server = None
+
+    def after_response(self, event):
+        self._record(event, _status_label(event))
+
+    def on_error(self, event, error):
+        self._record(event, str(event.status_code) if event.status_code else type(error).__name__)
+
+    def after_postprocess(self, event):
+        with self._lock:
+            self._observe((event.template, "postprocess"), event.timings["postprocess"])
+
+    def _record(self, event: RequestEvent, status: str):
+        with self._lock:
+            key = (event.template, event.method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if event.response_bytes:
+                self._bytes[event.template] = self._bytes.get(event.template, 0) + event.response_bytes
+            if event.wire_bytes:
+                self._wire_bytes[event.template] = self._wire_bytes.get(event.template, 0) + event.wire_bytes
+            self._observe((event.template, "total"), event.duration)
+            for phase, seconds in event.timings.items():
+                self._observe((event.template, phase), seconds)
+
+    def _observe(self, key: tuple, seconds: float):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram[1] += seconds
+
+    def snapshot(self) -> dict:
+        """
+        > Returns the aggregated values.
+
+        Returns:
+          dict: requests keyed by (template, method, status), response bytes (decompressed)
+            and wire bytes (as received) keyed by template and (count, sum of seconds) keyed by (template, phase), the phase total being the
+            whole call.
+        """
+        with self._lock:
+            return {
+                "requests": dict(self._requests),
+                "response_bytes": dict(self._bytes),
+                "wire_bytes": dict(self._wire_bytes),
+                "timings": {
+                    key: (sum(counts), seconds) for key, (counts, seconds) in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        > Renders the metrics in the Prometheus text exposition format.
+        """
+        name = self.namespace
+        lines = [
+            f"# HELP {name}_requests_total API calls by endpoint template, method and status.",
+            f"# TYPE {name}_requests_total counter",
+        ]
+        with self._lock:
+            for (template, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'{name}_requests_total{{endpoint="{template}",method="{method}",status="{status}"}} {count}'
+                )
+            lines += [
+                f"# HELP {name}_response_bytes_total Response body bytes by endpoint template.",
+                f"# TYPE {name}_response_bytes_total counter",
+            ]
+            for template, count in sorted(self._bytes.items()):
+                lines.append(f'{name}_response_bytes_total{{endpoint="{template}"}} {count}')
+            lines += [
+                f"# HELP {name}_wire_bytes_total Response body bytes received before decompression by endpoint template.",
+                f"# TYPE {name}_wire_bytes_total counter",
+            ]
+            for template, count in sorted(self._wire_bytes.items()):
+                lines.append(f'{name}_wire_bytes_total{{endpoint="{template}"}} {count}')
+            lines += [
+                f"# HELP {name}_request_phase_seconds Time spent in each phase of an API call.",
+                f"# TYPE {name}_request_phase_seconds histogram",
+            ]
+            for (template, phase), (counts, seconds) in sorted(self._histograms.items()):
+                labels = f'endpoint="{template}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_request_phase_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_request_phase_seconds_sum{{{labels}}} {seconds}")
+                lines.append(f"{name}_request_phase_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0"):
+        """
+        > Serves to_prometheus() on http://host:port/metrics from a daemon thread.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="pymal-metrics", daemon=True).start()
+        return self._server
+
+    def close(self):
+        """
+        > Stops the server started by serve().
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _status_label(event: RequestEvent) -> str:
+    # calls answered from the cache, or by an identical call in flight, never reach the network
+    return str(event.status_code) if event.sent else "cached"
@@ -0,0 +1,215 @@
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bytes read from the socket at a time when a response is streamed
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+# Where the decoder is in {"data": [item, ...], "paging": {...}}
+_START, _KEY, _COLON, _VALUE, _FIRST_ITEM, _ITEM, _AFTER_ITEM, _AFTER_VALUE, _END = range(9)
+
+# Returned by ItemDecoder._value when the buffer ends in the middle of a value
+_MORE = object()
+
+
+def loads(data):
+    """
+    > Decodes a whole JSON body, with orjson when it is installed and the standard library otherwise.
+
+    Args:
+      data: The body as bytes or str.
+
+    Returns:
+      The decoded value.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def backend() -> str:
+    """
+    > Returns the name of the JSON library used for whole bodies.
+    """
+    return "orjson" if orjson is not None else "json"
+
+
+# Incrementally decodes the items of a listing body, one object at a time
+class ItemDecoder(object):
+    def __init__(self, key: str = "data"):
+        """
+        > Items of the key array are returned as soon as they are complete, so a page never has
+        to be held in memory as a whole. Every other top-level value (e.g. paging) is collected
+        in `extra`.
+
+        Args:
+          key (str): Name of the top-level array whose items are returned.
+        """
+        self.key = key
+        self.extra = {}
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = _START
+        self._name = None
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        > Adds a chunk of the body and returns the items completed by it.
+        """
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        items = []
+        while self._step(items, False):
+            pass
+        return items
+
+    def close(self) -> list:
+        """
+        > Marks the end of the body and returns the remaining items.
+
+        Raises:
+          ValueError: If the body is not a complete JSON object.
+        """
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(b"", final=True)
+        self._pos = 0
+        items = []
+        while self._step(items, True):
+            pass
+        if self._state != _END or self._buffer[self._pos:].strip(_WHITESPACE):
+            raise ValueError("Incomplete JSON body")
+        return items
+
+    def _step(self, items: list, final: bool) -> bool:
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        if pos >= len(buffer) or self._state == _END:
+            return False
+
+        char = buffer[pos]
+        state = self._state
+        if state == _START:
+            self._expect(char, "{", _KEY)
+        elif state == _KEY:
+            if char == "}":
+                self._expect(char, "}", _END)
+                return True
+            name = self._value(final)
+            if name is _MORE:
+                return False
+            self._name = name
+            self._state = _COLON
+        elif state == _COLON:
+            self._expect(char, ":", _VALUE)
+        elif state == _VALUE:
+            if self._name == self.key:
+                self._expect(char, "[", _FIRST_ITEM)
+            else:
+                value = self._value(final)
+                if value is _MORE:
+                    return False
+                self.extra[self._name] = value
+                self._state = _AFTER_VALUE
+        elif state == _FIRST_ITEM:
+            if char == "]":
+                self._expect(char, "]", _AFTER_VALUE)
+            else:
+                self._state = _ITEM
+        elif state == _ITEM:
+            item = self._value(final)
+            if item is _MORE:
+                return False
+            items.append(item)
+            self._state = _AFTER_ITEM
+        elif state == _AFTER_ITEM:
+            self._expect(char, ",]", _ITEM if char == "," else _AFTER_VALUE)
+        elif state == _AFTER_VALUE:
+            self._expect(char, ",}", _KEY if char == "," else _END)
+        return True
+
+    def _expect(self, char: str, allowed: str, state: int):
+        if char not in allowed:
+            raise ValueError(f"Unexpected {char!r} at position {self._pos} of the JSON body")
+        self._pos += 1
+        self._state = state
+
+    def _value(self, final: bool):
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return _MORE
+        # a number at the end of the buffer may continue in the next chunk
+        if end >= len(self._buffer) and not final:
+            return _MORE
+        self._pos = end
+        return value
+
+
+# The items of a streamed response; `extra` is filled in once they have all been read
+class ItemStream(object):
+    def __init__(self, chunks, close=None, key: str = "data"):
+        """
+        Args:
+          chunks: Iterable of body chunks as bytes.
+          close: Called once the stream is exhausted or closed, e.g. to release the connection.
+          key (str): Name of the top-level array whose items are yielded.
+        """
+        self._chunks = chunks
+        self._close = close
+        self._decoder = ItemDecoder(key)
+
+    @property
+    def extra(self) -> dict:
+        return self._decoder.extra
+
+    def __iter__(self):
+        try:
+            for chunk in self._chunks:
+                yield from self._decoder.feed(chunk)
+            yield from self._decoder.close()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+
+# Async counterpart of ItemStream, reading from an async iterable of chunks
+class AsyncItemStream(object):
+    def __init__(self, chunks, close=None, key: str = "data"):
+        self._chunks = chunks
+        self._close = close
+        self._decoder = ItemDecoder(key)
+
+    @property
+    def extra(self) -> dict:
+        return self._decoder.extra
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._chunks:
+                for item in self._decoder.feed(chunk):
+                    yield item
+            for item in self._decoder.close():
+                yield item
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._close is not None:
+            await self._close()
+            self._close = None
@@ -0,0 +1,306 @@
+import sys
+
+# Typed, compact alternatives to the plain dicts returned by default. Every class uses
+# __slots__, repeated enum-like strings are interned, genres and studios are shared
+# instances, and heavy nested parts are only parsed when first accessed.
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Model(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        names = [
+            name for cls in reversed(type(self).__mro__) for name in getattr(cls, "__slots__", ())
+        ]
+        shown = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in names
+            if not name.startswith("_") and getattr(self, name) is not None
+        )
+        return f"{type(self).__name__}({shown})"
+
+
+class MainPicture(_Model):
+    __slots__ = ("medium", "large")
+
+    def __init__(self, medium: str = None, large: str = None):
+        self.medium = medium
+        self.large = large
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data is None:
+            return None
+        return cls(data.get("medium"), data.get("large"))
+
+
+class AlternativeTitles(_Model):
+    __slots__ = ("synonyms", "en", "ja")
+
+    def __init__(self, synonyms: tuple = (), en: str = None, ja: str = None):
+        self.synonyms = synonyms
+        self.en = en
+        self.ja = ja
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data is None:
+            return None
+        return cls(tuple(data.get("synonyms") or ()), data.get("en"), data.get("ja"))
+
+
+class Season(_Model):
+    __slots__ = ("year", "season")
+
+    def __init__(self, year: int = None, season: str = None):
+        self.year = year
+        self.season = season
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data is None:
+            return None
+        return cls(data.get("year"), _intern(data.get("season")))
+
+
+class Broadcast(_Model):
+    __slots__ = ("day_of_the_week", "start_time")
+
+    def __init__(self, day_of_the_week: str = None, start_time: str = None):
+        self.day_of_the_week = day_of_the_week
+        self.start_time = start_time
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data is None:
+            return None
+        return cls(_intern(data.get("day_of_the_week")), data.get("start_time"))
+
+
+# Genres and studios repeat across every entry, so one instance per id is shared
+class _Named(_Model):
+    __slots__ = ("id", "name")
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        key = (data.get("id"), data.get("name"))
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = cls._instances.setdefault(key, cls(key[0], _intern(key[1])))
+        return instance
+
+
+class Genre(_Named):
+    __slots__ = ()
+    _instances = {}
+
+
+class Studio(_Named):
+    __slots__ = ()
+    _instances = {}
+
+
+class ListStatus(_Model):
+    __slots__ = (
+        "status",
+        "score",
+        "num_episodes_watched",
+        "is_rewatching",
+        "start_date",
+        "finish_date",
+        "priority",
+        "num_times_rewatched",
+        "rewatch_value",
+        "tags",
+        "comments",
+        "updated_at",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data is None:
+            return None
+        status = cls(**data)
+        status.status = _intern(status.status)
+        if status.tags is not None:
+            status.tags = tuple(status.tags)
+        return status
+
+
+class AnimeNode(_Model):
+    __slots__ = (
+        "id",
+        "title",
+        "main_picture",
+        "alternative_titles",
+        "start_date",
+        "end_date",
+        "synopsis",
+        "mean",
+        "rank",
+        "popularity",
+        "num_list_users",
+        "num_scoring_users",
+        "nsfw",
+        "created_at",
+        "updated_at",
+        "media_type",
+        "status",
+        "genres",
+        "my_list_status",
+        "num_episodes",
+        "start_season",
+        "broadcast",
+        "source",
+        "average_episode_duration",
+        "rating",
+        "background",
+        "studios",
+        "_pictures",
+        "_related_anime",
+        "_related_manga",
+        "_recommendations",
+        "_statistics",
+    )
+
+    # plain values copied as-is, and enum-like values that are interned
+    _SCALARS = (
+        "id",
+        "title",
+        "start_date",
+        "end_date",
+        "synopsis",
+        "mean",
+        "rank",
+        "popularity",
+        "num_list_users",
+        "num_scoring_users",
+        "created_at",
+        "updated_at",
+        "num_episodes",
+        "average_episode_duration",
+        "background",
+    )
+    _ENUMS = ("nsfw", "media_type", "status", "source", "rating")
+    # nested parts kept raw until accessed
+    _LAZY = ("pictures", "related_anime", "related_manga", "recommendations", "statistics")
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        > Builds an AnimeNode from an anime dict as returned by the API.
+        """
+        node = cls.__new__(cls)
+        get = data.get
+        for name in cls._SCALARS:
+            setattr(node, name, get(name))
+        for name in cls._ENUMS:
+            setattr(node, name, _intern(get(name)))
+        node.main_picture = MainPicture.from_dict(get("main_picture"))
+        node.alternative_titles = AlternativeTitles.from_dict(get("alternative_titles"))
+        node.start_season = Season.from_dict(get("start_season"))
+        node.broadcast = Broadcast.from_dict(get("broadcast"))
+        node.my_list_status = ListStatus.from_dict(get("my_list_status"))
+        genres = get("genres")
+        node.genres = tuple(Genre.from_dict(g) for g in genres) if genres is not None else None
+        studios = get("studios")
+        node.studios = tuple(Studio.from_dict(s) for s in studios) if studios is not None else None
+        for name in cls._LAZY:
+            setattr(node, "_" + name, get(name))
+        return node
+
+    @classmethod
+    def from_item(cls, item: dict):
+        return cls.from_dict(item["node"])
+
+    @property
+    def pictures(self) -> tuple:
+        if isinstance(self._pictures, list):
+            self._pictures = tuple(MainPicture.from_dict(p) for p in self._pictures)
+        return self._pictures
+
+    @property
+    def related_anime(self) -> tuple:
+        if isinstance(self._related_anime, list):
+            self._related_anime = tuple(RelatedAnime.from_dict(r) for r in self._related_anime)
+        return self._related_anime
+
+    @property
+    def related_manga(self) -> tuple:
+        # manga nodes are left as dicts until the library has manga models
+        if isinstance(self._related_manga, list):
+            self._related_manga = tuple(self._related_manga)
+        return self._related_manga
+
+    @property
+    def recommendations(self) -> tuple:
+        if isinstance(self._recommendations, list):
+            self._recommendations = tuple(
+                Recommendation.from_dict(r) for r in self._recommendations
+            )
+        return self._recommendations
+
+    @property
+    def statistics(self) -> dict:
+        return self._statistics
+
+
+class RelatedAnime(_Model):
+    __slots__ = ("node", "relation_type", "relation_type_formatted")
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        related = cls.__new__(cls)
+        related.node = AnimeNode.from_dict(data["node"])
+        related.relation_type = _intern(data.get("relation_type"))
+        related.relation_type_formatted = _intern(data.get("relation_type_formatted"))
+        return related
+
+
+class Recommendation(_Model):
+    __slots__ = ("node", "num_recommendations")
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        recommendation = cls.__new__(cls)
+        recommendation.node = AnimeNode.from_dict(data["node"])
+        recommendation.num_recommendations = data.get("num_recommendations")
+        return recommendation
+
+
+class UserAnimeListEntry(_Model):
+    __slots__ = ("node", "list_status")
+
+    def __init__(self, node: AnimeNode, list_status: ListStatus = None):
+        self.node = node
+        self.list_status = list_status
+
+    @classmethod
+    def from_item(cls, item: dict):
+        """
+        > Builds an entry from a user anime list item ({"node": ..., "list_status": ...}).
+        """
+        node = item["node"]
+        list_status = item.get("list_status", node.get("list_status"))
+        return cls(AnimeNode.from_dict(node), ListStatus.from_dict(list_status))
+
+
+def model_class(client, models: bool, cls):
+    """
+    > Returns cls when models are enabled for this call (or by default on the client), else None.
+    """
+    if models is None:
+        models = getattr(client, "models", False)
+    return cls if models else None
@@ -1,12 +1,110 @@
 from datetime import datetime
 from ..util import *
+from ..paging import iter_pages, aiter_pages, iter_pages_parallel, aiter_pages_parallel
+from ..batch import Batch, AsyncBatch
+from ..columnar import AnimeColumns, RawItem
+from ..fields import resolve_fields
+from ..models import AnimeNode, model_class
+
+
+def _search_anime_params(client, query: str, limit: int, offset: int, fields=None) -> dict:
+    return {
+        "q": query,
+        "limit": limit,
+        "offset": offset,
+        "fields": resolve_fields(fields, client.default_fields),
+    }
+
+
+def _search_catalog(client, query: str, limit: int, offset: int, models: bool = None) -> list:
+    catalog = getattr(client, "catalog", None)
+    if catalog is None:
+        raise ValueError("source='local' needs a catalog, pass catalog= when creating the client")
+    results = catalog.search(query, limit, offset)
+    model = model_class(client, models, AnimeNode)
+    if model is not None:
+        return [model.from_dict(node) for node in results]
+    return results
+
+
+def _anime_ranking_params(client, ranking_type: str, limit: int, offset: int, fields=None) -> dict:
+    ranking_type_values = [
+        "all",
+        "airing",
+        "upcoming",
+        "tv",
+        "ova",
+        "movie",
+        "special",
+        "bypopularity",
+        "favorite",
+    ]
+    if ranking_type not in ranking_type_values:
+        raise ValueError(f"ranking_type must be one of {ranking_type_values}")
+    return {
+        "ranking_type": ranking_type,
+        "fields": resolve_fields(fields, client.default_fields),
+        "limit": limit,
+        "offset": offset,
+    }
+
+
+def _seasonal_anime_request(
+    client, season: str, year: int, sort: str, limit: int, offset: int, fields=None
+) -> tuple:
+    """
+    > Validates the seasonal anime arguments and returns the (endpoint, params) to request.
+    """
+    season_values = ["winter", "spring", "summer", "fall", None]
+    sort_values = ["anime_score", "anime_num_list_users", None]
+    if season not in season_values:
+        raise ValueError(f"season must be one of {season_values}")
+    if sort not in sort_values:
+        raise ValueError(f"sort must be one of {sort_values}")
+
+    if season is None:
+        month = datetime.now().month
+        if month in [1, 2, 3]:
+            season = "winter"
+        elif month in [4, 5, 6]:
+            season = "spring"
+        elif month in [7, 8, 9]:
+            season = "summer"
+        elif month in [10, 11, 12]:
+            season = "fall"
+    if year is None:
+        year = datetime.now().year
+
+    params = {
+        "sort": sort,
+        "limit": limit,
+        "offset": offset,
+        "fields": resolve_fields(fields, client.default_fields),
+    }
+    return f"anime/season/{year}/{season}", params
+
+
+def _suggested_anime_params(client, limit: int, offset: int, fields=None) -> dict:
+    return {
+        "limit": limit,
+        "offset": offset,
+        "fields": resolve_fields(fields, client.default_fields),
+    }
 
 
 class Anime:
     def __init__(self):
         pass
 
-    def search_anime(self, query: str, limit: int = 10, offset: int = 0) -> list:
+    def search_anime(
+        self,
+        query: str,
+        limit: int = 10,
+        offset: int = 0,
+        fields=None,
+        models: bool = None,
+        source: str = "remote",
+    ) -> list:
         """
         > Search for anime.
 
@@ -14,31 +112,39 @@ class Anime:
             query (str): Search query.
             limit (int): Maximum number of results to return.
             offset (int): Offset of results to return.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+            source (str): remote asks the API, local searches the client catalog (see
+                PyMAL.catalog) without any request; fields are then whatever the catalog stores.
 
         Returns:
             list: List of search results.
 
         https://myanimelist.net/apiconfig/references/api/v2#operation/anime_get
         """
-        return reform_json(
-            self.api_call.request(
-                "GET",
-                "anime",
-                params={
-                    "q": query,
-                    "limit": limit,
-                    "offset": offset,
-                    "fields": ",".join(self.anime_fields),
-                },
-            )
+        if source == "local":
+            return _search_catalog(self, query, limit, offset, models)
+        if source != "remote":
+            raise ValueError("source must be one of ['remote', 'local']")
+        return self.api_call.request(
+            "GET",
+            "anime",
+            params=_search_anime_params(self, query, limit, offset, fields),
+            transform=listing(model_class(self, models, AnimeNode)),
         )
 
-    def get_anime_details(self, anime_id: int):
+    def get_anime_details(self, anime_id: int, fields=None, models: bool = None):
         """
         > Get anime details by ID.
 
         Args:
             anime_id (int): MAL Anime ID.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
 
         Returns:
             dict: Anime details.
@@ -46,32 +152,69 @@ class Anime:
         ---
         https://myanimelist.net/apiconfig/references/api/v2#operation/anime_anime_id_get
         """
-        params = {"fields": ",".join(self.anime_fields)}
-        return self.api_call.request("GET", f"anime/{anime_id}", params=params)
+        params = {"fields": resolve_fields(fields, self.default_fields)}
+        details = self.api_call.request("GET", f"anime/{anime_id}", params=params)
+        if model_class(self, models, AnimeNode) is not None:
+            return AnimeNode.from_dict(details)
+        return details
+
+    def get_anime_details_many(
+        self,
+        anime_ids,
+        max_workers: int = 8,
+        ordered: bool = False,
+        fields=None,
+        models: bool = None,
+    ):
+        """
+        > Get the details of many anime concurrently.
+
+        Duplicate IDs are fetched once. Requests go through the shared connection pool and
+        rate limiter. A failing ID does not stop the batch, its exception is collected in
+        the `errors` dict of the returned batch instead.
+
+        Args:
+            anime_ids: Iterable of MAL Anime IDs.
+            max_workers (int): Maximum number of requests in flight.
+            ordered (bool): Yield in input order instead of as soon as each request finishes.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+
+        Returns:
+            Batch: Iterable of (anime_id, details) pairs, with `succeeded` and `errors` filled in while iterating.
+
+        Example:
+            batch = client.get_anime_details_many([1, 5, 6])
+            details = dict(batch)
+            failed = batch.errors
+        """
+        params = {"fields": resolve_fields(fields, self.default_fields)}
+        model = model_class(self, models, AnimeNode)
+
+        def fetch(anime_id):
+            details = self.api_call.request("GET", f"anime/{anime_id}", params=params)
+            return model.from_dict(details) if model is not None else details
+
+        return Batch(
+            fetch,
+            anime_ids,
+            max_workers=max_workers,
+            ordered=ordered,
+        )
 
     def get_anime_ranking(
-        self, ranking_type: str = "all", limit: int = 10, offset: int = 0
+        self,
+        ranking_type: str = "all",
+        limit: int = 10,
+        offset: int = 0,
+        fields=None,
+        models: bool = None,
     ) -> list:
-        ranking_type_values = [
-            "all",
-            "airing",
-            "upcoming",
-            "tv",
-            "ova",
-            "movie",
-            "special",
-            "bypopularity",
-            "favorite",
-        ]
-        if ranking_type not in ranking_type_values:
-            raise ValueError(f"ranking_type must be one of {ranking_type_values}")
-        params = {
-            "ranking_type": ranking_type,
-            "fields": ",".join(self.anime_fields),
-            "limit": limit,
-            "offset": offset,
-        }
-        return reform_json(self.api_call.request("GET", "anime/ranking", params=params))
+        params = _anime_ranking_params(self, ranking_type, limit, offset, fields)
+        model = model_class(self, models, AnimeNode)
+        return self.api_call.request("GET", "anime/ranking", params=params, transform=listing(model))
 
     def get_seasonal_anime(
         self,
@@ -80,6 +223,8 @@ class Anime:
         sort: str = None,
         limit: int = 10,
         offset: int = 0,
+        fields=None,
+        models: bool = None,
     ) -> list:
         """
         > Get seasonal anime.
@@ -98,6 +243,10 @@ class Anime:
             sort (str): Sort.
             limit (int): Maximum number of results to return.
             offset (int): Offset of results to return.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
 
         Returns:
             list: List of seasonal anime.
@@ -105,54 +254,423 @@ class Anime:
         ---
         https://myanimelist.net/apiconfig/references/api/v2#operation/anime_ranking_get
         """
-        season_values = ["winter", "spring", "summer", "fall", None]
-        sort_values = ["anime_score", "anime_num_list_users", None]
-        if season not in season_values:
-            raise ValueError(f"season must be one of {season_values}")
-        if sort not in sort_values:
-            raise ValueError(f"sort must be one of {sort_values}")
-
-        if season is None:
-            month = datetime.now().month
-            if month in [1, 2, 3]:
-                season = "winter"
-            elif month in [4, 5, 6]:
-                season = "spring"
-            elif month in [7, 8, 9]:
-                season = "summer"
-            elif month in [10, 11, 12]:
-                season = "fall"
-        if year is None:
-            year = datetime.now().year
-
-        params = {
-            "sort": sort,
-            "limit": limit,
-            "offset": offset,
-            "fields": ",".join(self.anime_fields),
-        }
-        return reform_json(
-            self.api_call.request("GET", f"anime/season/{year}/{season}", params=params)
-        )
+        endpoint, params = _seasonal_anime_request(self, season, year, sort, limit, offset, fields)
+        model = model_class(self, models, AnimeNode)
+        return self.api_call.request("GET", endpoint, params=params, transform=listing(model))
 
-    def get_suggested_anime(self, limit: int = 10, offset: int = 0) -> list:
+    def get_suggested_anime(
+        self, limit: int = 10, offset: int = 0, fields=None, models: bool = None
+    ) -> list:
         """
         Returns suggested anime for the authorized user.
 
         If the user is new comer, this endpoint returns an empty list.
-        
+
         Args:
             limit (int): Maximum number of results to return.
             offset (int): Offset of results to return.
-        
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+
         Returns:
             list: List of suggested anime.
         ---
         https://myanimelist.net/apiconfig/references/api/v2#operation/anime_suggestions_get
         """
-        params = {
-            "limit": limit,
-            "offset": offset,
-            "fields": ",".join(self.anime_fields),
-        }
-        return reform_json(self.api_call.request("GET", "anime/suggestions", params=params))
+        params = _suggested_anime_params(self, limit, offset, fields)
+        model = model_class(self, models, AnimeNode)
+        return self.api_call.request("GET", "anime/suggestions", params=params, transform=listing(model))
+
+    def iter_search_anime(
+        self,
+        query: str,
+        limit: int = 100,
+        max_items: int = None,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Lazily iterate over every search result, following the API pagination.
+
+        Args:
+            query (str): Search query.
+            limit (int): Number of results fetched per page (max 100).
+            max_items (int): Stop after this many results. None returns every result.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+            stream (bool): Decode each page while it is downloaded instead of loading it whole,
+                keeping memory flat on large pages.
+
+        Yields:
+            dict: Search results, in order.
+        """
+        params = _search_anime_params(self, query, limit, 0, fields)
+        model = model_class(self, models, AnimeNode)
+        return iter_pages(self.api_call, "anime", params, max_items, model=model, stream=stream)
+
+    def iter_anime_ranking(
+        self,
+        ranking_type: str = "all",
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Lazily iterate over the whole anime ranking, following the API pagination.
+
+        Args:
+            ranking_type (str): Ranking type.
+            limit (int): Number of entries fetched per page (max 500).
+            max_items (int): Stop after this many entries. None returns the whole ranking.
+            max_in_flight (int): Fetch this many pages in parallel by offset instead of
+                following paging.next one page at a time.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+            stream (bool): Decode each page while it is downloaded instead of loading it whole,
+                keeping memory flat on large pages. Ignored when max_in_flight > 1.
+
+        Yields:
+            dict: Ranked anime, in order.
+        """
+        params = _anime_ranking_params(self, ranking_type, limit, 0, fields)
+        model = model_class(self, models, AnimeNode)
+        if max_in_flight > 1:
+            return iter_pages_parallel(
+                self.api_call, "anime/ranking", params, max_items, max_in_flight, model=model
+            )
+        return iter_pages(
+            self.api_call, "anime/ranking", params, max_items, model=model, stream=stream
+        )
+
+    def iter_seasonal_anime(
+        self,
+        season: str = None,
+        year: int = None,
+        sort: str = None,
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Lazily iterate over every anime of a season, following the API pagination.
+
+        Args:
+            season (str): Season.
+            year (int): Year.
+            sort (str): Sort.
+            limit (int): Number of entries fetched per page (max 500).
+            max_items (int): Stop after this many entries. None returns the whole season.
+            max_in_flight (int): Fetch this many pages in parallel by offset instead of
+                following paging.next one page at a time.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+            stream (bool): Decode each page while it is downloaded instead of loading it whole,
+                keeping memory flat on large pages. Ignored when max_in_flight > 1.
+
+        Yields:
+            dict: Seasonal anime, in order.
+        """
+        endpoint, params = _seasonal_anime_request(self, season, year, sort, limit, 0, fields)
+        model = model_class(self, models, AnimeNode)
+        if max_in_flight > 1:
+            return iter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=model
+            )
+        return iter_pages(self.api_call, endpoint, params, max_items, model=model, stream=stream)
+
+    def export_anime_ranking(
+        self,
+        ranking_type: str = "all",
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        stream: bool = False,
+    ) -> AnimeColumns:
+        """
+        > Fetch the anime ranking straight into columns, for to_numpy, to_arrow or to_parquet.
+
+        Args:
+            ranking_type (str): Ranking type.
+            limit (int): Number of entries fetched per page (max 500).
+            max_items (int): Stop after this many entries. None returns the whole ranking.
+            max_in_flight (int): Fetch this many pages in parallel by offset.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            stream (bool): Decode each page while it is downloaded. Ignored when max_in_flight > 1.
+
+        Returns:
+            AnimeColumns: The ranked anime, with a ranking column.
+        """
+        params = _anime_ranking_params(self, ranking_type, limit, 0, fields)
+        if max_in_flight > 1:
+            items = iter_pages_parallel(
+                self.api_call, "anime/ranking", params, max_items, max_in_flight, model=RawItem
+            )
+        else:
+            items = iter_pages(
+                self.api_call, "anime/ranking", params, max_items, model=RawItem, stream=stream
+            )
+        return AnimeColumns.from_items(items)
+
+    def export_seasonal_anime(
+        self,
+        season: str = None,
+        year: int = None,
+        sort: str = None,
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        stream: bool = False,
+    ) -> AnimeColumns:
+        """
+        > Fetch every anime of a season straight into columns, for to_numpy, to_arrow or to_parquet.
+
+        Args:
+            season (str): Season.
+            year (int): Year.
+            sort (str): Sort.
+            limit (int): Number of entries fetched per page (max 500).
+            max_items (int): Stop after this many entries. None returns the whole season.
+            max_in_flight (int): Fetch this many pages in parallel by offset.
+            fields: Fields to request, a preset name (minimal, list, full), a list of field
+                names or a comma separated string. Defaults to the client default_fields.
+            stream (bool): Decode each page while it is downloaded. Ignored when max_in_flight > 1.
+
+        Returns:
+            AnimeColumns: The seasonal anime.
+        """
+        endpoint, params = _seasonal_anime_request(self, season, year, sort, limit, 0, fields)
+        if max_in_flight > 1:
+            items = iter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=RawItem
+            )
+        else:
+            items = iter_pages(self.api_call, endpoint, params, max_items, model=RawItem, stream=stream)
+        return AnimeColumns.from_items(items)
+
+
+class AsyncAnime:
+    async def search_anime(
+        self,
+        query: str,
+        limit: int = 10,
+        offset: int = 0,
+        fields=None,
+        models: bool = None,
+        source: str = "remote",
+    ) -> list:
+        """
+        > Awaitable version of Anime.search_anime.
+        """
+        if source == "local":
+            return _search_catalog(self, query, limit, offset, models)
+        if source != "remote":
+            raise ValueError("source must be one of ['remote', 'local']")
+        return await self.api_call.request(
+            "GET",
+            "anime",
+            params=_search_anime_params(self, query, limit, offset, fields),
+            transform=listing(model_class(self, models, AnimeNode)),
+        )
+
+    async def get_anime_details(self, anime_id: int, fields=None, models: bool = None):
+        """
+        > Awaitable version of Anime.get_anime_details.
+        """
+        params = {"fields": resolve_fields(fields, self.default_fields)}
+        details = await self.api_call.request("GET", f"anime/{anime_id}", params=params)
+        if model_class(self, models, AnimeNode) is not None:
+            return AnimeNode.from_dict(details)
+        return details
+
+    def get_anime_details_many(
+        self,
+        anime_ids,
+        max_workers: int = 8,
+        ordered: bool = False,
+        fields=None,
+        models: bool = None,
+    ):
+        """
+        > Async iterator version of Anime.get_anime_details_many, iterate it with `async for`.
+        """
+        params = {"fields": resolve_fields(fields, self.default_fields)}
+        model = model_class(self, models, AnimeNode)
+
+        async def fetch(anime_id):
+            details = await self.api_call.request("GET", f"anime/{anime_id}", params=params)
+            return model.from_dict(details) if model is not None else details
+
+        return AsyncBatch(
+            fetch,
+            anime_ids,
+            max_workers=max_workers,
+            ordered=ordered,
+        )
+
+    async def get_anime_ranking(
+        self,
+        ranking_type: str = "all",
+        limit: int = 10,
+        offset: int = 0,
+        fields=None,
+        models: bool = None,
+    ) -> list:
+        """
+        > Awaitable version of Anime.get_anime_ranking.
+        """
+        params = _anime_ranking_params(self, ranking_type, limit, offset, fields)
+        model = model_class(self, models, AnimeNode)
+        return await self.api_call.request("GET", "anime/ranking", params=params, transform=listing(model))
+
+    async def get_seasonal_anime(
+        self,
+        season: str = None,
+        year: int = None,
+        sort: str = None,
+        limit: int = 10,
+        offset: int = 0,
+        fields=None,
+        models: bool = None,
+    ) -> list:
+        """
+        > Awaitable version of Anime.get_seasonal_anime.
+        """
+        endpoint, params = _seasonal_anime_request(self, season, year, sort, limit, offset, fields)
+        model = model_class(self, models, AnimeNode)
+        return await self.api_call.request("GET", endpoint, params=params, transform=listing(model))
+
+    async def get_suggested_anime(
+        self, limit: int = 10, offset: int = 0, fields=None, models: bool = None
+    ) -> list:
+        """
+        > Awaitable version of Anime.get_suggested_anime.
+        """
+        params = _suggested_anime_params(self, limit, offset, fields)
+        model = model_class(self, models, AnimeNode)
+        return await self.api_call.request("GET", "anime/suggestions", params=params, transform=listing(model))
+
+    def iter_search_anime(
+        self,
+        query: str,
+        limit: int = 100,
+        max_items: int = None,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Async iterator version of Anime.iter_search_anime.
+        """
+        params = _search_anime_params(self, query, limit, 0, fields)
+        model = model_class(self, models, AnimeNode)
+        return aiter_pages(self.api_call, "anime", params, max_items, model=model, stream=stream)
+
+    def iter_anime_ranking(
+        self,
+        ranking_type: str = "all",
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Async iterator version of Anime.iter_anime_ranking.
+        """
+        params = _anime_ranking_params(self, ranking_type, limit, 0, fields)
+        model = model_class(self, models, AnimeNode)
+        if max_in_flight > 1:
+            return aiter_pages_parallel(
+                self.api_call, "anime/ranking", params, max_items, max_in_flight, model=model
+            )
+        return aiter_pages(
+            self.api_call, "anime/ranking", params, max_items, model=model, stream=stream
+        )
+
+    def iter_seasonal_anime(
+        self,
+        season: str = None,
+        year: int = None,
+        sort: str = None,
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Async iterator version of Anime.iter_seasonal_anime.
+        """
+        endpoint, params = _seasonal_anime_request(self, season, year, sort, limit, 0, fields)
+        model = model_class(self, models, AnimeNode)
+        if max_in_flight > 1:
+            return aiter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=model
+            )
+        return aiter_pages(self.api_call, endpoint, params, max_items, model=model, stream=stream)
+
+    async def export_anime_ranking(
+        self,
+        ranking_type: str = "all",
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        stream: bool = False,
+    ) -> AnimeColumns:
+        """
+        > Awaitable version of Anime.export_anime_ranking.
+        """
+        params = _anime_ranking_params(self, ranking_type, limit, 0, fields)
+        if max_in_flight > 1:
+            items = aiter_pages_parallel(
+                self.api_call, "anime/ranking", params, max_items, max_in_flight, model=RawItem
+            )
+        else:
+            items = aiter_pages(
+                self.api_call, "anime/ranking", params, max_items, model=RawItem, stream=stream
+            )
+        return AnimeColumns.from_items([item async for item in items])
+
+    async def export_seasonal_anime(
+        self,
+        season: str = None,
+        year: int = None,
+        sort: str = None,
+        limit: int = 500,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        stream: bool = False,
+    ) -> AnimeColumns:
+        """
+        > Awaitable version of Anime.export_seasonal_anime.
+        """
+        endpoint, params = _seasonal_anime_request(self, season, year, sort, limit, 0, fields)
+        if max_in_flight > 1:
+            items = aiter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=RawItem
+            )
+        else:
+            items = aiter_pages(self.api_call, endpoint, params, max_items, model=RawItem, stream=stream)
+        return AnimeColumns.from_items([item async for item in items])
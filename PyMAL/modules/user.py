@@ -1,14 +1,123 @@
 from ..util import *
+from ..paging import iter_pages, aiter_pages, iter_pages_parallel, aiter_pages_parallel
+from ..columnar import AnimeColumns, RawItem
+from ..fields import resolve_fields
+from ..models import UserAnimeListEntry, model_class
+
+
+# Form fields accepted by the my_list_status endpoint
+LIST_STATUS_FIELDS = (
+    "status",
+    "is_rewatching",
+    "score",
+    "num_watched_episodes",
+    "priority",
+    "num_times_rewatched",
+    "rewatch_value",
+    "tags",
+    "comments",
+)
+
+
+def _user_anime_list_request(
+    username: str, status: str, sort: str, limit: int, offset: int, fields=None
+) -> tuple:
+    """
+    > Validates the user anime list arguments and returns the (endpoint, params) to request.
+    """
+    status_values = ["watching", "completed", "on_hold", "dropped", "plan_to_watch"]
+    sort_values = [
+        "list_score",
+        "list_updated_at",
+        "anime_title",
+        "anime_start_date",
+        "anime_id",
+    ]
+
+    if status is not None:
+        if status not in status_values:
+            raise ValueError(f"status must be one of {status_values}")
+    if sort is not None:
+        if sort not in sort_values:
+            raise ValueError(f"sort must be one of {sort_values}")
+    if limit > 1000:
+        raise ValueError("limit must be less than or equal to 1000")
+    params = {
+        "status": status,
+        "sort": sort,
+        "limit": limit,
+        "offset": offset,
+        "fields": resolve_fields(fields),
+    }
+    return f"users/{username}/animelist", params
+
+
+def _list_status_data(
+    status: str,
+    is_rewatching: bool,
+    score: int,
+    num_watched_episodes: int,
+    priority: int,
+    num_times_rewatched: int,
+    rewatch_value: int,
+    tags: str,
+    comments: str,
+) -> dict:
+    """
+    > Validates the list status arguments and returns the form data to send.
+    """
+    data = {
+        "status": status,
+        "is_rewatching": is_rewatching,
+        "score": score,
+        "num_watched_episodes": num_watched_episodes,
+        "priority": priority,
+        "num_times_rewatched": num_times_rewatched,
+        "rewatch_value": rewatch_value,
+        "tags": tags,
+        "comments": comments,
+    }
+    data = {k: v for k, v in data.items() if v is not None}
+    # status is required here, unlike in a partial update
+    _check_list_status(dict(data, status=status))
+    return data
+
+
+def _check_list_status(data: dict):
+    """
+    > Validates the given list status fields; fields that are left out are not checked.
+    """
+    status_values = ["watching", "completed", "on_hold", "dropped", "plan_to_watch"]
+    priority_values = [1, 2, None]
+    rewatch_value_values = [1, 2, 3, 4, 5, None]
+    unknown = set(data) - set(LIST_STATUS_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown list status fields {sorted(unknown)}")
+    if "status" in data and data["status"] not in status_values:
+        raise ValueError(f"status must be one of {status_values}")
+    if data.get("priority") not in priority_values:
+        raise ValueError(f"priority must be one of {priority_values}")
+    if data.get("rewatch_value") not in rewatch_value_values:
+        raise ValueError(f"rewatch_value must be one of {rewatch_value_values}")
+    if data.get("score") is not None:
+        if data["score"] < 0 or data["score"] > 10:
+            raise ValueError(f"score must be between 0 and 10")
+    if data.get("num_watched_episodes") is not None:
+        if data["num_watched_episodes"] < 1:
+            raise ValueError(f"num_watched_episodes must be greater than or equal to 1")
+    if data.get("num_times_rewatched") is not None:
+        if data["num_times_rewatched"] < 0:
+            raise ValueError(f"num_times_rewatched must be greater than or equal to 0")
 
 
 class User:
     def get_user(self):
         """
         > Get user info (@me)
-        
+
         Returns:
             dict: User info.
-        
+
         ---
         https://myanimelist.net/apiconfig/references/api/v2#tag/user
         """
@@ -21,6 +130,8 @@ class User:
         sort: str = None,
         limit: int = 100,
         offset: int = None,
+        fields=None,
+        models: bool = None,
     ) -> list:
         """
         > Get user anime list.
@@ -31,6 +142,10 @@ class User:
             sort (str): Sort.
             limit (int): Limit.
             offset (int): Offset.
+            fields: Fields to request for each entry, e.g. ["list_status", "genres"] or a
+                preset name. None returns the API defaults.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
 
         Returns:
             list: List of user anime list.
@@ -38,28 +153,87 @@ class User:
         ---
         https://myanimelist.net/apiconfig/references/api/v2#operation/users_user_id_animelist_get
         """
-        status_values = ["watching", "completed", "on_hold", "dropped", "plan_to_watch"]
-        sort_values = [
-            "list_score",
-            "list_updated_at",
-            "anime_title",
-            "anime_start_date",
-            "anime_id",
-        ]
-
-        if status is not None:
-            if status not in status_values:
-                raise ValueError(f"status must be one of {status_values}")
-        if sort is not None:
-            if sort not in sort_values:
-                raise ValueError(f"sort must be one of {sort_values}")
-        if limit > 1000:
-            raise ValueError("limit must be less than or equal to 1000")
-        return reform_json(self.api_call.request(
-            "GET",
-            f"users/{username}/animelist",
-            params={"status": status, "sort": sort, "limit": limit, "offset": offset},
-        ))
+        endpoint, params = _user_anime_list_request(username, status, sort, limit, offset, fields)
+        model = model_class(self, models, UserAnimeListEntry)
+        return self.api_call.request("GET", endpoint, params=params, transform=listing(model))
+
+    def iter_user_anime_list(
+        self,
+        username: str = "@me",
+        status: str = None,
+        sort: str = None,
+        limit: int = 1000,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Lazily iterate over a whole user anime list, following the API pagination.
+
+        Args:
+            username (str): Username.
+            status (str): Status.
+            sort (str): Sort.
+            limit (int): Number of entries fetched per page (max 1000).
+            max_items (int): Stop after this many entries. None returns the whole list.
+            max_in_flight (int): Fetch this many pages in parallel by offset instead of
+                following paging.next one page at a time.
+            fields: Fields to request for each entry, e.g. ["list_status", "genres"] or a
+                preset name. None returns the API defaults.
+            models (bool): Return typed models (see PyMAL.models) instead of dicts. Defaults
+                to the client setting.
+            stream (bool): Decode each page while it is downloaded instead of loading it whole,
+                keeping memory flat on large pages. Ignored when max_in_flight > 1.
+
+        Yields:
+            dict: User anime list entries, in order.
+        """
+        endpoint, params = _user_anime_list_request(username, status, sort, limit, 0, fields)
+        model = model_class(self, models, UserAnimeListEntry)
+        if max_in_flight > 1:
+            return iter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=model
+            )
+        return iter_pages(self.api_call, endpoint, params, max_items, model=model, stream=stream)
+
+    def export_user_anime_list(
+        self,
+        username: str = "@me",
+        status: str = None,
+        sort: str = None,
+        limit: int = 1000,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        stream: bool = False,
+    ) -> AnimeColumns:
+        """
+        > Fetch a whole user anime list straight into columns, for to_numpy, to_arrow or to_parquet.
+
+        Args:
+            username (str): Username.
+            status (str): Status.
+            sort (str): Sort.
+            limit (int): Number of entries fetched per page (max 1000).
+            max_items (int): Stop after this many entries. None returns the whole list.
+            max_in_flight (int): Fetch this many pages in parallel by offset.
+            fields: Fields to request for each entry, e.g. ["list_status", "genres"] or a
+                preset name. None returns the API defaults.
+            stream (bool): Decode each page while it is downloaded. Ignored when max_in_flight > 1.
+
+        Returns:
+            AnimeColumns: The list entries, with list_status_ columns.
+        """
+        endpoint, params = _user_anime_list_request(username, status, sort, limit, 0, fields)
+        if max_in_flight > 1:
+            items = iter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=RawItem
+            )
+        else:
+            items = iter_pages(self.api_call, endpoint, params, max_items, model=RawItem, stream=stream)
+        return AnimeColumns.from_items(items)
 
     def update_user_anime_list(
         self,
@@ -95,39 +269,17 @@ class User:
         ---
         https://myanimelist.net/apiconfig/references/api/v2#operation/anime_anime_id_my_list_status_put
         """
-
-        status_values = ["watching", "completed", "on_hold", "dropped", "plan_to_watch"]
-        priority_values = [1, 2, None]
-        rewatch_value_values = [1, 2, 3, 4, 5, None]
-        if status not in status_values:
-            raise ValueError(f"status must be one of {status_values}")
-        if priority not in priority_values:
-            raise ValueError(f"priority must be one of {priority_values}")
-        if rewatch_value not in rewatch_value_values:
-            raise ValueError(f"rewatch_value must be one of {rewatch_value_values}")
-        if score is not None:
-            if score < 0 or score > 10:
-                raise ValueError(f"score must be between 0 and 10")
-        if num_watched_episodes < 1:
-            raise ValueError(f"num_watched_episodes must be greater than or equal to 1")
-        if num_times_rewatched != None:
-            if num_times_rewatched < 0:
-                raise ValueError(f"num_times_rewatched must be greater than or equal to 0")
-            
-        data = {
-            "status": status,
-            "is_rewatching": is_rewatching,
-            "score": score,
-            "num_watched_episodes": num_watched_episodes,
-            "priority": priority,
-            "num_times_rewatched": num_times_rewatched,
-            "rewatch_value": rewatch_value,
-            "tags": tags,
-            "comments": comments,
-        }
-
-        data = {k: v for k, v in data.items() if v is not None}
-
+        data = _list_status_data(
+            status,
+            is_rewatching,
+            score,
+            num_watched_episodes,
+            priority,
+            num_times_rewatched,
+            rewatch_value,
+            tags,
+            comments,
+        )
         return self.api_call.request(
             "PATCH", f"anime/{anime_id}/my_list_status", data=data
         )
@@ -146,3 +298,111 @@ class User:
         https://myanimelist.net/apiconfig/references/api/v2#operation/anime_anime_id_my_list_status_delete
         """
         return (self.api_call.request("DELETE", f"anime/{anime_id}/my_list_status"))
+
+
+class AsyncUser:
+    async def get_user(self):
+        """
+        > Awaitable version of User.get_user.
+        """
+        return await self.api_call.request("GET", "users/@me")
+
+    async def get_user_anime_list(
+        self,
+        username: str = "@me",
+        status: str = None,
+        sort: str = None,
+        limit: int = 100,
+        offset: int = None,
+        fields=None,
+        models: bool = None,
+    ) -> list:
+        """
+        > Awaitable version of User.get_user_anime_list.
+        """
+        endpoint, params = _user_anime_list_request(username, status, sort, limit, offset, fields)
+        model = model_class(self, models, UserAnimeListEntry)
+        return await self.api_call.request("GET", endpoint, params=params, transform=listing(model))
+
+    def iter_user_anime_list(
+        self,
+        username: str = "@me",
+        status: str = None,
+        sort: str = None,
+        limit: int = 1000,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        models: bool = None,
+        stream: bool = False,
+    ):
+        """
+        > Async iterator version of User.iter_user_anime_list.
+        """
+        endpoint, params = _user_anime_list_request(username, status, sort, limit, 0, fields)
+        model = model_class(self, models, UserAnimeListEntry)
+        if max_in_flight > 1:
+            return aiter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=model
+            )
+        return aiter_pages(self.api_call, endpoint, params, max_items, model=model, stream=stream)
+
+    async def export_user_anime_list(
+        self,
+        username: str = "@me",
+        status: str = None,
+        sort: str = None,
+        limit: int = 1000,
+        max_items: int = None,
+        max_in_flight: int = 1,
+        fields=None,
+        stream: bool = False,
+    ) -> AnimeColumns:
+        """
+        > Awaitable version of User.export_user_anime_list.
+        """
+        endpoint, params = _user_anime_list_request(username, status, sort, limit, 0, fields)
+        if max_in_flight > 1:
+            items = aiter_pages_parallel(
+                self.api_call, endpoint, params, max_items, max_in_flight, model=RawItem
+            )
+        else:
+            items = aiter_pages(self.api_call, endpoint, params, max_items, model=RawItem, stream=stream)
+        return AnimeColumns.from_items([item async for item in items])
+
+    async def update_user_anime_list(
+        self,
+        anime_id: int,
+        status: str = "watching",
+        is_rewatching: bool = None,
+        score: int = None,
+        num_watched_episodes: int = 1,
+        priority: int = None,
+        num_times_rewatched: int = None,
+        rewatch_value: int = None,
+        tags: str = None,
+        comments: str = None,
+    ):
+        """
+        > Awaitable version of User.update_user_anime_list.
+        """
+        data = _list_status_data(
+            status,
+            is_rewatching,
+            score,
+            num_watched_episodes,
+            priority,
+            num_times_rewatched,
+            rewatch_value,
+            tags,
+            comments,
+        )
+        return await self.api_call.request(
+            "PATCH", f"anime/{anime_id}/my_list_status", data=data
+        )
+
+    async def delete_user_anime_list(self, anime_id: int)->list:
+        """
+        > Awaitable version of User.delete_user_anime_list.
+        """
+        return await self.api_call.request("DELETE", f"anime/{anime_id}/my_list_status")
@@ -0,0 +1,278 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from .util import node_of
+
+
+def split_next_url(url: str, version: str) -> tuple:
+    """
+    > Splits a paging.next URL into the (endpoint, params) that API.request takes.
+
+    Args:
+      url (str): The paging.next URL sent by the API.
+      version (str): The API version prefix of the path, e.g. v2.
+
+    Returns:
+      tuple: The endpoint relative to the version prefix and a dictionary of query parameters.
+    """
+    parts = urlsplit(url)
+    endpoint = parts.path.split(f"/{version}/", 1)[-1]
+    return endpoint, dict(parse_qsl(parts.query))
+
+
+def iter_pages(
+    api,
+    endpoint: str,
+    params: dict = None,
+    max_items: int = None,
+    prefetch: bool = True,
+    model=None,
+    stream: bool = False,
+):
+    """
+    > Yields the nodes of a paginated listing, following paging.next until the end or max_items.
+
+    While the current page is being consumed the next one is already requested on a
+    background thread. Only the current and the next page are kept in memory.
+
+    With stream the items are decoded while each page is downloaded instead, so not even
+    one page is held in memory as a whole. The next page link only arrives after the items,
+    so streamed pages are not prefetched.
+
+    Args:
+      api (API): The adapter used to send the requests.
+      endpoint (str): Endpoint of the first page.
+      params (dict): Parameters of the first page.
+      max_items (int): Stop after this many items. None walks the whole listing.
+      prefetch (bool): Fetch the next page while the current one is consumed.
+      model: Model class to build each item with (see PyMAL.models). None yields dicts.
+      stream (bool): Decode the items of each page while it is downloaded.
+
+    Yields:
+      dict: Each node of the listing (or model instance), in order.
+    """
+    if max_items is not None and max_items <= 0:
+        return
+    build = model.from_item if model is not None else node_of
+    if stream:
+        yield from _iter_streamed_pages(api, endpoint, params, max_items, build)
+        return
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pending = None
+    try:
+        page = api.request("GET", endpoint, params=params)
+        count = 0
+        while True:
+            data = page.get("data", [])
+            next_url = page.get("paging", {}).get("next")
+            has_next = next_url and (max_items is None or count + len(data) < max_items)
+            if has_next and executor is not None:
+                pending = executor.submit(api.request, "GET", *split_next_url(next_url, api.version))
+
+            for item in data:
+                yield build(item)
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+
+            if not has_next:
+                return
+            if pending is not None:
+                page, pending = pending.result(), None
+            else:
+                next_endpoint, next_params = split_next_url(next_url, api.version)
+                page = api.request("GET", next_endpoint, params=next_params)
+    finally:
+        if pending is not None:
+            pending.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _iter_streamed_pages(api, endpoint: str, params: dict, max_items: int, build):
+    count = 0
+    while True:
+        items = api.stream(endpoint, params)
+        try:
+            for item in items:
+                yield build(item)
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+        finally:
+            items.close()
+        next_url = items.extra.get("paging", {}).get("next")
+        if not next_url:
+            return
+        endpoint, params = split_next_url(next_url, api.version)
+
+
+async def aiter_pages(
+    api,
+    endpoint: str,
+    params: dict = None,
+    max_items: int = None,
+    prefetch: bool = True,
+    model=None,
+    stream: bool = False,
+):
+    """
+    > Async generator version of iter_pages, the next page is prefetched as an asyncio task.
+    """
+    import asyncio
+
+    if max_items is not None and max_items <= 0:
+        return
+    build = model.from_item if model is not None else node_of
+    if stream:
+        async for item in _aiter_streamed_pages(api, endpoint, params, max_items, build):
+            yield item
+        return
+    pending = None
+    try:
+        page = await api.request("GET", endpoint, params=params)
+        count = 0
+        while True:
+            data = page.get("data", [])
+            next_url = page.get("paging", {}).get("next")
+            has_next = next_url and (max_items is None or count + len(data) < max_items)
+            if has_next and prefetch:
+                pending = asyncio.ensure_future(
+                    api.request("GET", *split_next_url(next_url, api.version))
+                )
+
+            for item in data:
+                yield build(item)
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+
+            if not has_next:
+                return
+            if pending is not None:
+                page, pending = await pending, None
+            else:
+                next_endpoint, next_params = split_next_url(next_url, api.version)
+                page = await api.request("GET", next_endpoint, params=next_params)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def _aiter_streamed_pages(api, endpoint: str, params: dict, max_items: int, build):
+    count = 0
+    while True:
+        items = await api.stream(endpoint, params)
+        try:
+            async for item in items:
+                yield build(item)
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+        finally:
+            await items.close()
+        next_url = items.extra.get("paging", {}).get("next")
+        if not next_url:
+            return
+        endpoint, params = split_next_url(next_url, api.version)
+
+
+def iter_pages_parallel(
+    api, endpoint: str, params: dict, max_items: int = None, max_in_flight: int = 4, model=None
+):
+    """
+    > Yields the nodes of an offset-based listing, fetching up to max_in_flight pages at once.
+
+    The offset range is split into limit-sized pages which are requested on a worker pool
+    ahead of the consumer. Pages are still yielded in order, and no new pages are requested
+    once one comes back short or without paging.next. When max_items is the known size of
+    the listing no page is requested past it.
+
+    Args:
+      api (API): The adapter used to send the requests.
+      endpoint (str): Endpoint of the listing.
+      params (dict): Parameters of the first page, must contain limit.
+      max_items (int): Stop after this many items. None walks the whole listing.
+      max_in_flight (int): Maximum number of pages requested at the same time.
+      model: Model class to build each item with (see PyMAL.models). None yields dicts.
+
+    Yields:
+      dict: Each node of the listing (or model instance), in order.
+    """
+    if max_items is not None and max_items <= 0:
+        return
+    build = model.from_item if model is not None else node_of
+    limit = int(params["limit"])
+    start = int(params.get("offset") or 0)
+    end = start + max_items if max_items is not None else None
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    pending = deque()
+    next_offset = start
+
+    def submit():
+        nonlocal next_offset
+        page_params = dict(params, offset=next_offset)
+        pending.append(executor.submit(api.request, "GET", endpoint, page_params))
+        next_offset += limit
+
+    try:
+        count = 0
+        while True:
+            while len(pending) < max_in_flight and (end is None or next_offset < end):
+                submit()
+            if not pending:
+                return
+            page = pending.popleft().result()
+            data = page.get("data", [])
+            for item in data:
+                yield build(item)
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+            if len(data) < limit or not page.get("paging", {}).get("next"):
+                return
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def aiter_pages_parallel(
+    api, endpoint: str, params: dict, max_items: int = None, max_in_flight: int = 4, model=None
+):
+    """
+    > Async generator version of iter_pages_parallel, pages are fetched as concurrent tasks.
+    """
+    import asyncio
+
+    if max_items is not None and max_items <= 0:
+        return
+    build = model.from_item if model is not None else node_of
+    limit = int(params["limit"])
+    start = int(params.get("offset") or 0)
+    end = start + max_items if max_items is not None else None
+    pending = deque()
+    next_offset = start
+
+    try:
+        count = 0
+        while True:
+            while len(pending) < max_in_flight and (end is None or next_offset < end):
+                page_params = dict(params, offset=next_offset)
+                pending.append(asyncio.ensure_future(api.request("GET", endpoint, params=page_params)))
+                next_offset += limit
+            if not pending:
+                return
+            page = await pending.popleft()
+            data = page.get("data", [])
+            for item in data:
+                yield build(item)
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+            if len(data) < limit or not page.get("paging", {}).get("next"):
+                return
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,383 @@
+import base64
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .auth import Auth
+from .client import BaseClient, _response_cache
+from .fields import ANIME_FIELDS, FIELD_PRESETS, resolve_fields
+from .modules.anime import Anime
+from .modules.user import User
+from .ratelimit import RateLimiter
+from .rest_adapter import API, APIError
+from .transport import DEFAULT_COMPRESSION
+
+# A request made this close to expiry waits for the refresh instead of racing the clock
+EXPIRY_SKEW = 30
+# Wait before retrying a background refresh that failed
+REFRESH_BACKOFF = 60
+
+
+def token_expiry(token: dict) -> float:
+    """
+    > Returns when an access token expires, as a Unix timestamp.
+
+    Uses expires_at when the token was obtained by this library, else the exp claim of the
+    access token (MAL issues JWTs). Returns None when neither is known.
+
+    Args:
+      token (dict): The token, as returned by Auth.
+
+    Returns:
+      float: The expiry time.
+    """
+    if token.get("expires_at") is not None:
+        return float(token["expires_at"])
+    try:
+        payload = token["access_token"].split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (KeyError, IndexError, ValueError, TypeError):
+        return None
+
+
+# A user token held by a ClientPool, replaced as a whole when it is refreshed
+class _UserToken(object):
+    def __init__(self, username: str, token: dict, client_id: str, client_secret: str):
+        self.username = username
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.retry_at = 0.0
+        self.set(token)
+
+    def set(self, token: dict):
+        self.token = token
+        self.expires_at = token_expiry(token)
+        self.lifetime = token.get("expires_in")
+        self.headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+
+# api_call of a pooled client: the pool's shared API, sending one user's (or a client ID's) headers
+class _PooledAPI(object):
+    def __init__(self, pool, username: str):
+        self._pool = pool
+        self._api = pool.api_call
+        self._username = username
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    @property
+    def headers(self) -> dict:
+        return self._pool._headers(self._username)
+
+    def request(self, method, endpoint, params = None, data = None, headers = None, transform = None) -> dict:
+        if headers is not None:
+            return self._api.request(method, endpoint, params, data, headers, transform)
+        return self._pool._call(
+            self._username, lambda auth: self._api.request(method, endpoint, params, data, auth, transform)
+        )
+
+    def stream(self, endpoint, params = None, headers = None):
+        if headers is not None:
+            return self._api.stream(endpoint, params, headers)
+        return self._pool._call(self._username, lambda auth: self._api.stream(endpoint, params, auth))
+
+
+# A User and Anime client backed by a ClientPool, see ClientPool.client
+class PooledClient(BaseClient, User, Anime):
+    def __init__(self, pool, username: str = None):
+        self.pool = pool
+        self.username = username
+        self.client_id = None
+        self.api_call = _PooledAPI(pool, username)
+        self.anime_fields = list(ANIME_FIELDS)
+        self.default_fields = pool.default_fields
+        self.models = pool.models
+        self.catalog = pool.catalog
+
+    @property
+    def headers(self) -> dict:
+        return self.api_call.headers
+
+    def __repr__(self):
+        return f"PooledClient(username={self.username!r})"
+
+
+# Serves many users and client IDs over one API, with one connection pool, limiter and cache
+class ClientPool(object):
+    def __init__(
+        self,
+        client_ids,
+        tokens: dict = None,
+        refresh_margin: float = 3600,
+        on_refresh=None,
+        max_refresh_workers: int = 4,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        timeout=None,
+        rate_limit: float = None,
+        burst: int = 1,
+        max_retries: int = 3,
+        rate_limiter: RateLimiter = None,
+        cache=None,
+        single_flight: bool = True,
+        fields="full",
+        models: bool = False,
+        catalog=None,
+        base_url: str = "https://api.myanimelist.net",
+        hooks=None,
+        transport=None,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        """
+        > Holds the tokens of many users and hands out lightweight clients that share one
+        API, so hundreds of users cost one session instead of hundreds.
+
+        A token is refreshed with the refresh_token grant once it is within refresh_margin
+        seconds of expiring. The refresh runs in the background while the user's requests keep
+        going out with the still valid old token; only a request made when the token is
+        (about to be) expired waits for it. A request answered with "The access token expired"
+        refreshes the token and is retried once.
+
+        Requests without a user (see client()) send X-MAL-CLIENT-ID and rotate through the
+        client IDs round-robin, spreading catalog traffic over them.
+
+        Args:
+          client_ids: Client IDs, or (client_id, client_secret) pairs for web apps.
+          tokens (dict): Username to token dict (as stored by Auth), refreshed with the first client ID.
+          refresh_margin (float): Seconds before expiry a token is refreshed.
+          on_refresh: Called with (username, token) after a refresh, e.g. to persist the new token.
+            The old refresh_token stops working once it is used.
+          max_refresh_workers (int): Maximum number of background refreshes at once.
+          fields: Default anime fields of the pooled clients, see Client.
+          models (bool): Return typed models from the pooled clients, see Client.
+          catalog (Catalog): Local catalog searched by search_anime(source="local").
+          base_url (str): Root URL of the API, e.g. a local stand-in server.
+          hooks: Instrumentation hooks (see PyMAL.instrument), e.g. a Metrics, or a list of them.
+          transport: How requests are sent, None for pooled HTTP/1.1, "http2" to multiplex the
+            calls over a few HTTP/2 connections or a Transport (see PyMAL.transport).
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
+          The other arguments configure the shared API and are the same as in Client.
+        """
+        self.credentials = [
+            (entry, None) if isinstance(entry, str) else tuple(entry) for entry in client_ids
+        ]
+        if not self.credentials:
+            raise ValueError("ClientPool needs at least one client ID")
+        self.refresh_margin = refresh_margin
+        self.on_refresh = on_refresh
+        self.default_fields = resolve_fields(fields, FIELD_PRESETS["full"])
+        self.models = models
+        self.catalog = catalog
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(rate=rate_limit, burst=burst, max_retries=max_retries)
+        self.api_call = API(
+            base_url=base_url,
+            version="v2",
+            headers={"X-MAL-CLIENT-ID": self.credentials[0][0]},
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            keep_alive=keep_alive,
+            timeout=timeout,
+            rate_limiter=rate_limiter,
+            cache=_response_cache(cache),
+            single_flight=single_flight,
+            hooks=hooks,
+            transport=transport,
+            compression=compression,
+        )
+        self._client_headers = itertools.cycle(
+            [{"X-MAL-CLIENT-ID": client_id} for client_id, _ in self.credentials]
+        )
+        self._users = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._counters = {"refreshed": 0, "refresh_failed": 0, "expired_retries": 0}
+        self._refresh_executor = ThreadPoolExecutor(max_workers=max_refresh_workers)
+        for username, token in (tokens or {}).items():
+            self.add_user(username, token)
+
+    def add_user(self, username: str, token: dict, client_id: str = None, client_secret: str = None):
+        """
+        > Adds (or replaces) the token of a user.
+
+        Args:
+          username (str): Name the user is looked up by.
+          token (dict): The token, with access_token and refresh_token.
+          client_id (str): Client ID the token was issued to. Defaults to the first one.
+          client_secret (str): Its client secret, looked up in client_ids when not given.
+        """
+        if client_id is None:
+            client_id, client_secret = self.credentials[0]
+        elif client_secret is None:
+            client_secret = dict(self.credentials).get(client_id)
+        with self._lock:
+            self._users[username] = _UserToken(username, token, client_id, client_secret)
+
+    def remove_user(self, username: str):
+        """
+        > Drops the token and the client of a user.
+        """
+        with self._lock:
+            self._users.pop(username, None)
+            self._clients.pop(username, None)
+
+    def users(self) -> list:
+        """
+        > Returns the usernames held by the pool.
+        """
+        with self._lock:
+            return list(self._users)
+
+    def token(self, username: str) -> dict:
+        """
+        > Returns the current token of a user.
+        """
+        return self._user(username).token
+
+    def client(self, username: str = None) -> PooledClient:
+        """
+        > Returns the client of a user, or the shared unauthenticated client when username is None.
+
+        Clients are cheap views on the pool and are reused between calls.
+
+        Args:
+          username (str): A user added to the pool.
+
+        Returns:
+          PooledClient: A client with the User and Anime methods of Client.
+        """
+        if username is not None:
+            self._user(username)
+        with self._lock:
+            client = self._clients.get(username)
+            if client is None:
+                client = self._clients[username] = PooledClient(self, username)
+            return client
+
+    def refresh(self, username: str) -> dict:
+        """
+        > Refreshes the token of a user now, whatever its expiry.
+
+        Returns:
+          dict: The new token.
+        """
+        user = self._user(username)
+        return self._refresh(user, user.headers).token
+
+    def stats(self) -> dict:
+        """
+        > Returns the users held and the refresh counters.
+
+        Returns:
+          dict: users, refreshed and failed refreshes, and requests retried after an expired token.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["users"] = len(self._users)
+            return stats
+
+    def pool_stats(self) -> dict:
+        """
+        > Returns connection pool statistics of the shared session.
+        """
+        return self.api_call.pool_stats()
+
+    def close(self):
+        """
+        > Waits for the refreshes in flight and closes every pooled connection.
+        """
+        self._refresh_executor.shutdown(wait=True)
+        self.api_call.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _user(self, username: str) -> _UserToken:
+        with self._lock:
+            user = self._users.get(username)
+        if user is None:
+            raise KeyError(f"{username} is not in the pool")
+        return user
+
+    def _headers(self, username: str) -> dict:
+        """
+        > Returns the headers the next request of a user goes out with.
+        """
+        if username is None:
+            with self._lock:
+                return next(self._client_headers)
+        user = self._user(username)
+        if user.expires_at is not None:
+            now = time.time()
+            if now >= user.expires_at - EXPIRY_SKEW:
+                return self._refresh(user, user.headers).headers
+            margin = self.refresh_margin
+            if user.lifetime:
+                # short lived tokens would otherwise be refreshed on every request
+                margin = min(margin, user.lifetime / 2)
+            if now >= user.expires_at - margin:
+                self._refresh_in_background(user)
+        return user.headers
+
+    def _call(self, username: str, send):
+        headers = self._headers(username)
+        if username is None:
+            return send(headers)
+        try:
+            return send(headers)
+        except APIError as e:
+            if e.status_code != 401 or str(e) != "The access token expired":
+                raise
+        with self._lock:
+            self._counters["expired_retries"] += 1
+        return send(self._refresh(self._user(username), headers).headers)
+
+    def _refresh(self, user: _UserToken, stale: dict) -> _UserToken:
+        """
+        > Refreshes the token unless another caller already replaced the stale headers.
+        """
+        with user.lock:
+            if user.headers is not stale:
+                return user
+            auth = Auth(user.client_id, user.client_secret, store_token=False)
+            try:
+                token = auth.refresh_token(user.token["refresh_token"], self.api_call.session)
+            except Exception:
+                with self._lock:
+                    self._counters["refresh_failed"] += 1
+                raise
+            user.set(token)
+            with self._lock:
+                self._counters["refreshed"] += 1
+        if self.on_refresh is not None:
+            self.on_refresh(user.username, token)
+        return user
+
+    def _refresh_in_background(self, user: _UserToken):
+        with self._lock:
+            if user.refreshing or time.time() < user.retry_at:
+                return
+            user.refreshing = True
+        stale = user.headers
+
+        def run():
+            try:
+                self._refresh(user, stale)
+            except Exception:
+                # the old token is still valid, try again after a while
+                user.retry_at = time.time() + REFRESH_BACKOFF
+            finally:
+                user.refreshing = False
+
+        self._refresh_executor.submit(run)
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Responses worth retrying: MAL answers 429 when throttling and 5xx/504 when overloaded
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+# A thread-safe token bucket with adaptive backoff, shared by every request of a client
+class RateLimiter(object):
+    def __init__(
+        self,
+        rate: float = None,
+        burst: int = 1,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        min_rate: float = None,
+    ):
+        """
+        > This function initializes the token bucket and the retry policy
+
+        Args:
+          rate (float): Requests per second. None disables the token bucket but keeps retries.
+          burst (int): Number of requests that can be sent back to back.
+          max_retries (int): How many times a throttled or failed request is retried.
+          backoff_base (float): Base delay in seconds of the exponential backoff.
+          backoff_max (float): Upper bound of a single backoff delay in seconds.
+          min_rate (float): Lowest rate the limiter slows down to after throttling. Defaults to rate / 10.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else (rate / 10 if rate else None)
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._counters = {"requests": 0, "paced": 0, "throttled": 0, "retried": 0, "failed": 0}
+
+    def reserve(self) -> float:
+        """
+        > Takes a token from the bucket and returns how long the caller has to wait before sending.
+
+        Returns:
+          float: Seconds to sleep, 0 when the request can go out right away.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = -self._tokens / self.rate
+            backoff = self._blocked_until - now
+            self._counters["requests"] += 1
+            # a wait is only counted as throttling when the server asked for it
+            if backoff > 0:
+                self._counters["throttled"] += 1
+            elif wait > 0:
+                self._counters["paced"] += 1
+            return max(wait, backoff)
+
+    def acquire(self):
+        """
+        > Blocks the calling thread until a request may be sent.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def retry_delay(self, attempt: int, status_code: int, retry_after: str = None) -> float:
+        """
+        > Decides whether a response is retried and how long every caller should back off.
+
+        A 429 also halves the current rate, which then recovers with every successful request.
+
+        Args:
+          attempt (int): Number of retries already made for this request.
+          status_code (int): Status code of the response.
+          retry_after (str): Value of the Retry-After header, if any.
+
+        Returns:
+          float: Seconds to wait before retrying, or None when the request should not be retried.
+        """
+        if status_code not in RETRY_STATUS_CODES:
+            return None
+        if attempt >= self.max_retries:
+            with self._lock:
+                self._counters["failed"] += 1
+            return None
+
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        server_delay = _parse_retry_after(retry_after)
+        if server_delay is not None:
+            delay = server_delay + random.uniform(0, self.backoff_base)
+
+        with self._lock:
+            self._counters["retried"] += 1
+            if status_code == 429 and self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+            # every thread waits out the backoff, not only the one that got throttled
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    def record(self, status_code: int):
+        """
+        > Records the final outcome of a request and lets the rate recover after throttling.
+
+        Args:
+          status_code (int): Status code of the response that was returned to the caller.
+        """
+        with self._lock:
+            if status_code in (200, 304):
+                if self.rate and self.rate < self.max_rate:
+                    self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            elif status_code not in RETRY_STATUS_CODES:
+                self._counters["failed"] += 1
+
+    def stats(self) -> dict:
+        """
+        > Returns the limiter counters.
+
+        Returns:
+          dict: requests, paced (waited for a token), throttled (waited out a backoff after a 429
+            or 5xx), retried and failed counts plus the current rate.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["rate"] = self.rate
+            return stats
+
+
+def _parse_retry_after(value: str) -> float:
+    """
+    > Parses a Retry-After header given either in seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
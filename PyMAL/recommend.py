@@ -0,0 +1,357 @@
+import threading
+
+from .batch import Batch
+from .columnar import _numpy
+
+METRICS = ("cosine", "jaccard")
+
+
+# Item-item recommendations computed from user lists, served from memory without requests
+class Recommender(object):
+    def __init__(
+        self,
+        k: int = 50,
+        metric: str = "cosine",
+        unscored_weight: float = 0.5,
+        block_size: int = 512,
+        rebuild_ratio: float = 0.2,
+    ):
+        """
+        > Keeps a sparse user x anime score matrix and the k most similar anime of every anime.
+
+        Scored entries weigh score / 10, watched but unscored ones unscored_weight, and
+        plan_to_watch entries are only used to leave those anime out of the suggestions.
+        After lists are added or changed, refresh() recomputes the neighbors of the anime
+        whose columns changed and of the anime that had them as neighbors, and merges the
+        changed anime into the lists of the others.
+
+        Args:
+          k (int): Number of neighbors kept per anime.
+          metric (str): cosine on the weights, or jaccard on who has the anime in their list.
+          unscored_weight (float): Weight of the entries without a score.
+          block_size (int): Anime whose similarities are computed at once, bounding memory to
+            about block_size x number of anime floats.
+          rebuild_ratio (float): refresh() rebuilds everything when more than this share of
+            the anime changed.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {list(METRICS)}")
+        self.k = k
+        self.metric = metric
+        self.unscored_weight = unscored_weight
+        self.block_size = block_size
+        self.rebuild_ratio = rebuild_ratio
+        self._lock = threading.Lock()
+        self._users = {}
+        self._index_of = {}
+        self._anime_ids = []
+        self._dirty = set()
+        # (neighbors, similarities, anime IDs) swapped as a whole so readers never see half an update
+        self._index = None
+
+    def _anime_index(self, anime_id: int) -> int:
+        index = self._index_of.get(anime_id)
+        if index is None:
+            index = self._index_of[anime_id] = len(self._anime_ids)
+            self._anime_ids.append(anime_id)
+        return index
+
+    def _weights(self, entries) -> tuple:
+        np = _numpy()
+        weights = {}
+        seen = []
+        for entry in entries:
+            anime_id, score, status = _entry(entry)
+            index = self._anime_index(anime_id)
+            seen.append(index)
+            if status != "plan_to_watch":
+                weights[index] = score / 10 if score else self.unscored_weight
+        return (
+            np.fromiter(weights, dtype=np.int32, count=len(weights)),
+            np.fromiter(weights.values(), dtype=np.float32, count=len(weights)),
+            np.array(seen, dtype=np.int32),
+        )
+
+    def add_user(self, username: str, entries):
+        """
+        > Sets the list of a user, replacing the previous one.
+
+        Args:
+          username (str): The user.
+          entries: The list entries, as returned by get_user_anime_list / iter_user_anime_list
+            (dicts with list_status, or UserAnimeListEntry models) or stored by SyncEngine.
+        """
+        with self._lock:
+            user = self._weights(entries)
+            self._mark_changed(self._users.get(username), user)
+            self._users[username] = user
+
+    def remove_user(self, username: str):
+        with self._lock:
+            self._mark_changed(self._users.pop(username, None), None)
+
+    def apply_diff(self, diff):
+        """
+        > Applies a SyncEngine ListDiff to the list of its user.
+        """
+        with self._lock:
+            previous = self._users.get(diff.username)
+            entries = {}
+            if previous is not None:
+                indices, weights, seen = previous
+                entries = {int(index): None for index in seen}
+                entries.update(zip(indices.tolist(), weights.tolist()))
+            for entry in diff.removed:
+                entries.pop(self._anime_index(_entry(entry)[0]), None)
+            for entry in list(diff.added) + [new for _, new in diff.changed]:
+                anime_id, score, status = _entry(entry)
+                index = self._anime_index(anime_id)
+                entries[index] = None if status == "plan_to_watch" else (score / 10 if score else self.unscored_weight)
+            np = _numpy()
+            weighted = {index: weight for index, weight in entries.items() if weight is not None}
+            user = (
+                np.fromiter(weighted, dtype=np.int32, count=len(weighted)),
+                np.fromiter(weighted.values(), dtype=np.float32, count=len(weighted)),
+                np.fromiter(entries, dtype=np.int32, count=len(entries)),
+            )
+            self._mark_changed(previous, user)
+            self._users[diff.username] = user
+
+    def fetch(self, client, usernames, max_workers: int = 8) -> dict:
+        """
+        > Fetches the lists of many users and adds them, then refreshes the neighbors.
+
+        Returns:
+          dict: The exception of every user whose list couldn't be fetched.
+        """
+        batch = Batch(
+            lambda username: list(client.iter_user_anime_list(username, fields="list_status", models=False)),
+            usernames,
+            max_workers=max_workers,
+        )
+        for username, entries in batch:
+            self.add_user(username, entries)
+        self.refresh()
+        return batch.errors
+
+    def _mark_changed(self, old, new):
+        if old is None and new is None:
+            return
+        if old is None or new is None:
+            self._dirty.update((old or new)[0].tolist())
+            return
+        before = dict(zip(old[0].tolist(), old[1].tolist()))
+        after = dict(zip(new[0].tolist(), new[1].tolist()))
+        self._dirty.update(index for index in before.keys() | after.keys() if before.get(index) != after.get(index))
+
+    def _matrix(self):
+        np = _numpy()
+        sparse = _sparse()
+        users = list(self._users.values())
+        counts = [len(indices) for indices, _, _ in users]
+        rows = np.repeat(np.arange(len(users), dtype=np.int32), counts)
+        columns = np.concatenate([indices for indices, _, _ in users]) if users else np.zeros(0, np.int32)
+        if self.metric == "jaccard":
+            values = np.ones(len(columns), dtype=np.float32)
+        else:
+            values = np.concatenate([weights for _, weights, _ in users]) if users else np.zeros(0, np.float32)
+        return sparse.csr_matrix(
+            (values, (rows, columns)), shape=(len(users), len(self._anime_ids)), dtype=np.float32
+        )
+
+    def _similarity_blocks(self, matrix, anime):
+        """
+        > Yields (anime, similarities) for blocks of the given anime, the similarities being a
+        dense (block, number of anime) array with the anime itself set to 0.
+        """
+        np = _numpy()
+        columns = matrix.tocsc()
+        if self.metric == "cosine":
+            scale = np.sqrt(np.asarray(columns.multiply(columns).sum(axis=0), dtype=np.float32).ravel())
+            # anime nobody weighs share nothing, dividing by inf keeps their similarities at 0
+            scale[scale == 0] = np.inf
+        else:
+            scale = np.asarray(columns.sum(axis=0), dtype=np.float32).ravel()
+        for start in range(0, len(anime), self.block_size):
+            block = anime[start:start + self.block_size]
+            similarities = (columns[:, block].T @ matrix).toarray()
+            if self.metric == "cosine":
+                similarities /= scale[block, None]
+                similarities /= scale[None, :]
+            else:
+                union = scale[block, None] + scale[None, :] - similarities
+                similarities /= np.maximum(union, 1, out=union)
+            similarities[np.arange(len(block)), block] = 0
+            yield block, similarities
+
+    def _top(self, candidates, similarities) -> tuple:
+        """
+        > Keeps the k best candidates of every row, best first, -1 where there are fewer.
+        """
+        np = _numpy()
+        k = min(self.k, similarities.shape[1])
+        best = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(similarities, best, axis=1)
+        order = np.argsort(-top, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        neighbors = np.take_along_axis(candidates, best, axis=1) if candidates.ndim == 2 else candidates[best]
+        neighbors = np.where(top > 0, neighbors, -1).astype(np.int32)
+        if k < self.k:
+            pad = self.k - k
+            neighbors = np.pad(neighbors, ((0, 0), (0, pad)), constant_values=-1)
+            top = np.pad(top, ((0, 0), (0, pad)))
+        return neighbors, np.where(neighbors >= 0, top, 0).astype(np.float32)
+
+    def fit(self):
+        """
+        > Recomputes the neighbors of every anime.
+        """
+        np = _numpy()
+        with self._lock:
+            matrix = self._matrix()
+            self._dirty.clear()
+            anime_ids = np.array(self._anime_ids, dtype=np.int64)
+        count = len(anime_ids)
+        neighbors = np.full((count, self.k), -1, dtype=np.int32)
+        similarities = np.zeros((count, self.k), dtype=np.float32)
+        for block, block_similarities in self._similarity_blocks(matrix, np.arange(count)):
+            neighbors[block], similarities[block] = self._top(np.arange(count), block_similarities)
+        self._index = (neighbors, similarities, anime_ids)
+
+    def refresh(self):
+        """
+        > Brings the neighbors up to date with the lists changed since the last fit or refresh.
+
+        The result is the same as fit(). The neighbors of the changed anime, and of every anime
+        that had one of them as a neighbor, are recomputed. The similarities between two
+        unchanged anime stay the same, so the changed anime are merged into the lists of the
+        other anime. When more than rebuild_ratio of the anime need recomputing, it runs fit().
+        """
+        np = _numpy()
+        with self._lock:
+            if self._index is None or len(self._dirty) > self.rebuild_ratio * max(len(self._anime_ids), 1):
+                rebuild = True
+            else:
+                rebuild = False
+                matrix = self._matrix()
+                dirty = np.array(sorted(self._dirty), dtype=np.int64)
+                self._dirty.clear()
+                anime_ids = np.array(self._anime_ids, dtype=np.int64)
+        if rebuild:
+            self.fit()
+            return
+        if not len(dirty):
+            return
+        neighbors, similarities, _ = self._index
+        count = len(anime_ids)
+        added = count - len(neighbors)
+        neighbors = np.pad(neighbors, ((0, added), (0, 0)), constant_values=-1)
+        similarities = np.pad(similarities, ((0, added), (0, 0)))
+        # a list that held a changed anime may have lost it, and the anime that should take its
+        # place was never stored, so those lists are recomputed along with the changed anime
+        stale = np.isin(neighbors, dirty).any(axis=1)
+        stale[dirty] = True
+        recompute = np.flatnonzero(stale)
+        if len(recompute) > self.rebuild_ratio * count:
+            self.fit()
+            return
+        clean = ~stale
+        for block, block_similarities in self._similarity_blocks(matrix, recompute):
+            neighbors[block], similarities[block] = self._top(np.arange(count), block_similarities)
+            changed = np.isin(block, dirty)
+            if not changed.any():
+                continue
+            columns = block[changed]
+            candidates = np.concatenate(
+                [neighbors[clean], np.broadcast_to(columns, (int(clean.sum()), len(columns)))], axis=1
+            )
+            merged = np.concatenate([similarities[clean], block_similarities[changed].T[clean]], axis=1)
+            neighbors[clean], similarities[clean] = self._top(candidates, merged)
+        self._index = (neighbors, similarities, anime_ids)
+
+    def suggest(self, username: str, n: int = 10, exclude_seen: bool = True) -> list:
+        """
+        > Suggests anime for a user from the neighbors of the anime in their list.
+
+        Args:
+          username (str): A user added with add_user, apply_diff or fetch.
+          n (int): Number of suggestions.
+          exclude_seen (bool): Leave out anime already in the user's list.
+
+        Returns:
+          list: (anime_id, score) pairs, best first.
+        """
+        np = _numpy()
+        if self._index is None:
+            raise ValueError("call fit() or refresh() before suggest()")
+        neighbors, similarities, anime_ids = self._index
+        indices, weights, seen = self._users[username]
+        known = indices < len(neighbors)
+        rows = neighbors[indices[known]]
+        votes = similarities[indices[known]] * weights[known, None]
+        valid = rows >= 0
+        scores = np.bincount(rows[valid], weights=votes[valid], minlength=len(neighbors))
+        if exclude_seen:
+            scores[seen[seen < len(scores)]] = 0
+        return _best(scores, anime_ids, n)
+
+    def similar(self, anime_id: int, n: int = 10) -> list:
+        """
+        > Returns the most similar anime of an anime as (anime_id, similarity) pairs.
+        """
+        if self._index is None:
+            raise ValueError("call fit() or refresh() before similar()")
+        neighbors, similarities, anime_ids = self._index
+        index = self._index_of.get(anime_id)
+        if index is None or index >= len(neighbors):
+            return []
+        return [
+            (int(anime_ids[neighbor]), float(similarity))
+            for neighbor, similarity in zip(neighbors[index, :n], similarities[index, :n])
+            if neighbor >= 0
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "anime": len(self._anime_ids),
+            "entries": sum(len(indices) for indices, _, _ in self._users.values()),
+            "pending": len(self._dirty),
+        }
+
+
+def _best(scores, anime_ids, n: int) -> list:
+    np = _numpy()
+    n = min(n, len(scores))
+    if n <= 0:
+        return []
+    best = np.argpartition(-scores, n - 1)[:n]
+    best = best[np.argsort(-scores[best])]
+    return [(int(anime_ids[index]), float(scores[index])) for index in best if scores[index] > 0]
+
+
+def _entry(entry) -> tuple:
+    """
+    > Returns (anime_id, score, status) of a list entry, a dict from the client or SyncEngine,
+    a raw listing item or a UserAnimeListEntry.
+    """
+    if isinstance(entry, dict):
+        if "node" in entry:
+            status = entry.get("list_status") or entry["node"].get("list_status") or {}
+            return entry["node"]["id"], status.get("score"), status.get("status")
+        status = entry.get("list_status") or {}
+        return entry["id"], status.get("score"), status.get("status")
+    status = entry.list_status
+    return entry.node.id, getattr(status, "score", None), getattr(status, "status", None)
+
+
+def _sparse():
+    """
+    > Imports scipy.sparse, which is only needed to build the similarities.
+    """
+    try:
+        import scipy.sparse
+    except ImportError:
+        raise ImportError("Recommender requires SciPy, install it with `pip install PyMAL[recommend]`")
+    return scipy.sparse
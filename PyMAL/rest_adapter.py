@@ -1,52 +1,616 @@
-import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import request_key
+from .instrument import (
+    HttpxConnectTimer,
+    aobserve,
+    as_hooks,
+    connection_timer,
+    current_event,
+    observe,
+    record_exchange,
+)
+from .jsonstream import STREAM_CHUNK_SIZE, AsyncItemStream, ItemStream, loads
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .transport import DEFAULT_COMPRESSION, accept_encoding, as_transport
+
+
+class APIError(Exception):
+    """
+    > Raised when the API answers with an error status code.
+
+    Args:
+      message (str): The error message.
+      status_code (int): The HTTP status code of the response.
+    """
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 # It takes in a base URL, version, and bearer token, and returns a JSON response from the API
 class API(object):
-    def __init__(self, base_url:str, version:str, headers:str):
+    def __init__(
+        self,
+        base_url: str,
+        version: str,
+        headers: str,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        timeout=None,
+        rate_limiter=None,
+        cache=None,
+        single_flight: bool = True,
+        hooks=None,
+        transport=None,
+        compression=DEFAULT_COMPRESSION,
+    ):
         """
         > This function initializes the class with the base URL, version, and bearer token
-        
+
+        A single keep-alive transport is created here and reused by every request, so
+        connections to the API are pooled instead of being opened on every call.
+
         Args:
           base_url (str): The base URL of the API.
           version (str): The version of the API you want to use.
           bearer_token (str): This is the token that you get from the API provider.
+          pool_connections (int): Number of per-host connection pools to keep.
+          pool_maxsize (int): Maximum number of connections kept open per host.
+          pool_block (bool): Block when the pool is exhausted instead of opening extra connections.
+          keep_alive (bool): Keep connections open between requests.
+          timeout: Request timeout in seconds, or a (connect, read) tuple. None waits forever.
+          rate_limiter (RateLimiter): Limiter throttling and retrying requests. None sends them as they come.
+          cache (ResponseCache): Cache for GET responses. None always goes to the network.
+          single_flight (bool): Let identical GETs that are in flight at the same time share one request.
+          hooks (Hooks): Instrumentation hooks (see PyMAL.instrument), or a list of them. None
+            leaves every call uninstrumented.
+          transport: How requests are sent (see PyMAL.transport). None uses HTTP/1.1 connections
+            pooled by requests, "http2" multiplexes concurrent calls over a few HTTP/2
+            connections, a Transport instance is used as is and the pool options are ignored.
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
         """
         self.base_url = base_url
         self.version = version
         self.headers = headers
-    
-    def request(self, method, endpoint, params = None, data = None)->dict:
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.single_flight = SingleFlight() if single_flight else None
+        self.hooks = as_hooks(hooks)
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self._revalidate_executor = None
+
+        self.transport = as_transport(
+            transport,
+            compression,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+        )
+        if self.hooks is not None:
+            self.transport.time_connections()
+        # the underlying requests.Session or httpx.Client, e.g. to refresh tokens over the same connections
+        self.session = getattr(self.transport, "session", None)
+
+    def pool_stats(self) -> dict:
+        """
+        > Returns connection statistics of the transport.
+
+        Returns:
+          dict: requests sent, connections opened, reused requests and idle connections with the
+            default transport, requests per HTTP version with the HTTP/2 one.
+        """
+        return self.transport.pool_stats()
+
+    def close(self):
+        """
+        > Closes every pooled connection.
+        """
+        self.transport.close()
+
+    def request(self, method, endpoint, params = None, data = None, headers = None, transform = None)->dict:
         """
         > This function takes in a method, endpoint, params, and data, and returns the JSON response from
         the API
-        
+
         Args:
           method: The HTTP method to use (GET, POST, PUT, DELETE, PATCH)
           endpoint: The endpoint you want to hit.
           params: a dictionary of parameters to be passed to the API
           data: The data to be sent in the request body.
-        
+          headers: Headers to send instead of self.headers, e.g. another user's Authorization.
+            The cache and single-flight keys follow them.
+          transform: Called with the decoded response to post-process it (e.g. util.listing),
+            timed as the postprocess phase when the call is instrumented.
+
         Returns:
           A dictionary of the JSON response from the API.
         """
-        url = f'{self.base_url}/{self.version}/{endpoint}'
-        
         method = method.upper()
         methods = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
         if method not in methods:
             raise ValueError(f'{method} is not a valid method')
+        if headers is None:
+            headers = self.headers
+        if self.hooks is not None:
+            return observe(
+                self.hooks,
+                method,
+                endpoint,
+                params,
+                lambda: self._dispatch(method, endpoint, params, data, headers),
+                transform,
+            )
+        result = self._dispatch(method, endpoint, params, data, headers)
+        return result if transform is None else transform(result)
+
+    def _dispatch(self, method, endpoint, params, data, headers) -> dict:
+        """
+        > Answers a request from the cache, an identical request in flight or the network.
+        """
+        cache = self.cache
+        if method != 'GET':
+            result = self._fetch(method, endpoint, params, data, headers)
+            if cache is not None:
+                cache.invalidate(endpoint, headers)
+            return result
+
+        ttl = cache.ttl_for(endpoint) if cache is not None else 0
+        if ttl <= 0:
+            if self.single_flight is None:
+                return self._fetch(method, endpoint, params, data, headers)
+            key = request_key(method, endpoint, params, headers)
+            return self.single_flight.do(
+                key, lambda: self._fetch(method, endpoint, params, data, headers)
+            )
+        key = cache.key(method, endpoint, params, headers)
+        entry = cache.get(key)
+        if cache.fresh(entry):
+            return entry.value
+        if entry is not None and cache.stale_while_revalidate:
+            self._revalidate_in_background(key, endpoint, params, entry, ttl, headers)
+            return entry.value
+        if self.single_flight is None:
+            return self._revalidate(key, endpoint, params, entry, ttl, headers)
+        return self.single_flight.do(
+            key, lambda: self._revalidate(key, endpoint, params, entry, ttl, headers)
+        )
+
+    def stream(self, endpoint, params = None, headers = None) -> ItemStream:
+        """
+        > Sends a GET request and decodes the data items of the response while it is downloaded.
+
+        The body is never held in memory as a whole, which keeps large listing pages cheap.
+        Streamed requests always go to the network and are not stored in the cache.
+
+        Args:
+          endpoint: The endpoint you want to hit.
+          params: a dictionary of parameters to be passed to the API
+          headers: Headers to send instead of self.headers.
+
+        Returns:
+          ItemStream: Iterable of the data items, its `extra` dict holds paging once it is exhausted.
+        """
+        if self.hooks is not None:
+            return observe(
+                self.hooks, 'GET', endpoint, params, lambda: self._stream(endpoint, params, headers)
+            )
+        return self._stream(endpoint, params, headers)
+
+    def _stream(self, endpoint, params, headers) -> ItemStream:
+        r = self._send('GET', endpoint, params, None, headers, stream = True)
+        if r.status_code != 200:
+            # the error body is short, read it for the message and hand the connection back
+            try:
+                r.read()
+                _raise_for_error(r)
+            finally:
+                r.close()
+        return ItemStream(r.iter_content(STREAM_CHUNK_SIZE), r.close)
+
+    def _revalidate(self, key, endpoint, params, entry, ttl, headers) -> dict:
+        """
+        > Refreshes a cache entry, conditionally when the stale entry has validators.
+        """
+        cache = self.cache
+        r = self._send('GET', endpoint, params, None, _with_conditional(headers, cache, entry))
+        if r.status_code == 304 and entry is not None:
+            r.close()
+            cache.not_modified(key, entry, ttl)
+            return entry.value
+        result = _handle_response(r, _event(self))
+        cache.set(key, result, ttl, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return result
+
+    def _revalidate_in_background(self, key, endpoint, params, entry, ttl, headers):
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._revalidate_executor is None:
+                self._revalidate_executor = ThreadPoolExecutor(max_workers=4)
+
+        def run():
+            try:
+                self._revalidate(key, endpoint, params, entry, ttl, headers)
+            except Exception:
+                # the stale entry keeps being served, the next request tries again
+                pass
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+
+        self._revalidate_executor.submit(run)
+
+    def _fetch(self, method, endpoint, params, data, headers) -> dict:
+        return _handle_response(self._send(method, endpoint, params, data, headers), _event(self))
 
-        r = requests.request(method, url, headers = self.headers, params = params, data = data)
+    def _send(self, method, endpoint, params, data, headers = None, stream = False):
+        """
+        > Sends the request through the rate limiter, retrying throttled responses.
+        """
+        url = f'{self.base_url}/{self.version}/{endpoint}'
+        if headers is None:
+            headers = self.headers
+        limiter = self.rate_limiter
+        event = _event(self)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                wait = limiter.reserve()
+                if wait > 0:
+                    time.sleep(wait)
+            if event is not None:
+                connection_timer.seconds = 0.0
+                start = time.perf_counter()
+            r = self.transport.send(method, url, headers, params, data, self.timeout, stream)
+            if event is not None:
+                record_exchange(
+                    event,
+                    r.status_code,
+                    r.elapsed,
+                    time.perf_counter() - start,
+                    connection_timer.seconds,
+                    None if stream else len(r.content),
+                    None if stream else r.wire_bytes,
+                    r.decompress_seconds,
+                )
+            if limiter is None:
+                break
+            delay = limiter.retry_delay(attempt, r.status_code, r.headers.get("Retry-After"))
+            if delay is None:
+                limiter.record(r.status_code)
+                break
+            r.close()
+            time.sleep(delay)
+            attempt += 1
+
+        return r
+
+
+def _handle_response(r, event = None) -> dict:
+    """
+    > Returns the JSON body of a successful response or raises for an error one.
+
+    Shared by the sync and async adapters; works with both transport and httpx responses.
+    """
+    if r.status_code == 200:
+        if event is None:
+            return loads(r.content)
+        start = time.perf_counter()
+        result = loads(r.content)
+        event.add("decode", time.perf_counter() - start)
+        return result
+    else:
+        _raise_for_error(r)
 
-        if r.status_code == 200:
-            return r.json()
+
+def _event(api):
+    """
+    > Returns the instrumented call a request of the adapter belongs to, None when hooks are off.
+    """
+    return current_event.get() if api.hooks is not None else None
+
+
+def _raise_for_error(r):
+    """
+    > Raises the APIError matching an error response.
+    """
+    if r.status_code == 401:
+        if "The access token expired" in r.headers.get('WWW-Authenticate', ''):
+            raise APIError('The access token expired', r.status_code)
         else:
-            if r.status_code == 401:
-                if "The access token expired" in r.headers['WWW-Authenticate']:
-                    raise Exception('The access token expired')
-                else:
-                    raise Exception(f'{r.status_code} - {r.json()}')
-            else:
-                raise Exception(f'{r.status_code} - {r.json()}')
+            raise APIError(f'{r.status_code} - {_error_body(r)}', r.status_code)
+    else:
+        raise APIError(f'{r.status_code} - {_error_body(r)}', r.status_code)
+
+
+def _with_conditional(headers, cache, entry) -> dict:
+    """
+    > Adds the validators of a stale cache entry to the request headers.
+    """
+    conditional = cache.conditional_headers(entry)
+    return dict(headers, **conditional) if conditional else headers
+
+
+def _error_body(r):
+    """
+    > Returns the decoded error body, falling back to the raw text for non-JSON errors (e.g. proxy 502 pages).
+    """
+    try:
+        return r.json()
+    except ValueError:
+        return r.text
+
+
+# Awaitable counterpart of API, backed by a pooled httpx.AsyncClient
+class AsyncAPI(object):
+    def __init__(
+        self,
+        base_url: str,
+        version: str,
+        headers: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        max_concurrency: int = None,
+        timeout=None,
+        rate_limiter=None,
+        cache=None,
+        single_flight: bool = True,
+        hooks=None,
+        http2: bool = False,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        """
+        > This function initializes the class with the base URL, version, and headers
+
+        Args:
+          base_url (str): The base URL of the API.
+          version (str): The version of the API you want to use.
+          headers (dict): Headers sent with every request.
+          max_connections (int): Maximum number of open connections.
+          max_keepalive_connections (int): Maximum number of idle connections kept alive.
+          keepalive_expiry (float): Seconds an idle connection is kept alive.
+          max_concurrency (int): Maximum number of requests in flight at once. None is unlimited.
+          timeout: Request timeout in seconds. None waits forever.
+          rate_limiter (RateLimiter): Limiter throttling and retrying requests. None sends them as they come.
+          cache (ResponseCache): Cache for GET responses. None always goes to the network.
+          single_flight (bool): Let identical GETs that are in flight at the same time share one request.
+          hooks (Hooks): Instrumentation hooks (see PyMAL.instrument), or a list of them. None
+            leaves every call uninstrumented.
+          http2 (bool): Multiplex the requests over HTTP/2 connections, needs `pip install PyMAL[http2]`.
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("AsyncAPI requires httpx, install it with `pip install PyMAL[async]`")
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError("http2 requires h2, install it with `pip install PyMAL[http2]`")
+
+        self.base_url = base_url
+        self.version = version
+        self.headers = headers
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.single_flight = AsyncSingleFlight() if single_flight else None
+        self.hooks = as_hooks(hooks)
+        self._revalidating = {}
+        self._semaphore = None
+        self.session = httpx.AsyncClient(
+            http2=http2,
+            headers={"Accept-Encoding": accept_encoding(compression)},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=timeout,
+        )
+
+    async def close(self):
+        """
+        > Closes every pooled connection.
+        """
+        await self.session.aclose()
+
+    async def request(self, method, endpoint, params = None, data = None, headers = None, transform = None)->dict:
+        """
+        > Awaitable version of API.request.
+
+        Args:
+          method: The HTTP method to use (GET, POST, PUT, DELETE, PATCH)
+          endpoint: The endpoint you want to hit.
+          params: a dictionary of parameters to be passed to the API
+          data: The data to be sent in the request body.
+          headers: Headers to send instead of self.headers.
+          transform: Called with the decoded response to post-process it.
+
+        Returns:
+          A dictionary of the JSON response from the API.
+        """
+        method = method.upper()
+        methods = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
+        if method not in methods:
+            raise ValueError(f'{method} is not a valid method')
+        if headers is None:
+            headers = self.headers
+
+        # requests drops None values on its own, httpx would send them as empty strings
+        if params is not None:
+            params = {k: v for k, v in params.items() if v is not None}
+
+        if self.hooks is not None:
+            return await aobserve(
+                self.hooks,
+                method,
+                endpoint,
+                params,
+                lambda: self._dispatch(method, endpoint, params, data, headers),
+                transform,
+            )
+        result = await self._dispatch(method, endpoint, params, data, headers)
+        return result if transform is None else transform(result)
+
+    async def _dispatch(self, method, endpoint, params, data, headers) -> dict:
+        """
+        > Awaitable version of API._dispatch.
+        """
+        import asyncio
+
+        cache = self.cache
+        if method != 'GET':
+            result = await self._fetch(method, endpoint, params, data, headers)
+            if cache is not None:
+                cache.invalidate(endpoint, headers)
+            return result
+
+        ttl = cache.ttl_for(endpoint) if cache is not None else 0
+        if ttl <= 0:
+            if self.single_flight is None:
+                return await self._fetch(method, endpoint, params, data, headers)
+            key = request_key(method, endpoint, params, headers)
+            return await self.single_flight.do(
+                key, lambda: self._fetch(method, endpoint, params, data, headers)
+            )
+        key = cache.key(method, endpoint, params, headers)
+        entry = cache.get(key)
+        if cache.fresh(entry):
+            return entry.value
+        if entry is not None and cache.stale_while_revalidate:
+            if key not in self._revalidating:
+                self._revalidating[key] = asyncio.ensure_future(
+                    self._revalidate_in_background(key, endpoint, params, entry, ttl, headers)
+                )
+            return entry.value
+        if self.single_flight is None:
+            return await self._revalidate(key, endpoint, params, entry, ttl, headers)
+        return await self.single_flight.do(
+            key, lambda: self._revalidate(key, endpoint, params, entry, ttl, headers)
+        )
+
+    async def stream(self, endpoint, params = None, headers = None) -> AsyncItemStream:
+        """
+        > Awaitable version of API.stream, iterate the returned stream with `async for`.
+        """
+        if params is not None:
+            params = {k: v for k, v in params.items() if v is not None}
+        if self.hooks is not None:
+            return await aobserve(
+                self.hooks, 'GET', endpoint, params, lambda: self._stream(endpoint, params, headers)
+            )
+        return await self._stream(endpoint, params, headers)
+
+    async def _stream(self, endpoint, params, headers) -> AsyncItemStream:
+        r = await self._send('GET', endpoint, params, None, headers, stream = True)
+        if r.status_code != 200:
+            await r.aread()
+            await r.aclose()
+            _raise_for_error(r)
+        return AsyncItemStream(r.aiter_bytes(STREAM_CHUNK_SIZE), r.aclose)
+
+    async def _revalidate(self, key, endpoint, params, entry, ttl, headers) -> dict:
+        """
+        > Refreshes a cache entry, conditionally when the stale entry has validators.
+        """
+        cache = self.cache
+        r = await self._send('GET', endpoint, params, None, _with_conditional(headers, cache, entry))
+        if r.status_code == 304 and entry is not None:
+            cache.not_modified(key, entry, ttl)
+            return entry.value
+        result = _handle_response(r, _event(self))
+        cache.set(key, result, ttl, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return result
+
+    async def _revalidate_in_background(self, key, endpoint, params, entry, ttl, headers):
+        try:
+            await self._revalidate(key, endpoint, params, entry, ttl, headers)
+        except Exception:
+            # the stale entry keeps being served, the next request tries again
+            pass
+        finally:
+            self._revalidating.pop(key, None)
+
+    async def _fetch(self, method, endpoint, params, data, headers) -> dict:
+        return _handle_response(await self._send(method, endpoint, params, data, headers), _event(self))
+
+    async def _send(self, method, endpoint, params, data, headers = None, stream = False):
+        """
+        > Sends the request through the rate limiter, retrying throttled responses.
+        """
+        import asyncio
+
+        url = f'{self.base_url}/{self.version}/{endpoint}'
+        if headers is None:
+            headers = self.headers
+        limiter = self.rate_limiter
+        event = _event(self)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                wait = limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            r = await self._request(method, url, params, data, headers, stream, event)
+            if limiter is None:
+                break
+            delay = limiter.retry_delay(attempt, r.status_code, r.headers.get("Retry-After"))
+            if delay is None:
+                limiter.record(r.status_code)
+                break
+            if stream:
+                await r.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        return r
+
+    async def _request(self, method, url, params, data, headers, stream = False, event = None):
+        import asyncio
+
+        request = self.session.build_request(method, url, headers = headers, params = params, data = data)
+        if self.max_concurrency is None:
+            return await self._exchange(request, stream, event)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # a streamed body is read after the slot is released, only the exchange itself is limited
+        async with self._semaphore:
+            return await self._exchange(request, stream, event)
 
+    async def _exchange(self, request, stream, event):
+        if event is None:
+            return await self.session.send(request, stream = stream)
+        # the headers and the body are awaited separately to time them apart
+        timer = HttpxConnectTimer()
+        request.extensions["trace"] = timer
+        start = time.perf_counter()
+        r = await self.session.send(request, stream = True)
+        headers_at = time.perf_counter() - start
+        if not stream:
+            await r.aread()
+        record_exchange(
+            event,
+            r.status_code,
+            headers_at,
+            time.perf_counter() - start,
+            timer.seconds,
+            None if stream else len(r.content),
+            # httpx decodes while reading, decompression stays part of the download phase
+            None if stream else r.num_bytes_downloaded,
+        )
+        return r
@@ -0,0 +1,108 @@
+import threading
+from concurrent.futures import Future
+
+
+# Lets concurrent identical calls share one execution; the first caller runs it, the others wait
+class SingleFlight(object):
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "shared": 0, "max_fan_in": 0}
+
+    def do(self, key: str, fn):
+        """
+        > Runs fn, or waits for the call already running under key and returns its outcome.
+
+        Every caller gets the same result object, which should be treated as read-only.
+
+        Args:
+          key (str): Identity of the call, e.g. a request_key.
+          fn: Callable without arguments.
+
+        Returns:
+          The result of fn. Its exception is raised in every caller that shared it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = Future()
+                call.fan_in = 1
+                self._counters["calls"] += 1
+                leader = True
+            else:
+                _join(self._counters, call)
+                leader = False
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        call.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        """
+        > Returns the fan-in counters.
+
+        Returns:
+          dict: calls actually made, callers that shared another call, the largest fan-in
+            seen and the number of calls in flight.
+        """
+        with self._lock:
+            return _stats(self._counters, self._calls)
+
+
+# Asyncio counterpart of SingleFlight, the shared call runs as a task of its own
+class AsyncSingleFlight(object):
+    def __init__(self):
+        self._calls = {}
+        self._counters = {"calls": 0, "shared": 0, "max_fan_in": 0}
+
+    async def do(self, key: str, fn):
+        """
+        > Awaitable version of SingleFlight.do, fn returns the awaitable to share.
+
+        A caller that is cancelled stops waiting without cancelling the call for the others.
+        """
+        import asyncio
+
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.fan_in = 1
+            self._counters["calls"] += 1
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            _join(self._counters, task)
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # mark the exception as retrieved even when every caller was cancelled
+            task.exception()
+
+    def stats(self) -> dict:
+        """
+        > Returns the fan-in counters, see SingleFlight.stats.
+        """
+        return _stats(self._counters, self._calls)
+
+
+def _join(counters: dict, call):
+    call.fan_in += 1
+    counters["shared"] += 1
+    counters["max_fan_in"] = max(counters["max_fan_in"], call.fan_in)
+
+
+def _stats(counters: dict, calls: dict) -> dict:
+    stats = dict(counters)
+    stats["in_flight"] = len(calls)
+    return stats
@@ -0,0 +1,294 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from .batch import Batch
+from .fields import resolve_fields
+from .modules.user import _user_anime_list_request
+from .paging import iter_pages
+
+# When a user was last synced and the newest list_status.updated_at seen at that point
+SyncState = namedtuple("SyncState", ["high_water", "synced_at"])
+
+
+# Interface of a snapshot store, entries are the dicts returned by iter_user_anime_list
+class SnapshotStore(object):
+    def state(self, username: str) -> SyncState:
+        """
+        > Returns the sync state of a user, or None if the user was never synced.
+        """
+        raise NotImplementedError
+
+    def get(self, username: str, anime_ids) -> dict:
+        """
+        > Returns the stored entries of the given anime IDs, keyed by ID. Missing IDs are left out.
+        """
+        raise NotImplementedError
+
+    def entries(self, username: str) -> dict:
+        """
+        > Returns every stored entry of a user, keyed by anime ID.
+        """
+        raise NotImplementedError
+
+    def apply(self, username: str, upserts: dict, removed, high_water: str):
+        """
+        > Stores new and changed entries, drops removed ones and moves the high-water mark, atomically.
+        """
+        raise NotImplementedError
+
+
+# Keeps snapshots in process memory
+class MemorySnapshotStore(SnapshotStore):
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def state(self, username):
+        with self._lock:
+            user = self._users.get(username)
+            return user[0] if user is not None else None
+
+    def get(self, username, anime_ids):
+        with self._lock:
+            entries = self._users.get(username, (None, {}))[1]
+            return {anime_id: entries[anime_id] for anime_id in anime_ids if anime_id in entries}
+
+    def entries(self, username):
+        with self._lock:
+            return dict(self._users.get(username, (None, {}))[1])
+
+    def apply(self, username, upserts, removed, high_water):
+        with self._lock:
+            entries = self._users.get(username, (None, {}))[1]
+            entries.update(upserts)
+            for anime_id in removed:
+                entries.pop(anime_id, None)
+            self._users[username] = (SyncState(high_water, time.time()), entries)
+
+
+# Keeps snapshots in SQLite, one row per list entry so a sync only writes what changed
+class SQLiteSnapshotStore(SnapshotStore):
+    def __init__(self, path: str = "pymal_sync.sqlite"):
+        """
+        > Opens (and creates if needed) the snapshot database.
+
+        Args:
+          path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_users ("
+            "username TEXT PRIMARY KEY, high_water TEXT, synced_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_entries ("
+            "username TEXT NOT NULL, anime_id INTEGER NOT NULL, entry TEXT NOT NULL, "
+            "PRIMARY KEY (username, anime_id))"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def state(self, username):
+        row = self._connect().execute(
+            "SELECT high_water, synced_at FROM sync_users WHERE username = ?", (username,)
+        ).fetchone()
+        return SyncState(*row) if row is not None else None
+
+    def get(self, username, anime_ids):
+        conn = self._connect()
+        entries = {}
+        for anime_id in anime_ids:
+            row = conn.execute(
+                "SELECT entry FROM sync_entries WHERE username = ? AND anime_id = ?",
+                (username, anime_id),
+            ).fetchone()
+            if row is not None:
+                entries[anime_id] = json.loads(row[0])
+        return entries
+
+    def entries(self, username):
+        rows = self._connect().execute(
+            "SELECT anime_id, entry FROM sync_entries WHERE username = ?", (username,)
+        )
+        return {anime_id: json.loads(entry) for anime_id, entry in rows}
+
+    def apply(self, username, upserts, removed, high_water):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sync_entries (username, anime_id, entry) VALUES (?, ?, ?)",
+                [(username, anime_id, json.dumps(entry)) for anime_id, entry in upserts.items()],
+            )
+            conn.executemany(
+                "DELETE FROM sync_entries WHERE username = ? AND anime_id = ?",
+                [(username, anime_id) for anime_id in removed],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_users (username, high_water, synced_at) VALUES (?, ?, ?)",
+                (username, high_water, time.time()),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+# What changed in a user list since the previous sync
+class ListDiff(object):
+    def __init__(
+        self,
+        username: str,
+        added: list,
+        changed: list,
+        removed: list,
+        high_water: str,
+        full: bool,
+    ):
+        """
+        Args:
+          username (str): The synced user.
+          added (list): Entries that were not in the snapshot.
+          changed (list): (old, new) pairs of entries that differ from the snapshot.
+          removed (list): Snapshot entries missing from the list, only filled in by a full sync.
+          high_water (str): The newest list_status.updated_at now in the snapshot.
+          full (bool): Whether the whole list was walked.
+        """
+        self.username = username
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.high_water = high_water
+        self.full = full
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def __repr__(self):
+        return (
+            f"ListDiff(username={self.username!r}, added={len(self.added)}, "
+            f"changed={len(self.changed)}, removed={len(self.removed)}, full={self.full})"
+        )
+
+
+# Mirrors user anime lists into a SnapshotStore, downloading only what changed since the last sync
+class SyncEngine(object):
+    def __init__(
+        self,
+        client,
+        store: SnapshotStore = None,
+        fields=None,
+        limit: int = 100,
+        stream: bool = False,
+    ):
+        """
+        > Lists are requested sorted by list_updated_at, newest first, and paging stops at the
+        first entry older than the high-water mark of the previous sync. A steady-state sync
+        therefore costs one small page per user, plus one more for every limit changed entries.
+
+        Entries that were deleted from a list don't show up in that ordering, so removals
+        are only detected by a full sync, which walks the whole list. The first sync of a
+        user is always full.
+
+        Args:
+          client (Client): The client used to send the requests.
+          store (SnapshotStore): Where snapshots are kept. Defaults to a MemorySnapshotStore.
+          fields: Anime fields to mirror besides list_status, e.g. ["num_episodes"] or a preset name.
+          limit (int): Page size of incremental syncs, full syncs use the maximum of 1000.
+          stream (bool): Decode pages while they are downloaded (see API.stream).
+        """
+        self.client = client
+        self.store = store if store is not None else MemorySnapshotStore()
+        self.limit = limit
+        self.stream = stream
+        fields = resolve_fields(fields)
+        if fields is None:
+            self.fields = "list_status"
+        elif "list_status" not in fields.split(","):
+            self.fields = f"{fields},list_status"
+        else:
+            self.fields = fields
+
+    def sync(self, username: str = "@me", full: bool = False) -> ListDiff:
+        """
+        > Brings the snapshot of a user up to date and returns what changed.
+
+        Args:
+          username (str): The user to sync. Snapshots are keyed by this name, so prefer real
+            usernames over @me when several tokens share a store.
+          full (bool): Walk the whole list, also detecting removed entries.
+
+        Returns:
+          ListDiff: The added, changed and removed entries.
+        """
+        state = self.store.state(username)
+        full = full or state is None
+        high_water = state.high_water if state is not None else None
+
+        endpoint, params = _user_anime_list_request(
+            username, None, "list_updated_at", 1000 if full else self.limit, 0, self.fields
+        )
+        pages = iter_pages(
+            self.client.api_call, endpoint, params, prefetch=full, stream=self.stream
+        )
+        seen = {}
+        newest = high_water
+        try:
+            for entry in pages:
+                # MAL sends every timestamp in UTC with the same offset, so strings compare in order
+                updated_at = (entry.get("list_status") or {}).get("updated_at")
+                if not full and high_water is not None and updated_at is not None:
+                    if updated_at < high_water:
+                        break
+                seen[entry["id"]] = entry
+                if updated_at is not None and (newest is None or updated_at > newest):
+                    newest = updated_at
+        finally:
+            pages.close()
+
+        previous = self.store.entries(username) if full else self.store.get(username, seen)
+        added = []
+        changed = []
+        upserts = {}
+        for anime_id, entry in seen.items():
+            old = previous.get(anime_id)
+            if old is None:
+                added.append(entry)
+            elif old != entry:
+                changed.append((old, entry))
+            else:
+                continue
+            upserts[anime_id] = entry
+        removed = [old for anime_id, old in previous.items() if anime_id not in seen] if full else []
+
+        self.store.apply(username, upserts, [old["id"] for old in removed], newest)
+        return ListDiff(username, added, changed, removed, newest, full)
+
+    def sync_many(self, usernames, full: bool = False, max_workers: int = 8) -> Batch:
+        """
+        > Syncs many users concurrently.
+
+        Args:
+          usernames: Iterable of usernames.
+          full (bool): Walk every list in full.
+          max_workers (int): Maximum number of users synced at once.
+
+        Returns:
+          Batch: Iterable of (username, ListDiff) pairs, with `errors` filled in while iterating.
+        """
+        return Batch(lambda username: self.sync(username, full), usernames, max_workers)
@@ -0,0 +1,375 @@
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .instrument import time_connections as _time_connections
+from .instrument import trace_connections
+from .jsonstream import STREAM_CHUNK_SIZE, loads
+
+# Encodings offered by default, best first, br only when a brotli module is installed
+DEFAULT_COMPRESSION = ("br", "gzip")
+ENCODINGS = ("br", "gzip", "deflate")
+
+
+# A response whose body is read off the wire undecoded, so its compressed size and the time
+# spent decompressing it can be reported
+class Response(object):
+    __slots__ = (
+        "status_code",
+        "headers",
+        "elapsed",
+        "http_version",
+        "wire_bytes",
+        "decompress_seconds",
+        "_chunks",
+        "_decoder",
+        "_content",
+        "_close",
+    )
+
+    def __init__(self, status_code: int, headers, elapsed: float, chunks, encoding: str, close, http_version: str):
+        """
+        Args:
+          status_code (int): Status of the response.
+          headers: Case-insensitive mapping of the response headers.
+          elapsed (float): Seconds from sending until the headers arrived.
+          chunks: Iterator of the body bytes as received, still encoded.
+          encoding (str): Content-Encoding of the body.
+          close: Releases the connection.
+          http_version (str): Protocol the response came over, e.g. HTTP/2.
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.elapsed = elapsed
+        self.http_version = http_version
+        self.wire_bytes = 0
+        self.decompress_seconds = 0.0
+        self._chunks = chunks
+        self._decoder = _decoder(encoding)
+        self._content = None
+        self._close = close
+
+    def iter_content(self, chunk_size: int = None):
+        """
+        > Yields the decoded body as it is received, chunk_size is only there for requests compatibility.
+        """
+        decoder = self._decoder
+        for chunk in self._chunks:
+            self.wire_bytes += len(chunk)
+            if decoder is None:
+                yield chunk
+                continue
+            start = time.perf_counter()
+            chunk = decoder.decompress(chunk)
+            self.decompress_seconds += time.perf_counter() - start
+            if chunk:
+                yield chunk
+        if decoder is not None:
+            tail = decoder.flush()
+            if tail:
+                yield tail
+
+    def read(self) -> bytes:
+        if self._content is None:
+            self._content = b"".join(self.iter_content())
+        return self._content
+
+    @property
+    def content(self) -> bytes:
+        return self.read()
+
+    @property
+    def text(self) -> str:
+        return self.read().decode("utf-8", "replace")
+
+    def json(self):
+        return loads(self.read())
+
+    def close(self):
+        self._close()
+
+
+# Interface of the HTTP transports API can send its requests through
+class Transport(object):
+    def send(self, method: str, url: str, headers: dict, params: dict, data, timeout, stream: bool) -> Response:
+        """
+        > Sends one request and returns its Response, with the body already read unless stream.
+        """
+        raise NotImplementedError
+
+    def pool_stats(self) -> dict:
+        """
+        > Returns connection statistics, the keys depend on the transport.
+        """
+        return {}
+
+    def time_connections(self):
+        """
+        > Times the connection setup of every request into instrument.connection_timer, API
+        calls it when it has hooks.
+        """
+
+    def close(self):
+        """
+        > Closes every pooled connection.
+        """
+
+
+# HTTP/1.1 through a pooled requests session, one request per connection at a time
+class RequestsTransport(Transport):
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        """
+        Args:
+          pool_connections (int): Number of per-host connection pools to keep.
+          pool_maxsize (int): Maximum number of connections kept open per host.
+          pool_block (bool): Block when the pool is exhausted instead of opening extra connections.
+          keep_alive (bool): Keep connections open between requests.
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
+        """
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers["Accept-Encoding"] = accept_encoding(compression)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def send(self, method, url, headers, params, data, timeout, stream):
+        r = self.session.request(
+            method,
+            url,
+            headers = headers,
+            params = params,
+            data = data,
+            timeout = timeout,
+            stream = True,
+        )
+        response = Response(
+            r.status_code,
+            r.headers,
+            r.elapsed.total_seconds(),
+            r.raw.stream(STREAM_CHUNK_SIZE, decode_content=False),
+            r.headers.get("Content-Encoding"),
+            lambda: _release(r),
+            "HTTP/1.1" if r.raw.version == 11 else "HTTP/1.0",
+        )
+        if not stream:
+            try:
+                response.read()
+            finally:
+                _release(r)
+        return response
+
+    def pool_stats(self) -> dict:
+        """
+        > Returns requests sent, connections opened, reused requests and idle connections,
+        across every host the session talked to.
+        """
+        pools = self.adapter.poolmanager.pools
+        stats = {"requests": 0, "connections": 0, "reused": 0, "idle": 0}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+            if pool.pool is not None:
+                # the pool queue is pre-filled with None placeholders for unopened slots
+                stats["idle"] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        stats["reused"] = max(stats["requests"] - stats["connections"], 0)
+        return stats
+
+    def time_connections(self):
+        _time_connections(self.adapter)
+
+    def close(self):
+        self.session.close()
+
+
+# HTTP/2 through httpx, concurrent requests from any thread are multiplexed as streams over
+# a few connections
+class HTTP2Transport(Transport):
+    def __init__(
+        self,
+        max_connections: int = 4,
+        keepalive_expiry: float = 30.0,
+        http1: bool = True,
+        compression=DEFAULT_COMPRESSION,
+        verify=True,
+    ):
+        """
+        > HTTP/2 is negotiated with TLS ALPN, so plain http:// URLs (e.g. a local fake server)
+        keep using HTTP/1.1 unless http1 is False, which speaks HTTP/2 right away.
+
+        Args:
+          max_connections (int): Maximum number of open connections. Each one carries many
+            requests at once, so a few are enough.
+          keepalive_expiry (float): Seconds an idle connection is kept open.
+          http1 (bool): Fall back to HTTP/1.1 with servers that don't offer HTTP/2.
+          compression: Content encodings to accept, best first (br, gzip, deflate). None asks
+            for uncompressed bodies.
+          verify: TLS verification, False or the path of a CA bundle.
+        """
+        try:
+            import h2  # noqa: F401
+            import httpx
+        except ImportError:
+            raise ImportError("HTTP2Transport requires httpx and h2, install them with `pip install PyMAL[http2]`")
+
+        self._httpx = httpx
+        self.session = httpx.Client(
+            http1=http1,
+            http2=True,
+            verify=verify,
+            headers={"Accept-Encoding": accept_encoding(compression)},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.timed = False
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def send(self, method, url, headers, params, data, timeout, stream):
+        # requests drops None values on its own, httpx would send them as empty strings
+        if params is not None:
+            params = {k: v for k, v in params.items() if v is not None}
+        request = self.session.build_request(
+            method, url, headers = headers, params = params, data = data, timeout = self._timeout(timeout)
+        )
+        if self.timed:
+            request.extensions["trace"] = trace_connections
+        start = time.perf_counter()
+        r = self.session.send(request, stream = True)
+        response = Response(
+            r.status_code,
+            r.headers,
+            time.perf_counter() - start,
+            r.iter_raw(STREAM_CHUNK_SIZE),
+            r.headers.get("Content-Encoding"),
+            r.close,
+            r.http_version,
+        )
+        with self._lock:
+            self._versions[r.http_version] = self._versions.get(r.http_version, 0) + 1
+        if not stream:
+            try:
+                response.read()
+            finally:
+                r.close()
+        return response
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return self._httpx.Timeout(timeout)
+
+    def pool_stats(self) -> dict:
+        """
+        > Returns the requests sent and how many went over each HTTP version.
+        """
+        with self._lock:
+            versions = dict(self._versions)
+        return dict(versions, requests=sum(versions.values()))
+
+    def time_connections(self):
+        self.timed = True
+
+    def close(self):
+        self.session.close()
+
+
+def as_transport(transport, compression=DEFAULT_COMPRESSION, **options) -> Transport:
+    """
+    > Returns the transport argument of API/Client as a Transport.
+
+    Args:
+      transport: None or "requests" for RequestsTransport, "http2" for HTTP2Transport, or a Transport.
+      compression: Content encodings to accept when the transport is created here.
+      options: RequestsTransport pool options.
+    """
+    if isinstance(transport, Transport):
+        return transport
+    if transport is None or transport == "requests":
+        return RequestsTransport(compression=compression, **options)
+    if transport == "http2":
+        return HTTP2Transport(compression=compression)
+    raise ValueError(f"{transport} is not a valid transport, use requests, http2 or a Transport")
+
+
+def _release(r):
+    """
+    > Hands the connection of a requests response back to the pool. Response.close would drop
+    it since the body was read from raw, only a body left half read has to be closed.
+    """
+    if not r.raw.closed:
+        r.raw.close()
+    r.raw.release_conn()
+
+
+def accept_encoding(compression) -> str:
+    """
+    > Returns the Accept-Encoding header offering the given encodings, leaving out br when no
+    brotli module is installed since the body couldn't be decoded.
+    """
+    if not compression:
+        return "identity"
+    if isinstance(compression, str):
+        compression = [name.strip() for name in compression.split(",")]
+    for name in compression:
+        if name not in ENCODINGS:
+            raise ValueError(f"{name} is not a supported encoding, use one of {list(ENCODINGS)}")
+    names = [name for name in compression if name != "br" or _brotli() is not None]
+    return ", ".join(names) if names else "identity"
+
+
+# Decompresses brotli with whichever of brotli or brotlicffi is installed
+class _BrotliDecoder(object):
+    def __init__(self, brotli):
+        decompressor = brotli.Decompressor()
+        self.decompress = getattr(decompressor, "process", None) or decompressor.decompress
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _decoder(encoding: str):
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "br" and _brotli() is not None:
+        return _BrotliDecoder(_brotli())
+    raise ValueError(f"The response is encoded with {encoding}, which can't be decoded")
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        try:
+            import brotlicffi as brotli
+        except ImportError:
+            return None
+    return brotli
@@ -1,7 +1,39 @@
 import json
+import re
 
-def reform_json(data)->list:
+def listing(model=None):
+    """
+    > Returns the transform turning a listing response into dicts or models, passed to
+    api_call.request so instrumented calls time it as their postprocess phase.
+    """
+    return lambda data: reform_json(data, model)
+
+def reform_json(data, model=None)->list:
+    if model is not None:
+        return [model.from_item(item) for item in data['data']]
     list_of_dicts = []
     for item in data['data']:
-        list_of_dicts.append(item['node'])
-    return list_of_dicts
\ No newline at end of file
+        list_of_dicts.append(node_of(item))
+    return list_of_dicts
+
+def node_of(item: dict) -> dict:
+    """
+    > Returns the node of a listing item, with the list_status the API sends next to it attached
+    """
+    if 'list_status' in item:
+        return dict(item['node'], list_status=item['list_status'])
+    return item['node']
+
+_ENDPOINT_TEMPLATES = [
+    (re.compile(r"^users/[^/]+/"), "users/{username}/"),
+    (re.compile(r"^anime/season/\d+/\w+$"), "anime/season/{year}/{season}"),
+    (re.compile(r"^anime/\d+"), "anime/{id}"),
+]
+
+def endpoint_template(endpoint: str) -> str:
+    """
+    > Replaces the variable parts of an endpoint with placeholders, e.g. anime/5114 -> anime/{id}
+    """
+    for pattern, template in _ENDPOINT_TEMPLATES:
+        endpoint = pattern.sub(template, endpoint)
+    return endpoint
@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+
+from .modules.user import LIST_STATUS_FIELDS, _check_list_status
+
+
+# A pending list status write, every caller that was merged into it gets the same outcome
+class _Write(object):
+    __slots__ = ("client", "anime_id", "method", "data", "futures", "deleted", "queued_at")
+
+    def __init__(self, client, anime_id: int, method: str, data: dict, future: Future):
+        self.client = client
+        self.anime_id = anime_id
+        self.method = method
+        self.data = data
+        self.futures = [future]
+        # futures of a delete queued before this update, it is sent first
+        self.deleted = None
+        self.queued_at = time.monotonic()
+
+
+# Write-behind queue for update_user_anime_list / delete_user_anime_list
+class WriteQueue(object):
+    def __init__(
+        self,
+        client,
+        max_batch: int = 50,
+        flush_interval: float = 2.0,
+        max_workers: int = 4,
+    ):
+        """
+        > Writes are held back and merged per (token, anime_id) until they are flushed: the
+        last value of each field wins and a delete cancels the updates queued before it. An
+        update queued after a delete doesn't cancel it, the delete is sent first.
+        Pending writes are sent when max_batch different entries are waiting or when the
+        oldest one has waited flush_interval seconds, whichever comes first.
+
+        Requests go through the client as usual, so they respect its rate limiter and
+        invalidate its cache. Writes to the same entry are never in flight at the same
+        time, so they reach the API in the order they were made.
+
+        Args:
+          client (Client): The client writes are sent with by default.
+          max_batch (int): Number of pending entries that triggers a flush.
+          flush_interval (float): Longest time in seconds a write is held back.
+          max_workers (int): Maximum number of writes in flight.
+        """
+        self.client = client
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        self._counters = {"queued": 0, "coalesced": 0, "sent": 0, "failed": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = threading.Thread(target=self._run, name="pymal-write-queue", daemon=True)
+        self._thread.start()
+
+    def update(
+        self,
+        anime_id: int,
+        status: str = None,
+        is_rewatching: bool = None,
+        score: int = None,
+        num_watched_episodes: int = None,
+        priority: int = None,
+        num_times_rewatched: int = None,
+        rewatch_value: int = None,
+        tags: str = None,
+        comments: str = None,
+        client=None,
+    ) -> Future:
+        """
+        > Queues an update of the given fields, fields left as None are not sent.
+
+        Args:
+          anime_id (int): Anime ID.
+          client (Client): Send with this client (and its token) instead of the queue's.
+          The other arguments are the same as in update_user_anime_list.
+
+        Returns:
+          Future: Resolves to the API response of the write this update ends up in.
+        """
+        data = {
+            "status": status,
+            "is_rewatching": is_rewatching,
+            "score": score,
+            "num_watched_episodes": num_watched_episodes,
+            "priority": priority,
+            "num_times_rewatched": num_times_rewatched,
+            "rewatch_value": rewatch_value,
+            "tags": tags,
+            "comments": comments,
+        }
+        data = {k: v for k, v in data.items() if v is not None}
+        if not data:
+            raise ValueError(f"update needs at least one of {list(LIST_STATUS_FIELDS)}")
+        _check_list_status(data)
+        return self._add(client or self.client, anime_id, "PATCH", data)
+
+    def delete(self, anime_id: int, client=None) -> Future:
+        """
+        > Queues removing an anime from the list, dropping the updates queued for it so far.
+
+        Returns:
+          Future: Resolves to the API response of the delete.
+        """
+        return self._add(client or self.client, anime_id, "DELETE", None)
+
+    def _add(self, client, anime_id: int, method: str, data: dict) -> Future:
+        future = Future()
+        key = (client.api_call.headers.get("Authorization"), anime_id)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed")
+            self._counters["queued"] += 1
+            write = self._pending.get(key)
+            if write is None:
+                self._pending[key] = _Write(client, anime_id, method, data, future)
+            elif method == "PATCH" and write.method == "DELETE":
+                # the entry is re-created with only these fields, so the delete has to go out
+                write.deleted, write.futures = write.futures, [future]
+                write.client = client
+                write.method, write.data = "PATCH", dict(data)
+            else:
+                self._counters["coalesced"] += 1
+                write.futures.append(future)
+                write.client = client
+                if method == "DELETE":
+                    write.futures = (write.deleted or []) + write.futures
+                    write.method, write.data, write.deleted = "DELETE", None, None
+                else:
+                    write.data.update(data)
+            # wake the flusher to start the interval, or right away once the batch is full
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._lock.notify_all()
+        return future
+
+    def flush(self, wait: bool = True):
+        """
+        > Sends every pending write now.
+
+        Args:
+          wait (bool): Block until the flushed writes are done.
+        """
+        with self._lock:
+            writes = list(self._pending.values()) + list(self._in_flight.values())
+            # a delete queued ahead of an update is sent first and has futures of its own
+            futures = [future for write in writes for future in (write.deleted or []) + write.futures]
+            self._flush_requested = True
+            self._lock.notify_all()
+        if wait:
+            wait_futures(futures)
+
+    def close(self):
+        """
+        > Flushes the pending writes, waits for them and stops the queue.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._lock.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self) -> dict:
+        """
+        > Returns the queue counters.
+
+        Returns:
+          dict: queued and coalesced writes, sent and failed requests, and pending entries.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending"] = len(self._pending) + len(self._in_flight)
+            return stats
+
+    def _run(self):
+        with self._lock:
+            while not (self._closed and not self._pending):
+                if not self._pending:
+                    self._lock.wait()
+                    continue
+                oldest = next(iter(self._pending.values())).queued_at
+                delay = oldest + self.flush_interval - time.monotonic()
+                due = self._closed or self._flush_requested or len(self._pending) >= self.max_batch
+                if not due and delay > 0:
+                    self._lock.wait(delay)
+                    continue
+                self._flush_requested = False
+                if not self._dispatch():
+                    # every pending entry still has a write in flight, wait for one to finish
+                    self._lock.wait()
+
+    def _dispatch(self) -> int:
+        sent = 0
+        for key in list(self._pending):
+            if key in self._in_flight:
+                continue
+            write = self._pending.pop(key)
+            self._in_flight[key] = write
+            self._executor.submit(self._send, key, write)
+            sent += 1
+        return sent
+
+    def _send(self, key: tuple, write: _Write):
+        outcomes = []
+        if write.deleted is not None:
+            outcomes.append((write.deleted, self._request(write, "DELETE", None)))
+        outcomes.append((write.futures, self._request(write, write.method, write.data)))
+        with self._lock:
+            del self._in_flight[key]
+            for _, (_, error) in outcomes:
+                self._counters["sent"] += 1
+                if error is not None:
+                    self._counters["failed"] += 1
+            if key in self._pending:
+                self._flush_requested = True
+            self._lock.notify_all()
+        for futures, (result, error) in outcomes:
+            for future in futures:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    @staticmethod
+    def _request(write: _Write, method: str, data: dict) -> tuple:
+        """
+        > Sends one write, returns (result, None) or (None, exception).
+        """
+        try:
+            endpoint = f"anime/{write.anime_id}/my_list_status"
+            return write.client.api_call.request(method, endpoint, data=data), None
+        except Exception as e:
+            return None, e
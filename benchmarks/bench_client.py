@@ -0,0 +1,179 @@
+"""
+Benchmarks the Client methods against the local fake MAL server, without network access.
+
+A fake server (see fake_mal.py) is started in its own process. Every scenario then runs at
+every concurrency level in a fresh worker process, which reports throughput, p50/p99 latency
+per call, peak RSS, and the peak memory traced by tracemalloc over a separate, shorter pass
+(tracing slows allocation down, so it is kept out of the timed run).
+
+    python benchmarks/bench_client.py --concurrency 1,4,16 --calls 200 --latency 0.02
+    python benchmarks/bench_client.py --scenarios details,user_list --json > after.json
+    python benchmarks/bench_client.py --compress-level 6 --compression gzip
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PyMAL import Client  # noqa: E402
+
+SCENARIOS = {
+    "details": lambda client, n: client.get_anime_details(n % 5000 + 1),
+    "search": lambda client, n: client.search_anime("anime", limit=100, offset=n % 50 * 100),
+    "ranking": lambda client, n: client.get_anime_ranking(limit=500, offset=n % 20 * 500),
+    "season": lambda client, n: client.get_seasonal_anime("fall", 1990 + n % 35, limit=500),
+    "user_list": lambda client, n: client.get_user_anime_list(limit=100, offset=n % 10 * 100),
+    "iter_user_list": lambda client, n: sum(1 for _ in client.iter_user_anime_list()),
+    "update": lambda client, n: client.update_user_anime_list(n % 1000 + 1, score=n % 10 + 1),
+}
+TRACED_CALLS = 20
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def run_calls(client, scenario, calls: int, concurrency: int) -> tuple:
+    """
+    > Makes the calls with concurrency threads, returns their latencies and the error count.
+    """
+    call = SCENARIOS[scenario]
+
+    def timed(n):
+        start = time.perf_counter()
+        try:
+            call(client, n)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(calls)))
+    latencies = [latency for latency in results if latency is not None]
+    return latencies, len(results) - len(latencies)
+
+
+def worker(url: str, scenario: str, concurrency: int, calls: int, fields: str, models: bool, compression):
+    client = Client(
+        "benchmark",
+        user_login=False,
+        base_url=url,
+        pool_maxsize=max(concurrency, 10),
+        max_retries=5,
+        fields=fields,
+        models=models,
+        compression=compression,
+    )
+    run_calls(client, scenario, min(calls, 5), 1)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    latencies, errors = run_calls(client, scenario, calls, concurrency)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+    tracemalloc.start()
+    traced_calls = min(calls, TRACED_CALLS)
+    run_calls(client, scenario, traced_calls, concurrency)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(
+        json.dumps(
+            {
+                "scenario": scenario,
+                "concurrency": concurrency,
+                "calls": calls,
+                "errors": errors,
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+                "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+                "peak_rss_kb": peak_rss,
+                "traced_peak_kb": traced_peak / 1024,
+                "traced_peak_kb_per_call": traced_peak / 1024 / traced_calls,
+                "retries": client.rate_limit_stats()["retried"],
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--fields", default="full", help="field preset or comma separated fields")
+    parser.add_argument("--models", action="store_true", help="return typed models")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--synopsis-bytes", type=int, default=200)
+    parser.add_argument("--list-size", type=int, default=1000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--compress-level", type=int, default=0, help="fake server compression level, 0 is off")
+    parser.add_argument("--compression", default="br,gzip", help="encodings the client accepts, none for identity")
+    parser.add_argument("--json", action="store_true", help="print one JSON result per line")
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    fields = args.fields if "," not in args.fields else args.fields.split(",")
+    compression = None if args.compression == "none" else args.compression
+    if args.worker:
+        worker(args.url, args.worker[0], int(args.worker[1]), args.calls, fields, args.models, compression)
+        return
+
+    from fake_mal import spawn
+
+    server = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "synopsis_bytes": args.synopsis_bytes,
+        "list_size": args.list_size,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "compress_level": args.compress_level,
+    }
+    with spawn(**server) as url:
+        if not args.json:
+            print(f"fake server at {url}, {args.calls} calls per run, latency {args.latency * 1000:.0f}ms")
+            print(
+                f"{'scenario':<16}{'threads':>8}{'calls/s':>10}{'p50':>10}{'p99':>10}"
+                f"{'errors':>8}{'retries':>9}{'peak RSS':>11}{'traced/call':>13}"
+            )
+        for scenario in args.scenarios.split(","):
+            for concurrency in args.concurrency.split(","):
+                command = [
+                    sys.executable, __file__, "--url", url, "--calls", str(args.calls),
+                    "--fields", args.fields, "--compression", args.compression,
+                    "--worker", scenario, concurrency,
+                ]
+                if args.models:
+                    command.append("--models")
+                result = json.loads(subprocess.check_output(command))
+                if args.json:
+                    print(json.dumps(result))
+                    continue
+                print(
+                    f"{scenario:<16}{concurrency:>8}{result['throughput']:>10.1f}"
+                    f"{_ms(result['p50_ms']):>10}{_ms(result['p99_ms']):>10}"
+                    f"{result['errors']:>8}{result['retries']:>9}"
+                    f"{result['peak_rss_kb'] / 1024:>9.1f}MiB"
+                    f"{result['traced_peak_kb_per_call']:>11.1f}KiB"
+                )
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value:.1f}ms"
+
+
+if __name__ == "__main__":
+    main()
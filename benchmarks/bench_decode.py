@@ -0,0 +1,134 @@
+"""
+Compares whole-body and streamed decoding of large user anime list pages.
+
+Each mode runs in its own process so peak RSS is not shared between them. The pages are
+written to a temporary file first; the whole-body modes read a page at once like
+`Response.content`, the streamed mode reads it in STREAM_CHUNK_SIZE chunks like
+`Response.iter_content`.
+
+    python benchmarks/bench_decode.py --pages 5 --limit 1000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PyMAL import jsonstream  # noqa: E402
+from PyMAL.jsonstream import STREAM_CHUNK_SIZE, ItemDecoder  # noqa: E402
+from PyMAL.util import node_of, reform_json  # noqa: E402
+
+
+def make_page(offset: int, limit: int) -> bytes:
+    data = []
+    for anime_id in range(offset, offset + limit):
+        data.append(
+            {
+                "node": {
+                    "id": anime_id,
+                    "title": f"Anime {anime_id}",
+                    "main_picture": {
+                        "medium": f"https://cdn.myanimelist.net/images/anime/{anime_id}.jpg",
+                        "large": f"https://cdn.myanimelist.net/images/anime/{anime_id}l.jpg",
+                    },
+                    "alternative_titles": {"synonyms": [], "en": f"Anime {anime_id}", "ja": ""},
+                    "synopsis": "Lorem ipsum dolor sit amet. " * 40,
+                    "mean": 7.5,
+                    "num_episodes": 12,
+                    "media_type": "tv",
+                    "status": "finished_airing",
+                    "genres": [{"id": 1, "name": "Action"}, {"id": 8, "name": "Drama"}],
+                    "start_season": {"year": 2020, "season": "fall"},
+                },
+                "list_status": {
+                    "status": "completed",
+                    "score": 8,
+                    "num_episodes_watched": 12,
+                    "is_rewatching": False,
+                    "updated_at": "2022-09-25T13:46:19+00:00",
+                },
+            }
+        )
+    next_url = f"https://api.myanimelist.net/v2/users/@me/animelist?offset={offset + limit}"
+    return json.dumps({"data": data, "paging": {"next": next_url}}).encode()
+
+
+def run_whole(path: str, pages: int, use_orjson: bool) -> int:
+    if not use_orjson:
+        jsonstream.orjson = None
+    total = 0
+    for _ in range(pages):
+        with open(path, "rb") as file:
+            page = jsonstream.loads(file.read())
+        for node in reform_json(page):
+            total += node["id"]
+    return total
+
+
+def run_stream(path: str, pages: int) -> int:
+    total = 0
+    for _ in range(pages):
+        decoder = ItemDecoder()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(STREAM_CHUNK_SIZE), b""):
+                for item in decoder.feed(chunk):
+                    total += node_of(item)["id"]
+        for item in decoder.close():
+            total += node_of(item)["id"]
+    return total
+
+
+def worker(mode: str, path: str, pages: int):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "stream":
+        run_stream(path, pages)
+    else:
+        run_whole(path, pages, mode == "orjson")
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print(json.dumps({"seconds": elapsed, "peak_rss_kb": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.pages)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as file:
+        file.write(make_page(0, args.limit))
+        path = file.name
+    try:
+        size = os.path.getsize(path)
+        print(f"{args.pages} pages of {args.limit} entries, {size / 1024 / 1024:.1f} MiB each")
+        print(f"{'mode':<22}{'parse time':>12}{'peak RSS':>14}")
+        modes = ["json", "stream"]
+        if jsonstream.orjson is not None:
+            modes.insert(1, "orjson")
+        for mode in modes:
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--pages", str(args.pages), "--worker", mode, path]
+            )
+            result = json.loads(output)
+            label = {"json": "json (whole body)", "orjson": "orjson (whole body)"}.get(mode, mode)
+            print(
+                f"{label:<22}{result['seconds'] * 1000:>10.1f}ms"
+                f"{result['peak_rss_kb'] / 1024:>11.1f}MiB"
+            )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures the import time of PyMAL with `python -X importtime`.
+
+Every run imports the package in a fresh interpreter. The median cumulative time of each
+module is reported, slowest first. The script exits with status 1 when a module that should
+only be loaded on demand (Flask, asyncio, httpx, ...) is imported, or when the median import
+of the package exceeds --budget milliseconds, so it can guard against regressions in CI.
+
+    python benchmarks/bench_import.py --runs 10 --top 15 --budget 250
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Only needed by the web login flow, asyncio clients, columnar exports, recommendations or optional speedups
+LAZY_MODULES = ("flask", "werkzeug", "jinja2", "asyncio", "httpx", "numpy", "pyarrow", "scipy")
+
+
+def import_times(statement: str) -> dict:
+    """
+    > Runs the statement in a fresh interpreter and returns the cumulative import time of every
+    module it loaded, in microseconds.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        env=env,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--statement", default="import PyMAL")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=None, help="maximum median import time in ms")
+    args = parser.parse_args()
+
+    runs = [import_times(args.statement) for _ in range(args.runs)]
+    modules = set().union(*runs)
+    medians = {name: statistics.median(run.get(name, 0) for run in runs) for name in modules}
+    total = medians.get("PyMAL", 0) / 1000
+
+    print(f"`{args.statement}`, median of {args.runs} runs: {total:.1f}ms")
+    print(f"{'module':<40}{'cumulative':>12}")
+    for name, micros in sorted(medians.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{name:<40}{micros / 1000:>10.1f}ms")
+
+    failed = False
+    loaded = sorted({name.split(".")[0] for name in modules} & set(LAZY_MODULES))
+    if loaded:
+        print(f"\nimported eagerly but should be lazy: {', '.join(loaded)}")
+        failed = True
+    if args.budget is not None and total > args.budget:
+        print(f"\nover budget: {total:.1f}ms > {args.budget:.1f}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+Local stand-in for the MAL v2 API, for tests and benchmarks without network access.
+
+Serves synthetic (or recorded) data for anime search and details, anime/ranking,
+anime/season, users/{name}/animelist and anime/{id}/my_list_status, with MAL's paging
+format. Latency, payload size, page size limits, gzip/brotli compression and 429/5xx
+errors can be configured. GET responses carry ETag and Last-Modified validators and
+conditional requests that still match are answered 304 Not Modified without a body. It
+doesn't check credentials, any Authorization or X-MAL-CLIENT-ID header is accepted.
+
+    python benchmarks/fake_mal.py --port 8080 --latency 0.05 --error-rate 0.01
+
+Point a client at it with Client(..., user_login=False, base_url="http://127.0.0.1:8080").
+Recorded responses can be dropped into --fixtures as <endpoint>.json, e.g.
+anime/ranking.json or anime/50709.json; their data list is paged like the synthetic one.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Largest page each listing endpoint returns, like the real API
+MAX_LIMITS = {"search": 100, "ranking": 500, "season": 500, "animelist": 1000}
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Sci-Fi", "Slice of Life"]
+STUDIOS = ["Bones", "Madhouse", "Sunrise", "Kyoto Animation", "Production I.G", "A-1 Pictures"]
+SEASONS = ["winter", "spring", "summer", "fall"]
+DEFAULT_FIELDS = ("id", "title", "main_picture")
+
+
+# The synthetic MAL: a catalog of catalog_size anime and one user list of list_size entries
+class FakeMAL(object):
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        catalog_size: int = 10000,
+        list_size: int = 1000,
+        synopsis_bytes: int = 200,
+        max_limit: int = None,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 0.0,
+        fixtures: str = None,
+        seed: int = 0,
+        compress_level: int = 0,
+    ):
+        """
+        Args:
+          host (str): The host to bind.
+          port (int): The port to bind, 0 picks a free one (see url).
+          latency (float): Seconds every response is delayed by.
+          jitter (float): Up to this many seconds are added to the latency at random.
+          catalog_size (int): Number of anime, IDs run from 1 to catalog_size.
+          list_size (int): Number of entries in the user list.
+          synopsis_bytes (int): Length of every synopsis, the main knob for payload size.
+          max_limit (int): Cap page sizes below the real API maximums.
+          error_rate (float): Share of requests answered with a random 500/502/503.
+          throttle_rate (float): Share of requests answered with 429.
+          retry_after (float): Retry-After sent with the 429s, 0 sends none.
+          fixtures (str): Directory of recorded responses that take precedence over synthetic data.
+          seed (int): Seed of the error injection and jitter.
+          compress_level (int): Compress bodies with the best of br and gzip the client accepts,
+            at this level (1-9). 0 always sends them uncompressed.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.catalog_size = catalog_size
+        self.list_size = list_size
+        sentence = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+        self.synopsis = (sentence * (synopsis_bytes // len(sentence) + 1))[:synopsis_bytes]
+        self.max_limit = max_limit
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.fixtures = fixtures
+        self.compress_level = compress_level
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._list_status = {}
+        self._deleted = set()
+        # Last-Modified of every response, moved forward by list writes
+        self._modified = int(time.time())
+        self._counters = {"requests": 0, "throttled": 0, "errors": 0, "not_modified": 0, "bytes": 0}
+        self._endpoints = {}
+        self.server = ThreadingHTTPServer((host, port), _handler(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        > Serves in a background thread of this process.
+        """
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="fake-mal", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> dict:
+        """
+        > Returns the request, injected error, 304 and response byte counters, plus requests per endpoint.
+        """
+        with self._lock:
+            return dict(self._counters, endpoints=dict(self._endpoints))
+
+    def anime(self, anime_id: int, fields=None) -> dict:
+        """
+        > Returns the synthetic anime node of an ID, limited to the requested fields.
+        """
+        year = 1990 + anime_id % 35
+        node = {
+            "id": anime_id,
+            "title": f"Anime {anime_id}",
+            "main_picture": {
+                "medium": f"https://cdn.myanimelist.net/images/anime/{anime_id}.jpg",
+                "large": f"https://cdn.myanimelist.net/images/anime/{anime_id}l.jpg",
+            },
+            "alternative_titles": {"synonyms": [], "en": f"Anime {anime_id}", "ja": ""},
+            "start_date": f"{year}-04-01",
+            "synopsis": self.synopsis,
+            "mean": round(5 + (anime_id * 7919 % 500) / 100, 2),
+            "rank": anime_id,
+            "popularity": (anime_id * 31) % self.catalog_size + 1,
+            "num_list_users": 1000000 // anime_id,
+            "num_scoring_users": 500000 // anime_id,
+            "nsfw": "white",
+            "media_type": "tv" if anime_id % 5 else "movie",
+            "status": "finished_airing",
+            "genres": [
+                {"id": n + 1, "name": GENRES[n]} for n in (anime_id % 8, (anime_id + 3) % 8)
+            ],
+            "num_episodes": 12 + anime_id % 14,
+            "start_season": {"year": year, "season": SEASONS[anime_id % 4]},
+            "source": "manga",
+            "average_episode_duration": 1440,
+            "rating": "pg_13",
+            "studios": [{"id": anime_id % 6 + 1, "name": STUDIOS[anime_id % 6]}],
+            "updated_at": "2022-09-25T13:46:19+00:00",
+        }
+        if fields is None:
+            return {key: node[key] for key in DEFAULT_FIELDS}
+        wanted = set(fields) | set(DEFAULT_FIELDS)
+        return {key: value for key, value in node.items() if key in wanted}
+
+    def list_status(self, anime_id: int) -> dict:
+        status = self._list_status.get(anime_id)
+        if status is None:
+            status = {
+                "status": "completed",
+                "score": anime_id % 10 + 1,
+                "num_episodes_watched": 12,
+                "is_rewatching": False,
+                # newest first for the default list_updated_at ordering
+                "updated_at": time.strftime(
+                    "%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(1660000000 - anime_id * 60)
+                ),
+            }
+        return status
+
+    def respond(self, method: str, path: str, query: dict, form: dict) -> tuple:
+        """
+        > Returns the (status, headers, body) of a request, after the configured delay and errors.
+        """
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self._counters["requests"] += 1
+            endpoint = re.sub(r"/\d+", "/{id}", path.split("/v2/", 1)[-1])
+            self._endpoints[endpoint] = self._endpoints.get(endpoint, 0) + 1
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self._counters["throttled"] += 1
+                headers = {"Retry-After": str(self.retry_after)} if self.retry_after else {}
+                return 429, headers, {"error": "too_many_requests"}
+            if roll < self.throttle_rate + self.error_rate:
+                self._counters["errors"] += 1
+                return self._random.choice((500, 502, 503)), {}, {"error": "internal_server_error"}
+        return self.route(method, path, query, form)
+
+    def route(self, method: str, path: str, query: dict, form: dict) -> tuple:
+        endpoint = path.split("/v2/", 1)[-1].strip("/")
+        fields = [field for field in query.get("fields", "").split(",") if field] or None
+        fixture = self._fixture(endpoint)
+        if fixture is not None and method == "GET":
+            if isinstance(fixture.get("data"), list):
+                data = fixture["data"]
+                return 200, {}, self._page(endpoint, query, data, len(data), None)
+            return 200, {}, fixture
+
+        match = re.fullmatch(r"anime/(\d+)/my_list_status", endpoint)
+        if match:
+            anime_id = int(match.group(1))
+            with self._lock:
+                if method == "DELETE":
+                    if anime_id in self._deleted or anime_id > self.list_size:
+                        return 404, {}, {"error": "not_found"}
+                    self._deleted.add(anime_id)
+                    self._modified = max(self._modified + 1, int(time.time()))
+                    return 200, {}, []
+                if method in ("PATCH", "PUT"):
+                    status = dict(self.list_status(anime_id), **_list_status_form(form))
+                    status["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+                    self._list_status[anime_id] = status
+                    self._deleted.discard(anime_id)
+                    self._modified = max(self._modified + 1, int(time.time()))
+                    return 200, {}, status
+        if method != "GET":
+            return 405, {}, {"error": "method_not_allowed"}
+
+        def node(anime_id):
+            return {"node": self.anime(anime_id, fields)}
+
+        if endpoint == "users/@me":
+            return 200, {}, {"id": 1, "name": "fake_user", "joined_at": "2020-01-01T00:00:00+00:00"}
+        match = re.fullmatch(r"users/[^/]+/animelist", endpoint)
+        if match:
+            with self._lock:
+                ids = [n for n in range(1, self.list_size + 1) if n not in self._deleted]
+                if query.get("sort", "list_updated_at") == "list_updated_at":
+                    ids.sort(key=lambda n: self.list_status(n)["updated_at"], reverse=True)
+                statuses = {n: self.list_status(n) for n in ids}
+            with_status = fields is not None and "list_status" in fields
+
+            def entry(anime_id):
+                item = {"node": self.anime(anime_id, fields)}
+                if with_status:
+                    item["list_status"] = statuses[anime_id]
+                return item
+
+            return 200, {}, self._page(endpoint, query, ids, len(ids), "animelist", entry)
+        if endpoint == "anime":
+            query_text = query.get("q", "")
+            if len(query_text) < 3:
+                return 400, {}, {"error": "invalid_content", "message": "q is too short"}
+            ids = range(1, self.catalog_size + 1)
+            return 200, {}, self._page(endpoint, query, ids, len(ids), "search", node)
+        if endpoint == "anime/ranking":
+            ids = range(1, self.catalog_size + 1)
+            return 200, {}, self._page(
+                endpoint, query, ids, len(ids), "ranking",
+                lambda n: {"node": self.anime(n, fields), "ranking": {"rank": n}},
+            )
+        match = re.fullmatch(r"anime/season/(\d+)/(\w+)", endpoint)
+        if match:
+            year, season = int(match.group(1)), match.group(2)
+            if season not in SEASONS:
+                return 400, {}, {"error": "invalid_parameters"}
+            ids = [
+                n for n in range(1, self.catalog_size + 1)
+                if 1990 + n % 35 == year and SEASONS[n % 4] == season
+            ]
+            body = self._page(endpoint, query, ids, len(ids), "season", node)
+            body["season"] = {"year": year, "season": season}
+            return 200, {}, body
+        if endpoint == "anime/suggestions":
+            ids = range(1, self.catalog_size + 1)
+            return 200, {}, self._page(endpoint, query, ids, len(ids), "search", node)
+        match = re.fullmatch(r"anime/(\d+)", endpoint)
+        if match:
+            anime_id = int(match.group(1))
+            if not 1 <= anime_id <= self.catalog_size:
+                return 404, {}, {"error": "not_found"}
+            return 200, {}, self.anime(anime_id, fields)
+        return 404, {}, {"error": "not_found"}
+
+    def _page(self, endpoint, query, items, total, kind, build=None) -> dict:
+        cap = MAX_LIMITS.get(kind, 1000)
+        limit = min(int(query.get("limit", 100)), cap, self.max_limit or cap)
+        offset = int(query.get("offset", 0))
+        data = [build(item) if build else item for item in items[offset:offset + limit]]
+        url = f"{self.url}/v2/{endpoint}?"
+        paging = {}
+        if offset + limit < total:
+            paging["next"] = url + urlencode(dict(query, offset=offset + limit, limit=limit))
+        if offset > 0:
+            paging["previous"] = url + urlencode(dict(query, offset=max(offset - limit, 0), limit=limit))
+        return {"data": data, "paging": paging}
+
+    def _fixture(self, endpoint: str) -> dict:
+        if self.fixtures is None:
+            return None
+        path = os.path.join(self.fixtures, *endpoint.split("/")) + ".json"
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+
+def _list_status_form(form: dict) -> dict:
+    status = {}
+    for key, value in form.items():
+        if key in ("score", "num_watched_episodes", "priority", "num_times_rewatched", "rewatch_value"):
+            value = int(value)
+        elif key == "is_rewatching":
+            value = value.lower() == "true"
+        status["num_episodes_watched" if key == "num_watched_episodes" else key] = value
+    return status
+
+
+def _handler(fake: FakeMAL):
+    # HTTP/1.1 keeps connections alive, so clients can pool them like they do against the real API
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # headers and body go out in separate writes, don't let Nagle hold the body back
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, format, *args):
+            pass
+
+        def handle_method(self):
+            parts = urlsplit(self.path)
+            query = dict(parse_qsl(parts.query))
+            length = int(self.headers.get("Content-Length") or 0)
+            form = dict(parse_qsl(self.rfile.read(length).decode())) if length else {}
+            if parts.path == "/_stats":
+                status, headers, body = 200, {}, fake.stats()
+            else:
+                status, headers, body = fake.respond(self.command, parts.path, query, form)
+            payload = json.dumps(body).encode()
+            if self.command == "GET" and status == 200:
+                headers = dict(headers)
+                headers["ETag"] = '"%s"' % hashlib.sha1(payload).hexdigest()[:16]
+                headers["Last-Modified"] = formatdate(fake._modified, usegmt=True)
+                if _not_modified(self.headers, headers["ETag"], fake._modified):
+                    with fake._lock:
+                        fake._counters["not_modified"] += 1
+                    status, payload = 304, b""
+            encoding = _encoding(self.headers.get("Accept-Encoding", "")) if fake.compress_level else None
+            if encoding is not None and payload:
+                payload = _compress(payload, encoding, fake.compress_level)
+            with fake._lock:
+                fake._counters["bytes"] += len(payload)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            if encoding is not None and payload:
+                self.send_header("Content-Encoding", encoding)
+            if status != 304:
+                self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_PATCH = do_PUT = do_DELETE = do_POST = handle_method
+
+    return Handler
+
+
+def _not_modified(request_headers, etag: str, modified: int) -> bool:
+    """
+    > Checks the conditional headers of a request, If-None-Match taking precedence over If-Modified-Since.
+    """
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since is None:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since).timestamp() >= modified
+    except (TypeError, ValueError):
+        return False
+
+
+def _encoding(accept: str):
+    """
+    > Picks br over gzip from an Accept-Encoding header, br only when brotli is installed.
+    """
+    offered = {name.split(";")[0].strip() for name in accept.split(",")}
+    if "br" in offered:
+        try:
+            import brotli  # noqa: F401
+
+            return "br"
+        except ImportError:
+            pass
+    return "gzip" if "gzip" in offered else None
+
+
+def _compress(payload: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        import brotli
+
+        return brotli.compress(payload, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+@contextmanager
+def spawn(**options):
+    """
+    > Runs a FakeMAL in a subprocess, so serving doesn't compete with the client for the GIL.
+
+    Args:
+      options: FakeMAL arguments, e.g. latency=0.05.
+
+    Yields:
+      str: The base URL of the server.
+    """
+    args = [sys.executable, os.path.abspath(__file__), "--port", "0"]
+    for name, value in options.items():
+        if value is not None:
+            args += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        yield process.stdout.readline().strip()
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--catalog-size", type=int, default=10000)
+    parser.add_argument("--list-size", type=int, default=1000)
+    parser.add_argument("--synopsis-bytes", type=int, default=200)
+    parser.add_argument("--max-limit", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    parser.add_argument("--fixtures", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compress-level", type=int, default=0)
+    args = vars(parser.parse_args())
+    fake = FakeMAL(**args)
+    # the first line is the URL, spawn() reads it to learn the port
+    print(fake.url, flush=True)
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
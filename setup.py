@@ -16,8 +16,17 @@ setuptools.setup(
     include_package_data=True,
     install_requires=[
         "requests",
-        "flask",
     ],
+    extras_require={
+        "arrow": ["pyarrow"],
+        "async": ["httpx"],
+        "brotli": ["brotli"],
+        "fast": ["orjson"],
+        "http2": ["httpx[http2]"],
+        "numpy": ["numpy"],
+        "recommend": ["numpy", "scipy"],
+        "web": ["flask"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
@@ -1,6 +1,26 @@
+import asyncio
+import json
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import unittest
-from mal.client import Client
+from unittest import mock
+from mal.client import Client, AsyncClient
+from mal.models import AnimeNode
+from mal.sync import SyncEngine
+from mal.catalog import Catalog
+from mal.writequeue import WriteQueue
+from mal.pool import ClientPool
+from mal.instrument import Metrics, current_event
+from mal.crawl import Crawler
+from mal.analytics import ListAnalytics
+from mal.recommend import Recommender
 from mal.auth import Auth
+from mal.batch import Batch
+from mal.cache import ResponseCache
+from mal.ratelimit import RateLimiter
+from benchmarks.fake_mal import FakeMAL
 import os
 
 MAL_CLIENT_ID = os.environ["MAL_CLIENT_ID"]
@@ -26,6 +46,18 @@ class TestClient(unittest.TestCase):
         token = auth.get_token_web()
         self.assertTrue(token)
     
+    def test_get_token_web_async(self):
+        auth = Auth(
+            client_id=MAL_CLIENT_ID,
+            client_secret=MAL_CLIENT_SECRET,
+            host=MAL_HOST,
+            port=MAL_PORT,
+            callback_url=MAL_CALLBACK_URL,
+            store_token=False,
+        )
+        token = asyncio.run(auth.get_token_web_async())
+        self.assertTrue(token)
+
     def test_get_token_user_input(self):
         auth = Auth(
             client_id=MAL_CLIENT_ID,
@@ -48,16 +80,81 @@ class TestClient(unittest.TestCase):
         anime = client.search_anime(TEST_ANIME_TITLE)
         self.assertEqual(type(anime), list)
         
+    def test_search_anime_local(self):
+        catalog = Catalog("test_catalog.sqlite")
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH, catalog=catalog)
+        catalog.crawl_ranking(client, max_items=100)
+        title = client.get_anime_ranking(limit=1)[0]["title"]
+        anime = client.search_anime(title, source="local")
+        self.assertEqual(anime[0]["title"], title)
+
     def test_get_anime_details(self):
         client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
         anime = client.get_anime_details(TEST_ANIME_ID)
         self.assertEqual(type(anime), dict)
     
+    def test_get_anime_details_many(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        batch = client.get_anime_details_many([TEST_ANIME_ID, TEST_ANIME_ID, 0], ordered=True)
+        anime = dict(batch)
+        self.assertEqual(list(anime), [TEST_ANIME_ID])
+        self.assertIn(0, batch.errors)
+
+    def test_get_anime_details_fields(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        anime = client.get_anime_details(TEST_ANIME_ID, fields="minimal")
+        self.assertNotIn("related_anime", anime)
+
+    def test_get_anime_ranking_models(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH, models=True)
+        anime = client.get_anime_ranking()
+        self.assertEqual(type(anime[0]), AnimeNode)
+
+    def test_export_anime_ranking(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        columns = client.export_anime_ranking(max_items=20, fields="list")
+        table = columns.to_arrow()
+        self.assertEqual(table.num_rows, 20)
+        self.assertIn("start_season_year", table.column_names)
+        self.assertEqual(len(columns.to_numpy()["ranking"]), 20)
+
+    def test_single_flight(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        with ThreadPoolExecutor(8) as executor:
+            anime = list(executor.map(lambda _: client.get_anime_details(TEST_ANIME_ID), range(8)))
+        self.assertEqual(len({a["id"] for a in anime}), 1)
+        self.assertLessEqual(client.single_flight_stats()["calls"], 8)
+
+    def test_metrics(self):
+        metrics = Metrics()
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH, hooks=metrics)
+        client.get_anime_details(TEST_ANIME_ID)
+        client.get_anime_ranking(limit=5)
+        timings = metrics.snapshot()["timings"]
+        self.assertIn(("anime/{id}", "ttfb"), timings)
+        self.assertIn(("anime/ranking", "postprocess"), timings)
+        self.assertIn('endpoint="anime/{id}"', metrics.to_prometheus())
+
+    def test_http2_transport(self):
+        metrics = Metrics()
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH, hooks=metrics, transport="http2")
+        with ThreadPoolExecutor(8) as executor:
+            anime = list(executor.map(lambda offset: client.get_anime_ranking(limit=10, offset=offset), range(0, 80, 10)))
+        self.assertEqual(len(anime), 8)
+        self.assertEqual(client.pool_stats()["requests"], 8)
+        snapshot = metrics.snapshot()
+        self.assertLess(snapshot["wire_bytes"]["anime/ranking"], snapshot["response_bytes"]["anime/ranking"])
+
     def test_get_anime_ranking(self):
         client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
         anime = client.get_anime_ranking()
         self.assertEqual(type(anime), list)
     
+    def test_iter_anime_ranking(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        anime = list(client.iter_anime_ranking(limit=10, max_items=25))
+        self.assertEqual(len(anime), 25)
+
     def test_get_seasonal_anime(self):
         client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
         anime = client.get_seasonal_anime()
@@ -73,16 +170,326 @@ class TestClient(unittest.TestCase):
         anime = client.get_user_anime_list()
         self.assertEqual(type(anime), list)
     
+    def test_iter_user_anime_list(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        anime = list(client.iter_user_anime_list(limit=5, max_items=12))
+        self.assertLessEqual(len(anime), 12)
+
+    def test_iter_user_anime_list_stream(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        anime = list(client.iter_user_anime_list(limit=5, max_items=12, stream=True))
+        self.assertEqual(anime, list(client.iter_user_anime_list(limit=5, max_items=12)))
+
+    def test_list_analytics(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        analytics = ListAnalytics.fetch(client, ["@me"])
+        summary = analytics.summary("@me")
+        self.assertEqual(sum(summary["score_histogram"]), summary["entries"])
+        self.assertEqual(analytics.watch_time().shape, (1,))
+
+    def test_recommender(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        recommender = Recommender(k=10)
+        self.assertEqual(recommender.fetch(client, ["@me"]), {})
+        seen = {entry["id"] for entry in client.iter_user_anime_list(fields="list_status")}
+        for anime_id, score in recommender.suggest("@me"):
+            self.assertNotIn(anime_id, seen)
+
+    def test_sync_user_anime_list(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        engine = SyncEngine(client)
+        first = engine.sync()
+        self.assertTrue(first.full)
+        self.assertEqual(len(engine.sync()), 0)
+
     def test_update_user_anime_list(self):
         client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
         anime = client.update_user_anime_list(17619, status="completed")
         self.assertEqual(type(anime), dict)
     
+    def test_write_queue(self):
+        client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
+        with WriteQueue(client) as queue:
+            first = queue.update(17619, status="watching", num_watched_episodes=1)
+            last = queue.update(17619, num_watched_episodes=2)
+        self.assertEqual(first.result(), last.result())
+        self.assertEqual(queue.stats()["sent"], 1)
+
+    def test_client_pool(self):
+        with open(MAL_TOKEN_PATH) as file:
+            token = json.load(file)
+        with ClientPool([(MAL_CLIENT_ID, MAL_CLIENT_SECRET)], tokens={"test": token}) as pool:
+            user = pool.client("test").get_user()
+            anime = pool.client().get_anime_details(TEST_ANIME_ID)
+        self.assertEqual(type(user), dict)
+        self.assertEqual(anime["id"], TEST_ANIME_ID)
+
+    def test_crawl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            out = os.path.join(directory, "ranking.jsonl")
+            crawler = Crawler("ranking", out, MAL_CLIENT_ID, processes=2, max_items=1000)
+            stats = crawler.run()
+            self.assertEqual(crawler.run()["shards"], 0)
+            with open(out) as file:
+                anime = [json.loads(line) for line in file]
+        self.assertEqual(stats["items"], len(anime))
+        self.assertEqual(len(anime), len({node["id"] for node in anime}))
+
     def test_delete_user_anime_list(self):
         client = Client(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH)
         anime = client.delete_user_anime_list(17619)
         print(type(anime))
         self.assertEqual(type(anime), list)
 
+
+class TestBatch(unittest.TestCase):
+    def test_dict_with_failed_key(self):
+        def fetch(anime_id):
+            if anime_id == 0:
+                raise ValueError("not found")
+            return {"id": anime_id}
+        batch = Batch(fetch, [1, 5, 0, 5], ordered=True)
+        self.assertEqual(dict(batch), {1: {"id": 1}, 5: {"id": 5}})
+        self.assertIn(0, batch.errors)
+        self.assertEqual((batch.succeeded, batch.failed), (2, 1))
+
+
+class TestFakeMAL(unittest.TestCase):
+    def test_list_analytics_fetch(self):
+        with FakeMAL(list_size=300) as fake:
+            client = Client("fake", user_login=False, base_url=fake.url)
+            analytics = ListAnalytics.fetch(client, ["alice", "bob"])
+        self.assertEqual(analytics.usernames, ["alice", "bob"])
+        self.assertEqual(analytics.errors, {})
+        self.assertEqual(analytics.summary("alice")["entries"], 300)
+        self.assertEqual(analytics.score_histograms().sum(), 600)
+
+    def test_list_analytics_without_entries(self):
+        with FakeMAL(list_size=0) as fake:
+            client = Client("fake", user_login=False, base_url=fake.url)
+            analytics = ListAnalytics.fetch(client, ["alice", "bob"])
+        self.assertEqual(analytics.usernames, ["alice", "bob"])
+        self.assertEqual(analytics.summary("alice")["entries"], 0)
+        self.assertEqual(analytics.watch_time().tolist(), [0.0, 0.0])
+
+        class Private(object):
+            def export_user_anime_list(self, username, fields=None):
+                raise ValueError("private list")
+        analytics = ListAnalytics.fetch(Private(), ["alice", "bob"])
+        self.assertEqual(len(analytics), 0)
+        self.assertEqual(sorted(analytics.errors), ["alice", "bob"])
+        self.assertEqual(analytics.score_histograms().shape, (0, 11))
+
+    def test_rate_limiter_retries(self):
+        limiter = RateLimiter(max_retries=10, backoff_base=0.01)
+        with FakeMAL(throttle_rate=0.2, error_rate=0.1, retry_after=0.01) as fake:
+            client = Client("fake", user_login=False, base_url=fake.url, rate_limiter=limiter)
+            for anime_id in range(1, 31):
+                self.assertEqual(client.get_anime_details(anime_id, fields=["title"])["id"], anime_id)
+            injected = fake.stats()
+        stats = client.rate_limit_stats()
+        self.assertEqual(stats["retried"], injected["throttled"] + injected["errors"])
+        self.assertGreater(stats["retried"], 0)
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(stats["paced"], 0)
+
+    def test_cache_revalidates_with_304(self):
+        cache = ResponseCache(ttl={"anime/{id}": 0.05})
+        with FakeMAL() as fake:
+            client = Client("fake", user_login=False, base_url=fake.url, cache=cache)
+            details = client.get_anime_details(1)
+            downloaded = fake.stats()["bytes"]
+            time.sleep(0.1)
+            self.assertEqual(client.get_anime_details(1), details)
+            # the 304 made the entry fresh again
+            self.assertEqual(client.get_anime_details(1), details)
+            served = fake.stats()
+        self.assertEqual((served["requests"], served["not_modified"]), (2, 1))
+        # and came without a body
+        self.assertEqual(served["bytes"], downloaded)
+        self.assertEqual(cache.stats()["revalidated"], 1)
+
+    def test_cache_stale_while_revalidate(self):
+        cache = ResponseCache(ttl={"anime/{id}": 0.05}, stale_while_revalidate=True)
+        with FakeMAL(latency=0.2) as fake:
+            client = Client("fake", user_login=False, base_url=fake.url, cache=cache)
+            details = client.get_anime_details(1)
+            time.sleep(0.1)
+            start = time.perf_counter()
+            stale = [client.get_anime_details(1) for _ in range(5)]
+            self.assertLess(time.perf_counter() - start, 0.1)
+            self.assertEqual(stale, [details] * 5)
+            deadline = time.monotonic() + 5
+            while cache.stats()["revalidated"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(client.get_anime_details(1), details)
+            served = fake.stats()
+        self.assertEqual((served["requests"], served["not_modified"]), (2, 1))
+        self.assertEqual(cache.stats()["revalidated"], 1)
+
+    def test_parallel_paging_matches_sequential(self):
+        with FakeMAL(catalog_size=1234, list_size=1234) as fake:
+            client = Client("fake", user_login=False, base_url=fake.url)
+            # 13 pages of 100, the last one partial
+            for max_items in (None, 250, 1200, 5000):
+                sequential = list(client.iter_anime_ranking(limit=100, max_items=max_items))
+                parallel = list(client.iter_anime_ranking(limit=100, max_items=max_items, max_in_flight=4))
+                self.assertEqual(parallel, sequential)
+                self.assertEqual(len(parallel), min(max_items or 1234, 1234))
+            sequential = list(client.iter_user_anime_list("alice", limit=100, fields=["list_status"]))
+            parallel = list(client.iter_user_anime_list("alice", limit=100, max_in_flight=3, fields=["list_status"]))
+            self.assertEqual(parallel, sequential)
+            self.assertEqual(len(parallel), 1234)
+
+            async def run():
+                client = AsyncClient("fake", user_login=False, base_url=fake.url)
+                try:
+                    return [
+                        [item async for item in client.iter_anime_ranking(limit=100, max_items=1200, max_in_flight=n)]
+                        for n in (1, 4)
+                    ]
+                finally:
+                    await client.close()
+
+            sequential, parallel = asyncio.run(run())
+            self.assertEqual(parallel, sequential)
+            self.assertEqual(len(parallel), 1200)
+
+    def test_metrics_event_is_reset(self):
+        metrics = Metrics()
+        with FakeMAL() as fake:
+            client = Client("fake", user_login=False, base_url=fake.url, hooks=metrics)
+            client.get_anime_details(1)
+            self.assertIsNone(current_event.get())
+            Client("fake", user_login=False, base_url=fake.url).get_anime_ranking(limit=5)
+            client.get_anime_ranking(limit=5)
+        timings = metrics.snapshot()["timings"]
+        self.assertNotIn(("anime/{id}", "postprocess"), timings)
+        self.assertEqual(timings[("anime/ranking", "postprocess")][0], 1)
+
+    def test_write_queue_delete_then_update(self):
+        with FakeMAL() as fake:
+            client = Client("fake", user_login=False, base_url=fake.url)
+            with WriteQueue(client, flush_interval=60) as queue:
+                deleted = queue.delete(5)
+                updated = queue.update(5, score=7)
+                queue.flush()
+                self.assertTrue(deleted.done() and updated.done())
+            self.assertEqual(deleted.result(), [])
+            self.assertEqual(updated.result()["score"], 7)
+            self.assertEqual(queue.stats()["sent"], 2)
+            # the update went out after the delete and brought the entry back
+            self.assertNotIn(5, fake._deleted)
+
+
+class TestRecommender(unittest.TestCase):
+    def test_refresh_matches_fit(self):
+        rng = random.Random(0)
+
+        def entries():
+            return [
+                {"id": anime_id, "list_status": {"score": rng.randint(0, 10), "status": "completed"}}
+                for anime_id in rng.sample(range(1, 401), rng.randint(5, 40))
+            ]
+
+        recommender = Recommender(k=10, rebuild_ratio=1.0)
+        for user in range(300):
+            recommender.add_user(f"user{user}", entries())
+        recommender.fit()
+        for user in range(5):
+            recommender.add_user(f"user{user}", entries())
+        recommender.add_user("new", entries())
+        recommender.refresh()
+        refreshed = {anime_id: recommender.similar(anime_id) for anime_id in range(1, 401)}
+        recommender.fit()
+        for anime_id, neighbors in refreshed.items():
+            expected = recommender.similar(anime_id)
+            self.assertEqual(len(neighbors), len(expected))
+            for (_, similarity), (_, fitted) in zip(neighbors, expected):
+                self.assertAlmostEqual(similarity, fitted, places=5)
+
+
+# Stands in for the time module of mal.ratelimit, only moving when told to
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("mal.ratelimit.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket(self):
+        limiter = RateLimiter(rate=10, burst=2)
+        waits = [limiter.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1)
+        self.assertAlmostEqual(waits[3], 0.2)
+        self.clock.now += 10
+        # the bucket refills up to burst only
+        self.assertEqual([limiter.reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(limiter.reserve(), 0)
+        stats = limiter.stats()
+        self.assertEqual((stats["requests"], stats["paced"], stats["throttled"]), (7, 3, 0))
+
+    def test_retry_after(self):
+        limiter = RateLimiter(rate=10, burst=5, backoff_base=0.5)
+        delay = limiter.retry_delay(0, 429, "3")
+        self.assertGreaterEqual(delay, 3)
+        self.assertLessEqual(delay, 3.5)
+        self.assertEqual(limiter.stats()["rate"], 5)
+        # every caller waits out the server's delay, not only the one that got the 429
+        self.assertAlmostEqual(limiter.reserve(), delay)
+        self.clock.now += delay
+        self.assertEqual(limiter.reserve(), 0)
+        stats = limiter.stats()
+        self.assertEqual((stats["throttled"], stats["paced"], stats["retried"]), (1, 0, 1))
+
+    def test_backoff(self):
+        limiter = RateLimiter(rate=10, burst=5, max_retries=3, backoff_base=1.0, backoff_max=3.0)
+        for attempt in range(3):
+            delay = limiter.retry_delay(attempt, 503)
+            self.assertLessEqual(delay, min(3.0, 2 ** attempt))
+        self.assertEqual(limiter.stats()["rate"], 10)
+        self.assertIsNone(limiter.retry_delay(3, 503))
+        self.assertIsNone(limiter.retry_delay(0, 404))
+        limiter.record(404)
+        stats = limiter.stats()
+        self.assertEqual((stats["retried"], stats["failed"]), (3, 2))
+
+        limiter.retry_delay(0, 429)
+        limiter.retry_delay(1, 429)
+        self.assertEqual(limiter.stats()["rate"], 2.5)
+        limiter.record(200)
+        self.assertEqual(limiter.stats()["rate"], 3.0)
+        for _ in range(20):
+            limiter.record(200)
+        self.assertEqual(limiter.stats()["rate"], 10)
+
+
+class TestAsyncClient(unittest.TestCase):
+    def test_get_anime_details(self):
+        async def run():
+            async with AsyncClient(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH) as client:
+                return await client.get_anime_details(TEST_ANIME_ID)
+        anime = asyncio.run(run())
+        self.assertEqual(type(anime), dict)
+
+    def test_get_user_anime_list(self):
+        async def run():
+            async with AsyncClient(MAL_CLIENT_ID, MAL_CLIENT_SECRET, token_path=MAL_TOKEN_PATH) as client:
+                return await client.get_user_anime_list()
+        anime = asyncio.run(run())
+        self.assertEqual(type(anime), list)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file